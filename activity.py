@@ -0,0 +1,122 @@
+# activity.py - Kompakter Container für eine Aktivität mit typisierten Kanälen und Gültigkeitsbits
+import numpy as np
+
+# Speichertyp je Kanal (FIT-Wertebereiche) und gültiger Wertebereich
+CHANNEL_SPECS = {
+    'heartrate': (np.uint8, 30, 220),
+    'cadence': (np.uint8, 0, None),
+    'power': (np.uint16, 0, None),
+    'velocity': (np.float32, 0, None),
+    'altitude': (np.float32, -200, None),
+    'temperature': (np.int8, -20, 60),
+    'distance': (np.float32, 0, None),
+    'position_lat': (np.int32, None, None),
+    'position_long': (np.int32, None, None),
+}
+
+
+class Activity:
+    """
+    Aktivität mit typisierten Spalten statt float64-Arrays.
+
+    Ungültige oder fehlende Werte stehen als 0 in der Spalte und sind in einer
+    Bitmaske pro Kanal (1 Bit je Messpunkt) als ungültig markiert. Über
+    data['kanal'] erhält man weiterhin ein float-Array mit NaN-Lücken, sodass
+    bestehender Code (Plots, Resampling) unverändert funktioniert. slice()
+    liefert Views ohne Kopie.
+    """
+
+    __slots__ = ('time', 'file_name', '_columns', '_valid_bits', '_bit_offset')
+
+    def __init__(self, time, columns, valid_bits, bit_offset=0, file_name=None):
+        self.time = time
+        self.file_name = file_name
+        self._columns = columns
+        self._valid_bits = valid_bits
+        self._bit_offset = bit_offset
+
+    @classmethod
+    def from_channels(cls, data, file_name=None):
+        """Erstellt eine Activity aus einem Dict mit float-Arrays (NaN = fehlend)"""
+        time = np.asarray(data['time'], dtype=float)
+        n = len(time)
+        columns = {}
+        valid_bits = {}
+        for name, (dtype, min_val, max_val) in CHANNEL_SPECS.items():
+            values = data.get(name)
+            if values is None or len(values) != n:
+                continue
+            values = np.asarray(values, dtype=float)
+            valid = ~np.isnan(values)
+            if min_val is not None:
+                valid &= values >= min_val
+            if max_val is not None:
+                valid &= values <= max_val
+            if np.issubdtype(dtype, np.integer):
+                # Ganzzahlige Spalten runden und auf den Typbereich begrenzen
+                info = np.iinfo(dtype)
+                valid &= (values >= info.min) & (values <= info.max)
+                columns[name] = np.where(valid, np.rint(values), 0).astype(dtype)
+            else:
+                columns[name] = np.where(valid, values, 0).astype(dtype)
+            valid_bits[name] = np.packbits(valid)
+        return cls(time, columns, valid_bits, 0, file_name or data.get('file_name'))
+
+    def __len__(self):
+        return len(self.time)
+
+    def __contains__(self, name):
+        return name == 'time' or name in self._columns
+
+    def __getitem__(self, name):
+        if name == 'time':
+            return self.time
+        values = self._columns[name].astype(float)
+        values[~self.valid(name)] = np.nan
+        return values
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def channels(self):
+        """Namen aller vorhandenen Kanäle"""
+        return list(self._columns)
+
+    def column(self, name):
+        """Typisierte Rohspalte (ungültige Werte sind 0)"""
+        return self._columns[name]
+
+    def valid(self, name):
+        """Gültigkeitsmaske eines Kanals als bool-Array"""
+        if name not in self._columns:
+            return np.zeros(len(self), dtype=bool)
+        start = self._bit_offset
+        bits = self._valid_bits[name][start // 8:]
+        return np.unpackbits(bits, count=start % 8 + len(self))[start % 8:].astype(bool)
+
+    def valid_values(self, name):
+        """Nur die gültigen Werte eines Kanals (eine Kopie im Speichertyp)"""
+        if name not in self._columns:
+            return np.array([])
+        return self._columns[name][self.valid(name)]
+
+    def slice(self, lo, hi):
+        """Teilbereich [lo, hi) - Spalten und Bitmasken werden nicht kopiert"""
+        lo = max(0, min(lo, len(self)))
+        hi = max(lo, min(hi, len(self)))
+        columns = {name: values[lo:hi] for name, values in self._columns.items()}
+        return Activity(self.time[lo:hi], columns, self._valid_bits,
+                        self._bit_offset + lo, self.file_name)
+
+    def nbytes(self):
+        """Speicherbedarf der Spalten, Zeitachse und Bitmasken in Bytes"""
+        return (self.time.nbytes
+                + sum(values.nbytes for values in self._columns.values())
+                + sum(bits.nbytes for bits in self._valid_bits.values()))
+
+
+def as_activity(data):
+    """Gibt data als Activity zurück (Dicts aus älterem Code werden umgewandelt)"""
+    if isinstance(data, Activity):
+        return data
+    return Activity.from_channels(data)
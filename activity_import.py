@@ -0,0 +1,156 @@
+# activity_import.py - Inkrementelle Verarbeitung neu importierter Aktivitäten
+import power_curve
+import training_load
+import route_heatmap
+import segments
+import activity_summary
+from resampling import resample_activity
+from blob_store import resolve_sports_file
+
+# Wird erhöht, sobald ein neuer Verarbeitungsschritt hinzukommt - ältere Sessions
+# werden dann beim nächsten Backfill erneut verarbeitet (alle Schritte sind idempotent)
+PIPELINE_VERSION = 10
+
+
+def mark_session_failed(conn, session_id, content_key, error):
+    """Merkt eine fehlgeschlagene Session vor - sie wird erst mit neuer Datei oder Pipeline-Version wieder versucht"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT OR REPLACE INTO failed_sessions (session_id, content_key, pipeline_version, error)
+        VALUES (?, ?, ?, ?)
+    ''', (session_id, content_key, PIPELINE_VERSION, error))
+
+
+def process_session(conn, session_id, user_id, data, stream=None):
+    """Aktualisiert alle abgeleiteten Tabellen für eine einzelne Session"""
+    # Alle Schritte arbeiten auf demselben 1-Hz-Raster
+    if stream is None:
+        stream = resample_activity(data)
+    power_curve.update_session_curves(conn, session_id, user_id, stream)
+    training_load.update_session_load(conn, session_id, user_id, stream)
+    route_heatmap.add_session_to_heatmap(conn, session_id, user_id, stream)
+    segments.index_session_route(conn, session_id, user_id, stream)
+    activity_summary.update_session_summary(conn, session_id, user_id, stream)
+
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT OR REPLACE INTO processed_sessions (session_id, user_id, pipeline_version)
+        VALUES (?, ?, ?)
+    ''', (session_id, user_id, PIPELINE_VERSION))
+    cursor.execute("DELETE FROM failed_sessions WHERE session_id = ?", (session_id,))
+
+
+def remove_session(conn, session_id, load_data):
+    """
+    Entfernt alle abgeleiteten Daten einer Session, bevor sie gelöscht wird.
+
+    Kurven-Hülle, Trainingsbelastung, Wochen-/Monatssummen und Heatmap werden dabei um den Beitrag
+    der Session korrigiert. Die Heatmap-Dichte wird aus der Datei abgezogen;
+    lässt sich die Datei nicht mehr lesen, werden die Kacheln des Benutzers
+    verworfen und beim nächsten Backfill aus allen Sessions neu aufgebaut.
+
+    Args:
+        conn: Datenbankverbindung
+        session_id: ID in sports_sessions (Datei muss noch vorhanden sein)
+        load_data: Funktion (content_key, file_path) -> data-Dict
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT user_id, file_name, content_hash FROM sports_sessions WHERE id = ?", (session_id,)
+    )
+    row = cursor.fetchone()
+    if not row:
+        return
+    user_id, file_name, content_hash = row
+
+    power_curve.remove_session_curves(conn, session_id)
+    training_load.remove_session_load(conn, session_id)
+    cursor.execute("SELECT 1 FROM heatmap_sessions WHERE session_id = ?", (session_id,))
+    if cursor.fetchone():
+        file_path = resolve_sports_file(conn, file_name, content_hash)
+        try:
+            stream = resample_activity(load_data(content_hash or file_path, file_path))
+            route_heatmap.remove_session_from_heatmap(conn, session_id, stream)
+        except Exception as e:
+            print(f"✗ Session {session_id} ({file_name}): Heatmap wird neu aufgebaut ({e})")
+            route_heatmap.clear_user_heatmap(conn, user_id)
+            cursor.execute("DELETE FROM processed_sessions WHERE user_id = ?", (user_id,))
+    segments.remove_session_route(conn, session_id)
+    activity_summary.remove_session_summary(conn, session_id)
+    cursor.execute("DELETE FROM processed_sessions WHERE session_id = ?", (session_id,))
+    cursor.execute("DELETE FROM failed_sessions WHERE session_id = ?", (session_id,))
+
+
+def rescore_user_ftp(conn, user_id):
+    """
+    Aktualisiert alle FTP-abhängigen Kennzahlen eines Benutzers nach einer FTP-Änderung.
+
+    TSS, Tagesbelastung und Leistungszonen entstehen aus gespeicherten,
+    FTP-unabhängigen Eingaben - es wird keine Datei erneut gelesen.
+
+    Returns:
+        int: Anzahl neu bewerteter Sessions
+    """
+    rescored = training_load.rescore_session_load(conn, user_id)
+    activity_summary.rescore_power_zones(conn, user_id)
+    return rescored
+
+
+def get_unprocessed_sessions(conn, user_id=None):
+    """
+    Sessions, die noch nicht (oder mit einer älteren Pipeline-Version) verarbeitet wurden.
+
+    Sessions, die mit derselben Datei und Pipeline-Version schon fehlgeschlagen
+    sind, werden übersprungen.
+    """
+    query = '''
+        SELECT s.id, s.user_id, s.file_name, s.content_hash
+        FROM sports_sessions s
+        LEFT JOIN processed_sessions p ON p.session_id = s.id
+        LEFT JOIN failed_sessions f ON f.session_id = s.id
+            AND f.pipeline_version = ? AND f.content_key IS COALESCE(s.content_hash, s.file_name)
+        WHERE (p.session_id IS NULL OR p.pipeline_version < ?)
+          AND f.session_id IS NULL
+    '''
+    params = [PIPELINE_VERSION, PIPELINE_VERSION]
+    if user_id is not None:
+        query += " AND s.user_id = ?"
+        params.append(user_id)
+    query += " ORDER BY s.timestamp"
+
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+
+def backfill_sessions(conn, load_data, user_id=None):
+    """
+    Verarbeitet alle ausstehenden Sessions.
+
+    Args:
+        conn: Datenbankverbindung
+        load_data: Funktion (content_key, file_path) -> data-Dict
+        user_id: optional nur Sessions dieses Benutzers
+
+    Sessions, deren Datei sich nicht laden lässt oder leer ist, werden in
+    failed_sessions vermerkt und nicht bei jedem Rerun erneut gelesen.
+
+    Returns:
+        int: Anzahl verarbeiteter Sessions
+    """
+    processed = 0
+    for session_id, session_user_id, file_name, content_hash in get_unprocessed_sessions(conn, user_id):
+        file_path = resolve_sports_file(conn, file_name, content_hash)
+        content_key = content_hash or file_name
+        try:
+            data = load_data(content_hash or file_path, file_path)
+        except Exception as e:
+            print(f"✗ Session {session_id} ({file_name}) konnte nicht geladen werden: {e}")
+            mark_session_failed(conn, session_id, content_key, str(e))
+            continue
+        if len(data['time']) == 0:
+            mark_session_failed(conn, session_id, content_key, "keine Datenpunkte")
+            continue
+        process_session(conn, session_id, session_user_id, data)
+        processed += 1
+    return processed
@@ -0,0 +1,190 @@
+# activity_summary.py - Kennzahlen pro Aktivität und Wochen-/Monatssummen pro Benutzer
+import json
+from datetime import datetime, timedelta
+import numpy as np
+
+from metrics import elevation_gain
+from resampling import valid_values
+from training_load import get_user_hr_profile, get_stored_ftp
+from zones import HR_ZONE_NAMES, hr_zone_seconds, power_histogram, histogram_zone_seconds
+
+ROLLUP_PERIODS = ("week", "month")
+
+# Summenfelder der Wochen-/Monatstabelle (aus activity_summary übernommen)
+ROLLUP_FIELDS = ["duration_seconds", "moving_seconds", "distance_km", "elevation_gain_m"]
+
+
+def compute_summary(stream, max_hr, ftp):
+    """Kennzahlen einer auf 1 Hz gerasterten Aktivität (Leistungszonen nur mit gespeicherter FTP)"""
+
+    def avg_max(channel):
+        values = valid_values(stream, channel)
+        if len(values) == 0:
+            return None, None
+        return float(np.mean(values)), float(np.max(values))
+
+    distance = valid_values(stream, 'distance')
+    avg_heartrate, max_heartrate = avg_max('heartrate')
+    avg_power, max_power = avg_max('power')
+    avg_cadence, max_cadence = avg_max('cadence')
+    hr_zones = hr_zone_seconds(stream, max_hr)
+    histogram = power_histogram(stream) if avg_power else None
+
+    return {
+        'start_time': datetime.fromtimestamp(float(stream['time'][0])).isoformat(),
+        'duration_seconds': float(stream['time'][-1] - stream['time'][0]),
+        'moving_seconds': float(np.count_nonzero(stream['moving'])),
+        'distance_km': float(distance[-1] - distance[0]) / 1000 if len(distance) > 1 else 0.0,
+        'elevation_gain_m': elevation_gain(stream['altitude']),
+        'avg_heartrate': avg_heartrate,
+        'max_heartrate': max_heartrate,
+        'avg_power': avg_power,
+        'max_power': max_power,
+        'avg_cadence': avg_cadence,
+        'max_cadence': max_cadence,
+        'hr_zone_seconds': hr_zones.tolist(),
+        'power_histogram': histogram,
+        'power_zone_seconds': histogram_zone_seconds(histogram, ftp).tolist() if avg_power and ftp else None,
+    }
+
+
+def period_start(start_time, period):
+    """Erster Tag der Woche (Montag) bzw. des Monats als ISO-Datum"""
+    day = datetime.fromisoformat(start_time).date()
+    if period == "week":
+        return (day - timedelta(days=day.weekday())).isoformat()
+    return day.replace(day=1).isoformat()
+
+
+def _apply_to_rollups(conn, user_id, summary, sign):
+    """Addiert (sign=1) bzw. subtrahiert (sign=-1) eine Aktivität in ihrer Woche und ihrem Monat"""
+    cursor = conn.cursor()
+    zones = np.asarray(summary['hr_zone_seconds'] or [0] * len(HR_ZONE_NAMES), dtype=float)
+    for period in ROLLUP_PERIODS:
+        start = period_start(summary['start_time'], period)
+        cursor.execute('''
+            SELECT sessions, duration_seconds, moving_seconds, distance_km, elevation_gain_m, hr_zone_seconds
+            FROM training_rollup WHERE user_id = ? AND period = ? AND period_start = ?
+        ''', (user_id, period, start))
+        row = cursor.fetchone() or (0, 0, 0, 0, 0, None)
+        old_zones = np.asarray(json.loads(row[5]) if row[5] else [0] * len(HR_ZONE_NAMES), dtype=float)
+
+        sessions = row[0] + sign
+        if sessions <= 0:
+            cursor.execute(
+                "DELETE FROM training_rollup WHERE user_id = ? AND period = ? AND period_start = ?",
+                (user_id, period, start)
+            )
+            continue
+        totals = [old + sign * summary[field] for old, field in zip(row[1:5], ROLLUP_FIELDS)]
+        cursor.execute('''
+            INSERT OR REPLACE INTO training_rollup
+                (user_id, period, period_start, sessions, duration_seconds, moving_seconds,
+                 distance_km, elevation_gain_m, hr_zone_seconds)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, period, start, sessions, *totals, json.dumps((old_zones + sign * zones).tolist())))
+
+
+def get_summary(conn, session_id):
+    """Gespeicherte Kennzahlen einer Session als Dict (oder None)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM activity_summary WHERE session_id = ?", (session_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    summary = dict(zip([column[0] for column in cursor.description], row))
+    for field in ('hr_zone_seconds', 'power_zone_seconds'):
+        summary[field] = json.loads(summary[field]) if summary[field] else None
+    if summary['power_histogram'] is not None:
+        summary['power_histogram'] = np.frombuffer(summary['power_histogram'], dtype=np.uint32)
+    return summary
+
+
+def update_session_summary(conn, session_id, user_id, stream):
+    """Speichert die Kennzahlen einer Session und aktualisiert Wochen-/Monatssummen inkrementell"""
+    max_hr, _ = get_user_hr_profile(conn, user_id)
+    summary = compute_summary(stream, max_hr, get_stored_ftp(conn, user_id))
+
+    # Bei erneuter Verarbeitung zuerst den alten Beitrag entfernen
+    previous = get_summary(conn, session_id)
+    if previous:
+        _apply_to_rollups(conn, previous['user_id'], previous, -1)
+
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT OR REPLACE INTO activity_summary
+            (session_id, user_id, start_time, duration_seconds, moving_seconds, distance_km,
+             elevation_gain_m, avg_heartrate, max_heartrate, avg_power, max_power,
+             avg_cadence, max_cadence, hr_zone_seconds, power_zone_seconds, power_histogram)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (session_id, user_id, summary['start_time'], summary['duration_seconds'],
+          summary['moving_seconds'], summary['distance_km'], summary['elevation_gain_m'],
+          summary['avg_heartrate'], summary['max_heartrate'], summary['avg_power'],
+          summary['max_power'], summary['avg_cadence'], summary['max_cadence'],
+          json.dumps(summary['hr_zone_seconds']),
+          json.dumps(summary['power_zone_seconds']) if summary['power_zone_seconds'] else None,
+          summary['power_histogram'].tobytes() if summary['power_histogram'] is not None else None))
+    _apply_to_rollups(conn, user_id, summary, 1)
+    return summary
+
+
+def remove_session_summary(conn, session_id):
+    """Zieht eine gelöschte Session von ihren Wochen-/Monatssummen ab und entfernt ihre Kennzahlen"""
+    summary = get_summary(conn, session_id)
+    if not summary:
+        return None
+    _apply_to_rollups(conn, summary['user_id'], summary, -1)
+    conn.execute("DELETE FROM activity_summary WHERE session_id = ?", (session_id,))
+    return summary
+
+
+def rescore_power_zones(conn, user_id):
+    """
+    Leistungszonen aller Sessions nach einer FTP-Änderung aus den gespeicherten
+    Watt-Histogrammen neu berechnen (ohne Dateien zu lesen).
+
+    Returns:
+        int: Anzahl aktualisierter Sessions
+    """
+    ftp = get_stored_ftp(conn, user_id)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT session_id, power_histogram FROM activity_summary
+        WHERE user_id = ? AND power_histogram IS NOT NULL
+    ''', (user_id,))
+    updates = [
+        (json.dumps(histogram_zone_seconds(np.frombuffer(histogram, dtype=np.uint32), ftp).tolist())
+         if ftp else None, session_id)
+        for session_id, histogram in cursor.fetchall()
+    ]
+    cursor.executemany("UPDATE activity_summary SET power_zone_seconds = ? WHERE session_id = ?", updates)
+    return len(updates)
+
+
+def get_season_overview(conn, user_id, period="week", since=None):
+    """Wochen- oder Monatssummen eines Benutzers (eine Abfrage über den Primärschlüssel)"""
+    query = '''
+        SELECT period_start, sessions, duration_seconds, moving_seconds, distance_km,
+               elevation_gain_m, hr_zone_seconds
+        FROM training_rollup
+        WHERE user_id = ? AND period = ?
+    '''
+    params = [user_id, period]
+    if since is not None:
+        query += " AND period_start >= ?"
+        params.append(since)
+    query += " ORDER BY period_start"
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    return [
+        {
+            'period_start': row[0],
+            'sessions': row[1],
+            'duration_seconds': row[2],
+            'moving_seconds': row[3],
+            'distance_km': row[4],
+            'elevation_gain_m': row[5],
+            'hr_zone_seconds': json.loads(row[6]) if row[6] else None,
+        }
+        for row in cursor.fetchall()
+    ]
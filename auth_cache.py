@@ -0,0 +1,86 @@
+# auth_cache.py - Prozessweite Caches der Anmeldedaten und Benutzerkennzahlen, Benutzerzeile pro Session
+import copy
+
+import streamlit as st
+
+from db import get_connection
+from repository import USER_COLUMNS, get_user_counts
+
+SESSION_USER_KEY = "current_user_row"
+USER_COUNTS_TTL_SECONDS = 30  # fängt auch Last-Login-Änderungen aus dem Hintergrund-Schreiber auf
+CREDENTIALS_TTL_SECONDS = 60  # Änderungen anderer Prozesse (person_import.py, reset_passwords.py, fix_db.py)
+
+
+@st.cache_resource(ttl=CREDENTIALS_TTL_SECONDS)
+def load_credentials():
+    """
+    Anmeldedaten aller aktiven Benutzer im Format von streamlit_authenticator.
+
+    Pro Serverprozess geladen und nach CREDENTIALS_TTL_SECONDS neu gelesen,
+    damit auch Änderungen anderer Prozesse ankommen. Änderungen aus der App
+    (Anlegen, (De-)Aktivieren, Rollen-, Passwort- oder Profiländerungen)
+    verwerfen den Cache sofort mit invalidate_credentials().
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT username, password, full_name, email, role FROM users WHERE is_active = 1')
+    users = cursor.fetchall()
+    conn.close()
+
+    credentials = {'usernames': {}}
+    for username, password, full_name, email, role in users:
+        credentials['usernames'][username] = {
+            'password': password,
+            'name': full_name,
+            'email': email,
+            'role': role
+        }
+    return credentials
+
+
+def get_credentials():
+    """Kopie der gecachten Anmeldedaten - stauth.Authenticate schreibt Login-Zustand hinein"""
+    return copy.deepcopy(load_credentials())
+
+
+@st.cache_data(ttl=USER_COUNTS_TTL_SECONDS)
+def load_user_counts():
+    """Kennzahlen der Benutzerverwaltung (eine aggregierte Abfrage, kurz gecacht)"""
+    conn = get_connection()
+    counts = get_user_counts(conn)
+    conn.close()
+    return counts
+
+
+def invalidate_credentials():
+    """Verwirft Anmeldedaten und Kennzahlen; alle Sessions laden danach auch ihre Benutzerzeile neu"""
+    load_credentials.clear()
+    load_user_counts.clear()
+
+
+def get_session_user(username):
+    """
+    Benutzerzeile (USER_COLUMNS) der angemeldeten Person, einmal pro Session geladen.
+
+    Die Zeile gilt nur zusammen mit dem Stand der Anmeldedaten, unter dem sie
+    gelesen wurde - nach invalidate_credentials() oder Ablauf der TTL wird sie
+    beim nächsten Rerun neu gelesen.
+    """
+    credentials = load_credentials()
+    cached = st.session_state.get(SESSION_USER_KEY)
+    if cached and cached['username'] == username and cached['credentials'] is credentials:
+        return cached['row']
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT {USER_COLUMNS} FROM users WHERE username = ?', (username,))
+    row = cursor.fetchone()
+    conn.close()
+
+    st.session_state[SESSION_USER_KEY] = {'username': username, 'credentials': credentials, 'row': row}
+    return row
+
+
+def clear_session_user():
+    """Vergisst die Benutzerzeile dieser Session (z. B. nach dem Logout)"""
+    st.session_state.pop(SESSION_USER_KEY, None)
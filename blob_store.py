@@ -0,0 +1,235 @@
+# blob_store.py - Inhaltsadressierte Ablage für hochgeladene FIT- und EKG-Dateien
+import hashlib
+import os
+
+from db import get_connection
+
+BLOB_ROOT = "data/blobs"
+SPORTS_DATA_DIR = "data/sports_data"
+
+
+def hash_bytes(data):
+    """Berechnet den SHA-256-Hash eines Byte-Strings"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """Berechnet den SHA-256-Hash einer Datei blockweise"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def blob_path(sha256, extension):
+    """Pfad eines Blobs: data/blobs/<2 Zeichen>/<hash><endung>"""
+    return os.path.join(BLOB_ROOT, sha256[:2], f"{sha256}{extension}")
+
+
+def store_blob(conn, data, extension):
+    """
+    Speichert Bytes inhaltsadressiert und erhöht den Referenzzähler.
+
+    Returns:
+        tuple: (sha256, path, is_duplicate) - bei Duplikaten wird nichts geschrieben
+    """
+    sha256 = hash_bytes(data)
+    cursor = conn.cursor()
+    cursor.execute("SELECT path FROM blobs WHERE sha256 = ?", (sha256,))
+    row = cursor.fetchone()
+
+    if row and os.path.exists(row[0]):
+        cursor.execute("UPDATE blobs SET ref_count = ref_count + 1 WHERE sha256 = ?", (sha256,))
+        return sha256, row[0], True
+
+    path = blob_path(sha256, extension)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Erst in temporäre Datei schreiben, damit kein halber Blob sichtbar wird
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+    if row:
+        # Eintrag existiert, Datei fehlte aber - Pfad reparieren
+        cursor.execute(
+            "UPDATE blobs SET path = ?, ref_count = ref_count + 1 WHERE sha256 = ?",
+            (path, sha256)
+        )
+    else:
+        cursor.execute(
+            "INSERT INTO blobs (sha256, path, size_bytes, ref_count) VALUES (?, ?, ?, 1)",
+            (sha256, path, len(data))
+        )
+    return sha256, path, False
+
+
+def register_existing_file(conn, file_path):
+    """Registriert eine bereits vorhandene Datei als Blob (ohne Kopie) und gibt den Hash zurück"""
+    sha256 = hash_file(file_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT path FROM blobs WHERE sha256 = ?", (sha256,))
+    if cursor.fetchone():
+        cursor.execute("UPDATE blobs SET ref_count = ref_count + 1 WHERE sha256 = ?", (sha256,))
+    else:
+        cursor.execute(
+            "INSERT INTO blobs (sha256, path, size_bytes, ref_count) VALUES (?, ?, ?, 1)",
+            (sha256, file_path, os.path.getsize(file_path))
+        )
+    return sha256
+
+
+def release_blob(conn, sha256):
+    """Verringert den Referenzzähler und löscht den Blob, wenn er nicht mehr referenziert wird"""
+    if not sha256:
+        return
+    cursor = conn.cursor()
+    cursor.execute("UPDATE blobs SET ref_count = ref_count - 1 WHERE sha256 = ?", (sha256,))
+    cursor.execute("SELECT path, ref_count FROM blobs WHERE sha256 = ?", (sha256,))
+    row = cursor.fetchone()
+    if row and row[1] <= 0:
+        cursor.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+        # Nur Dateien im Blob-Store löschen, Altbestände bleiben unangetastet
+        if row[0].startswith(BLOB_ROOT) and os.path.exists(row[0]):
+            os.remove(row[0])
+
+
+def get_blob_path(conn, sha256):
+    """Gibt den Speicherpfad eines Blobs zurück (oder None)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT path FROM blobs WHERE sha256 = ?", (sha256,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def resolve_sports_file(conn, file_name, content_hash):
+    """Liefert den Dateipfad einer Sport-Session (Blob-Store oder Altbestand)"""
+    if content_hash:
+        path = get_blob_path(conn, content_hash)
+        if path:
+            return path
+    return os.path.join(SPORTS_DATA_DIR, file_name)
+
+
+def add_sports_session(conn, user_id, file_name, data, timestamp):
+    """
+    Speichert eine hochgeladene .fit-Datei im Blob-Store und legt die Session an.
+
+    Returns:
+        tuple: (session_id, sha256, is_duplicate)
+    """
+    sha256, _, is_duplicate = store_blob(conn, data, ".fit")
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO sports_sessions (user_id, file_name, timestamp, content_hash)
+        VALUES (?, ?, ?, ?)
+    ''', (user_id, file_name, timestamp, sha256))
+    return cursor.lastrowid, sha256, is_duplicate
+
+
+def add_ekg_test(conn, user_id, test_date, data, extension):
+    """
+    Speichert eine hochgeladene EKG-Datei im Blob-Store und legt den Test an.
+
+    Returns:
+        tuple: (test_id, path, is_duplicate)
+    """
+    sha256, path, is_duplicate = store_blob(conn, data, extension)
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO ekg_tests (user_id, date, result_link, content_hash)
+        VALUES (?, ?, ?, ?)
+    ''', (user_id, test_date, path, sha256))
+    return cursor.lastrowid, path, is_duplicate
+
+
+def delete_sports_session(conn, user_id, file_name, load_data):
+    """
+    Löscht Sport-Sessions eines Benutzers samt abgeleiteter Daten und gibt die
+    referenzierten Blobs frei.
+
+    load_data: Funktion (content_key, file_path) -> data-Dict, siehe
+    activity_import.remove_session
+    """
+    # Erst hier importiert - activity_import nutzt selbst den Blob-Store
+    from activity_import import remove_session
+
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id, content_hash FROM sports_sessions WHERE file_name = ? AND user_id = ?",
+        (file_name, user_id)
+    )
+    rows = cursor.fetchall()
+    for session_id, content_hash in rows:
+        remove_session(conn, session_id, load_data)
+        cursor.execute("DELETE FROM sports_sessions WHERE id = ?", (session_id,))
+        release_blob(conn, content_hash)
+    return len(rows)
+
+
+def collapse_legacy_duplicates(conn):
+    """
+    Entfernt byte-identische Kopien alter Sport-Dateien in data/sports_data.
+
+    Sessions finden ihre Datei über content_hash, also über den zuerst
+    registrierten Pfad; weitere Dateien mit demselben Inhalt werden nicht mehr
+    gelesen. Gelöscht wird nur, wenn der Blob selbst ein Altbestand ist und der
+    Hash der Kopie erneut übereinstimmt.
+
+    Returns:
+        int: Anzahl gelöschter Dateien
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT DISTINCT s.file_name, s.content_hash, b.path
+        FROM sports_sessions s JOIN blobs b ON b.sha256 = s.content_hash
+    ''')
+    removed = 0
+    for file_name, content_hash, path in cursor.fetchall():
+        legacy_path = os.path.join(SPORTS_DATA_DIR, file_name)
+        if path.startswith(BLOB_ROOT) or os.path.normpath(path) == os.path.normpath(legacy_path):
+            continue
+        if (os.path.exists(path) and os.path.exists(legacy_path)
+                and hash_file(legacy_path) == content_hash):
+            os.remove(legacy_path)
+            removed += 1
+    return removed
+
+
+def backfill_content_hashes(conn):
+    """Hasht vorhandene Dateien von Sessions/EKG-Tests ohne content_hash und registriert sie"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, file_name FROM sports_sessions WHERE content_hash IS NULL")
+    for session_id, file_name in cursor.fetchall():
+        file_path = os.path.join(SPORTS_DATA_DIR, file_name)
+        if os.path.exists(file_path):
+            sha256 = register_existing_file(conn, file_path)
+            cursor.execute("UPDATE sports_sessions SET content_hash = ? WHERE id = ?", (sha256, session_id))
+
+    collapse_legacy_duplicates(conn)
+
+    # EKG-Dateien bleiben auch als Duplikate liegen: result_link gehört der
+    # Import-JSON und würde beim nächsten Personenimport zurückgesetzt
+    cursor.execute("SELECT id, result_link FROM ekg_tests WHERE content_hash IS NULL")
+    for test_id, result_link in cursor.fetchall():
+        # Unter Windows hochgeladene Pfade enthalten Backslashes
+        file_path = result_link.replace("\\", "/") if result_link else None
+        if file_path and os.path.exists(file_path):
+            sha256 = register_existing_file(conn, file_path)
+            cursor.execute("UPDATE ekg_tests SET content_hash = ? WHERE id = ?", (sha256, test_id))
+
+
+if __name__ == "__main__":
+    from migrations import run_migrations
+
+    conn = get_connection()
+    run_migrations(conn)
+    backfill_content_hashes(conn)
+    conn.commit()
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*), SUM(ref_count), SUM(size_bytes) FROM blobs")
+    count, refs, size = cursor.fetchone()
+    conn.close()
+    print(f"✅ {count} Blobs, {refs or 0} Referenzen, {(size or 0) / 1024:.1f} KB")
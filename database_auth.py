@@ -2,13 +2,16 @@
 import sqlite3
 import hashlib
 import secrets
-from datetime import datetime
 from typing import Dict, List, Tuple, Optional, Any
 import streamlit as st
 import pandas as pd
-import os
-from PIL import Image
-import io
+
+from auth_cache import invalidate_credentials
+from db import get_connection
+from migrations import run_migrations
+from picture_store import store_picture, release_picture
+from repository import USER_COLUMNS, get_user_counts, get_database_info
+from write_behind import get_write_queue
 
 class DatabaseAuth:
     """
@@ -28,8 +31,8 @@ class DatabaseAuth:
         self.init_auth_tables()
     
     def get_db_connection(self) -> sqlite3.Connection:
-        """Create and return a database connection"""
-        conn = sqlite3.connect(self.db_path)
+        """Return a pooled database connection (close() hands it back to the pool)"""
+        conn = get_connection(self.db_path)
         conn.row_factory = sqlite3.Row  # Enable dict-like access to rows
         return conn
     
@@ -41,29 +44,8 @@ class DatabaseAuth:
         conn = self.get_db_connection()
         cursor = conn.cursor()
         
-        # Create comprehensive users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                email TEXT NOT NULL,
-                full_name TEXT NOT NULL,
-                firstname TEXT,
-                lastname TEXT,
-                date_of_birth TEXT,
-                gender TEXT,
-                height_cm INTEGER,
-                weight_kg REAL,
-                picture_path TEXT,
-                picture_data BLOB,
-                role TEXT DEFAULT 'user',
-                is_active BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_login TIMESTAMP,
-                person_id INTEGER
-            )
-        ''')
+        # Shared schema (users incl. person_id) comes from the migration runner
+        run_migrations(conn)
         
         # Check if admin user exists, if not create default admin
         cursor.execute("SELECT COUNT(*) FROM users WHERE username = 'admin'")
@@ -126,29 +108,8 @@ class DatabaseAuth:
             if cursor.fetchone():
                 return False, "Benutzername bereits vergeben!"
             
-            # Handle picture upload
-            picture_path = None
-            picture_data = None
-            
-            if picture_file is not None:
-                # Create pictures directory if it doesn't exist
-                pictures_dir = "user_pictures"
-                os.makedirs(pictures_dir, exist_ok=True)
-                
-                # Save picture file
-                picture_filename = f"{user_data['username']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-                picture_path = os.path.join(pictures_dir, picture_filename)
-                
-                # Convert and save image
-                image = Image.open(picture_file)
-                # Resize image to reasonable size
-                image.thumbnail((300, 300), Image.Resampling.LANCZOS)
-                image.save(picture_path, "JPEG")
-                
-                # Also store as BLOB in database
-                img_byte_arr = io.BytesIO()
-                image.save(img_byte_arr, format='JPEG')
-                picture_data = img_byte_arr.getvalue()
+            # Handle picture upload - stored once in the picture store with all thumbnail sizes
+            picture_hash = store_picture(conn, picture_file) if picture_file is not None else None
             
             # Hash password
             hashed_password = self._hash_password_simple(user_data['password'])
@@ -157,9 +118,9 @@ class DatabaseAuth:
             cursor.execute('''
                 INSERT INTO users (
                     username, password, email, full_name, firstname, lastname,
-                    date_of_birth, gender, height_cm, weight_kg, picture_path, 
-                    picture_data, role, is_active
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    date_of_birth, gender, height_cm, weight_kg, picture_hash,
+                    role, is_active
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 user_data['username'],
                 hashed_password,
@@ -171,14 +132,14 @@ class DatabaseAuth:
                 user_data.get('gender', ''),
                 user_data.get('height_cm', 0),
                 user_data.get('weight_kg', 0.0),
-                picture_path,
-                picture_data,
+                picture_hash,
                 user_data.get('role', 'user'),
                 True
             ))
             
             conn.commit()
             conn.close()
+            invalidate_credentials()
             
             return True, f"Benutzer '{user_data['username']}' erfolgreich erstellt!"
             
@@ -203,7 +164,7 @@ class DatabaseAuth:
         conn = self.get_db_connection()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM users WHERE username = ? AND is_active = 1', (username,))
+        cursor.execute(f'SELECT {USER_COLUMNS} FROM users WHERE username = ? AND is_active = 1', (username,))
         user = cursor.fetchone()
         
         conn.close()
@@ -217,7 +178,7 @@ class DatabaseAuth:
                 'firstname': user['firstname'],
                 'lastname': user['lastname'],
                 'role': user['role'],
-                'picture_data': user['picture_data'],
+                'picture_hash': user['picture_hash'],
                 'date_of_birth': user['date_of_birth'],
                 'gender': user['gender'],
                 'height_cm': user['height_cm'],
@@ -268,7 +229,7 @@ class DatabaseAuth:
         conn = self.get_db_connection()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
+        cursor.execute(f'SELECT {USER_COLUMNS} FROM users WHERE username = ?', (username,))
         user = cursor.fetchone()
         
         conn.close()
@@ -276,21 +237,12 @@ class DatabaseAuth:
     
     def update_last_login(self, username: str):
         """
-        Update the last login timestamp for a user
+        Queue the last login timestamp for a user (written by the background writer)
         
         Args:
             username (str): Username to update
         """
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE username = ?',
-            (username,)
-        )
-        
-        conn.commit()
-        conn.close()
+        get_write_queue(self.db_path).record_login(username)
     
     def get_users_for_admin(self) -> pd.DataFrame:
         """
@@ -317,7 +269,7 @@ class DatabaseAuth:
                 is_active,
                 created_at,
                 last_login,
-                picture_data,
+                picture_hash,
                 picture_path
             FROM users
             ORDER BY created_at DESC
@@ -329,41 +281,20 @@ class DatabaseAuth:
     
     def get_user_stats(self) -> Dict[str, Any]:
         """
-        Get user statistics for admin dashboard
+        Get user statistics for admin dashboard (one aggregated query)
         
         Returns:
             Dict: User statistics
         """
         conn = self.get_db_connection()
-        cursor = conn.cursor()
-        
-        # Total users
-        cursor.execute("SELECT COUNT(*) FROM users WHERE is_active = 1")
-        total_users = cursor.fetchone()[0]
-        
-        # Users by role
-        cursor.execute("SELECT role, COUNT(*) as count FROM users WHERE is_active = 1 GROUP BY role")
-        roles = cursor.fetchall()
-        by_role = {role['role']: role['count'] for role in roles}
-        
-        # Recent logins (last 7 days)
-        cursor.execute('''
-            SELECT COUNT(*) FROM users 
-            WHERE last_login >= datetime('now', '-7 days') AND is_active = 1
-        ''')
-        recent_logins = cursor.fetchone()[0]
-        
-        # Users with pictures
-        cursor.execute("SELECT COUNT(*) FROM users WHERE picture_data IS NOT NULL AND is_active = 1")
-        users_with_pictures = cursor.fetchone()[0]
-        
+        counts = get_user_counts(conn)
         conn.close()
         
         return {
-            'total_users': total_users,
-            'by_role': by_role,
-            'recent_logins': recent_logins,
-            'users_with_pictures': users_with_pictures
+            'total_users': counts['active'],
+            'by_role': counts['active_by_role'],
+            'recent_logins': counts['recent_logins'],
+            'users_with_pictures': counts['with_pictures']
         }
     
     def deactivate_user(self, username: str) -> Tuple[bool, str]:
@@ -388,6 +319,7 @@ class DatabaseAuth:
             if cursor.rowcount > 0:
                 conn.commit()
                 conn.close()
+                invalidate_credentials()
                 return True, f"Benutzer '{username}' wurde deaktiviert."
             else:
                 conn.close()
@@ -416,6 +348,7 @@ class DatabaseAuth:
             if cursor.rowcount > 0:
                 conn.commit()
                 conn.close()
+                invalidate_credentials()
                 return True, f"Benutzer '{username}' wurde aktiviert."
             else:
                 conn.close()
@@ -445,6 +378,7 @@ class DatabaseAuth:
             if cursor.rowcount > 0:
                 conn.commit()
                 conn.close()
+                invalidate_credentials()
                 return True, f"Rolle für '{username}' wurde zu '{new_role}' geändert."
             else:
                 conn.close()
@@ -471,24 +405,16 @@ class DatabaseAuth:
         cursor = conn.cursor()
         
         try:
-            # Handle picture upload if provided
-            picture_path = None
-            picture_data = None
+            # Handle picture upload if provided - store_picture always adds a reference,
+            # so the previous picture is released afterwards even if it is the same image
+            picture_hash = None
             
             if picture_file is not None:
-                pictures_dir = "user_pictures"
-                os.makedirs(pictures_dir, exist_ok=True)
-                
-                picture_filename = f"{username}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-                picture_path = os.path.join(pictures_dir, picture_filename)
-                
-                image = Image.open(picture_file)
-                image.thumbnail((300, 300), Image.Resampling.LANCZOS)
-                image.save(picture_path, "JPEG")
-                
-                img_byte_arr = io.BytesIO()
-                image.save(img_byte_arr, format='JPEG')
-                picture_data = img_byte_arr.getvalue()
+                picture_hash = store_picture(conn, picture_file)
+                cursor.execute("SELECT picture_hash FROM users WHERE username = ?", (username,))
+                row = cursor.fetchone()
+                if row and row['picture_hash']:
+                    release_picture(conn, row['picture_hash'])
             
             # Build update query
             update_fields = []
@@ -499,9 +425,9 @@ class DatabaseAuth:
                     update_fields.append(f"{field} = ?")
                     params.append(value)
             
-            if picture_path:
-                update_fields.extend(["picture_path = ?", "picture_data = ?"])
-                params.extend([picture_path, picture_data])
+            if picture_hash:
+                update_fields.append("picture_hash = ?")
+                params.append(picture_hash)
             
             if update_fields:
                 params.append(username)
@@ -510,6 +436,7 @@ class DatabaseAuth:
                 
                 conn.commit()
                 conn.close()
+                invalidate_credentials()
                 return True, "Profil erfolgreich aktualisiert!"
             else:
                 conn.close()
@@ -527,32 +454,11 @@ class DatabaseAuth:
             Dict: Database information
         """
         conn = self.get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get table structure
-        cursor.execute("PRAGMA table_info(users)")
-        columns = cursor.fetchall()
-        
-        # Get database file size
-        db_size = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
-        
-        # Get recent activity
-        cursor.execute('''
-            SELECT username, full_name, created_at, last_login 
-            FROM users 
-            ORDER BY created_at DESC 
-            LIMIT 10
-        ''')
-        recent_activity = cursor.fetchall()
-        
+        info = get_database_info(conn, self.db_path)
         conn.close()
         
-        return {
-            'columns': [dict(col) for col in columns],
-            'db_size_mb': round(db_size / (1024 * 1024), 2),
-            'recent_activity': [dict(row) for row in recent_activity],
-            'db_path': self.db_path
-        }
+        info['db_path'] = self.db_path
+        return info
     
     def change_password(self, username: str, old_password: str, new_password: str) -> Tuple[bool, str]:
         """
@@ -582,6 +488,7 @@ class DatabaseAuth:
             
             conn.commit()
             conn.close()
+            invalidate_credentials()
             return True, "Passwort erfolgreich geändert!"
             
         except Exception as e:
@@ -0,0 +1,81 @@
+# db.py - Gemeinsamer Verbindungspool für personen.db (WAL, Busy-Timeout, Statement-Cache)
+import sqlite3
+import threading
+
+import streamlit as st
+
+DB_PATH = "personen.db"
+BUSY_TIMEOUT_SECONDS = 10  # so lange wartet ein Schreiber auf die Sperre, statt sofort zu scheitern
+STATEMENT_CACHE_SIZE = 256  # vorbereitete Statements je Verbindung (bleiben über Reruns erhalten)
+MAX_IDLE_CONNECTIONS = 8
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    Verbindung aus dem Pool.
+
+    close() schließt die Verbindung nicht, sondern gibt sie an den Pool zurück -
+    bestehender Code mit connect()/close() kann unverändert bleiben. Eine nicht
+    committete Transaktion wird dabei wie beim echten close() verworfen.
+    """
+
+    def close(self):
+        self._pool.release(self)
+
+
+class ConnectionPool:
+    """Wiederverwendbare Verbindungen zu einer Datenbankdatei (threadsicher)"""
+
+    def __init__(self, db_path, max_idle=MAX_IDLE_CONNECTIONS):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_SECONDS,
+            factory=PooledConnection,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False,  # eine Verbindung gehört immer nur einem Aufrufer
+        )
+        conn._pool = self
+        # WAL: Leser blockieren den Schreiber nicht mehr; NORMAL reicht im WAL-Modus
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+        conn._checked_out = True
+        return conn
+
+    def release(self, conn):
+        if not getattr(conn, "_checked_out", False):
+            return  # doppeltes close()
+        conn._checked_out = False
+        if conn.in_transaction:
+            conn.rollback()
+        # Einstellungen des letzten Aufrufers zurücksetzen
+        conn.row_factory = None
+        conn.text_factory = str
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        sqlite3.Connection.close(conn)
+
+
+@st.cache_resource
+def get_pool(db_path=DB_PATH):
+    """Ein Pool pro Datenbankdatei für alle Sessions des Servers"""
+    return ConnectionPool(db_path)
+
+
+def get_connection(db_path=DB_PATH):
+    """Verbindung aus dem Pool - nach Gebrauch wie gewohnt mit close() zurückgeben"""
+    return get_pool(db_path).acquire()
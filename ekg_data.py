@@ -6,7 +6,7 @@ import plotly.graph_objects as go
 import plotly.io as pio
 pio.renderers.default = "browser"
 from datetime import datetime
-import sqlite3
+from db import get_connection
 
 
 class EKG_data:
@@ -34,7 +34,7 @@ class EKG_data:
     @staticmethod
     def load_by_id_from_db(ekg_id):
         """Lädt EKG-Daten anhand der EKG-ID direkt aus der Datenbank."""
-        conn = sqlite3.connect("personen.db")
+        conn = get_connection()
         cursor = conn.cursor()
 
         # Hole EKG-Eintrag
@@ -93,7 +93,8 @@ class EKG_data:
 
         return pd.DataFrame(peaks, columns=["index", "value"])
    
-    def calc_max_heart_rate(self, year_of_birth, gender):
+    @staticmethod
+    def calc_max_heart_rate(year_of_birth, gender):
         """Berechnet die maximale Herzfrequenz basierend auf Alter und Geschlecht."""
         age = datetime.now().year - year_of_birth
 
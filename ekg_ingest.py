@@ -0,0 +1,133 @@
+# ekg_ingest.py - EKG-Dateien einlesen (Formaterkennung), Binär-Cache und R-Zacken-Index
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from blob_store import hash_file
+
+EKG_CACHE_DIR = os.path.join("data", "ekg_cache")
+SAMPLING_RATE = 500  # Hz - alle EKG-Aufzeichnungen der App
+TEXT_SEPARATORS = ['\t', ';', ',', ' ']
+
+
+def read_ekg_table(file_path):
+    """
+    Liest eine EKG-Datei als DataFrame; das Format wird an Endung und Trennzeichen erkannt.
+
+    .csv mit Kopfzeile, .txt mit Tab, Semikolon, Komma oder Leerzeichen
+    (erstes Trennzeichen, das mindestens zwei Spalten ergibt), sonst CSV ohne Kopfzeile.
+    """
+    if file_path.endswith('.csv'):
+        return pd.read_csv(file_path)
+    if file_path.endswith('.txt'):
+        for sep in TEXT_SEPARATORS:
+            try:
+                df = pd.read_csv(file_path, sep=sep, header=None)
+            except Exception:
+                continue
+            if df.shape[1] >= 2:
+                return df
+        return pd.read_csv(file_path, sep=r'\s+', header=None)
+    return pd.read_csv(file_path, header=None)
+
+
+def extract_peaks_for_visualization(ekg_data, time_data, sampling_rate=SAMPLING_RATE):
+    """
+    Extract R-peaks for visualization purposes
+    Returns peak indices that can be used for plotting
+    """
+    try:
+        from scipy.signal import find_peaks
+
+        # Same preprocessing as in heart rate calculation
+        ekg_filtered = ekg_data - np.mean(ekg_data)
+
+        # Remove baseline drift
+        if len(ekg_filtered) > 100:
+            window_size = min(len(ekg_filtered) // 10, sampling_rate // 2)
+            if window_size > 5:
+                moving_avg = np.convolve(ekg_filtered, np.ones(window_size)/window_size, mode='same')
+                ekg_filtered = ekg_filtered - moving_avg
+
+        # Calculate threshold
+        signal_abs = np.abs(ekg_filtered)
+        signal_std = np.std(signal_abs)
+        signal_mean = np.mean(signal_abs)
+        threshold = max(np.percentile(signal_abs, 85), signal_mean + 1.5 * signal_std)
+
+        # Find peaks
+        min_distance_samples = int(0.3 * sampling_rate)
+        peaks, _ = find_peaks(
+            ekg_filtered,
+            height=threshold * 0.7,
+            distance=min_distance_samples,
+            prominence=signal_std * 0.3,
+            width=1
+        )
+
+        return peaks
+
+    except Exception:
+        return None
+
+
+def ekg_cache_path(content_hash):
+    """Pfad des Binär-Caches: data/ekg_cache/<2 Zeichen>/<hash>.npz"""
+    return os.path.join(EKG_CACHE_DIR, content_hash[:2], f"{content_hash}.npz")
+
+
+def load_ekg_cache(content_hash):
+    """
+    Eingelesenes Signal aus dem Binär-Cache, sonst None.
+
+    Returns:
+        dict: 'ekg', 'time_raw' (Rohwerte der zweiten Spalte) und 'peaks' (Indizes)
+    """
+    if not content_hash:
+        return None
+    path = ekg_cache_path(content_hash)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as cached:
+        return {key: cached[key] for key in ('ekg', 'time_raw', 'peaks')}
+
+
+def ingest_ekg_file(file_path):
+    """
+    Liest eine EKG-Datei einmal ein und legt Signal und R-Zacken-Index im Binär-Cache ab.
+
+    Greift nicht auf die Datenbank zu und läuft daher auch in Worker-Prozessen;
+    bereits gecachte Inhalte (gleicher Hash) werden nicht erneut gelesen.
+
+    Returns:
+        tuple: (file_path, content_hash, size_bytes, samples, peaks)
+    """
+    content_hash = hash_file(file_path)
+    size_bytes = os.path.getsize(file_path)
+    cached = load_ekg_cache(content_hash)
+    if cached is not None:
+        return file_path, content_hash, size_bytes, len(cached['ekg']), len(cached['peaks'])
+
+    df = read_ekg_table(file_path)
+    if df.shape[1] < 2:
+        raise ValueError(f"{file_path}: keine zwei Spalten (EKG, Zeit) erkannt")
+    ekg = df[df.columns[0]].values.astype(float)
+    time_raw = df[df.columns[1]].values.astype(float)
+    peaks = extract_peaks_for_visualization(ekg, None)
+    peaks = np.asarray(peaks if peaks is not None else [], dtype=np.int64)
+
+    path = ekg_cache_path(content_hash)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Erst in eine eigene temporäre Datei schreiben, damit kein halber Cache sichtbar wird -
+    # Worker mit gleichem Inhalt schreiben sonst in dieselbe Datei
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp.npz", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, ekg=ekg, time_raw=time_raw, peaks=peaks)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return file_path, content_hash, size_bytes, len(ekg), len(peaks)
@@ -0,0 +1,136 @@
+# gps_route.py - GPS-Route: Umrechnung, Bereinigung und Vereinfachung für Kartenansichten
+import numpy as np
+
+from activity import as_activity
+
+# FIT speichert Positionen als Semicircles (2^31 entspricht 180°)
+SEMICIRCLE_TO_DEG = 180 / 2 ** 31
+
+TILE_SIZE = 256  # Pixel je Web-Mercator-Kachel
+MAX_ZOOM = 18
+ROUTE_TOLERANCE_PX = 1.5  # Abweichung, die auf der Karte nicht mehr sichtbar ist
+
+
+def semicircles_to_degrees(values):
+    """Rechnet FIT-Semicircles in Grad um"""
+    return np.asarray(values, dtype=float) * SEMICIRCLE_TO_DEG
+
+
+def route_coordinates(data):
+    """
+    Gültige GPS-Punkte einer Aktivität in Grad.
+
+    Returns:
+        tuple: (lat, lon, indices) - indices sind die Messpunkt-Indizes der
+               Aktivität, damit Zeitfenster auf die Route übertragen werden können
+    """
+    activity = as_activity(data)
+    if 'position_lat' not in activity or 'position_long' not in activity:
+        return np.array([]), np.array([]), np.array([], dtype=int)
+
+    lat = semicircles_to_degrees(activity.column('position_lat'))
+    lon = semicircles_to_degrees(activity.column('position_long'))
+    # Fehlende Fixes, (0, 0) als Platzhalter und Werte außerhalb des Wertebereichs verwerfen
+    valid = (activity.valid('position_lat') & activity.valid('position_long')
+             & ~((lat == 0) & (lon == 0))
+             & (np.abs(lat) <= 90) & (np.abs(lon) <= 180))
+    indices = np.flatnonzero(valid)
+    return lat[indices], lon[indices], indices
+
+
+def to_pixels(lat, lon, zoom):
+    """Web-Mercator-Pixelkoordinaten bei gegebener Zoomstufe"""
+    world = TILE_SIZE * 2 ** zoom
+    x = (np.asarray(lon) + 180) / 360 * world
+    sin_lat = np.sin(np.radians(np.clip(lat, -85.05, 85.05)))
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)) * world
+    return x, y
+
+
+def from_pixels(x, y, zoom):
+    """Umkehrung von to_pixels: Web-Mercator-Pixel in Grad"""
+    world = TILE_SIZE * 2 ** zoom
+    lon = np.asarray(x) / world * 360 - 180
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(y) / world))))
+    return lat, lon
+
+
+def douglas_peucker(x, y, tolerance):
+    """
+    Douglas-Peucker-Vereinfachung, gibt die Indizes der behaltenen Punkte zurück.
+
+    Iterativ statt rekursiv; die Abstände aller Punkte eines Abschnitts zur
+    Sehne werden jeweils in einer vektorisierten Operation berechnet.
+    """
+    n = len(x)
+    if n < 3:
+        return np.arange(n)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        length = np.hypot(dx, dy)
+        if length == 0:
+            distances = np.hypot(px, py)
+        else:
+            distances = np.abs(px * dy - py * dx) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return np.flatnonzero(keep)
+
+
+def fit_zoom(lat, lon, width_px=800, height_px=500):
+    """Größte Zoomstufe, bei der die ganze Route in die Karte passt"""
+    if len(lat) == 0:
+        return 12
+    # Ausdehnung bei Zoom 0 - jede Stufe verdoppelt sie
+    x, y = to_pixels(lat, lon, 0)
+    span = max(np.ptp(x) / width_px, np.ptp(y) / height_px)
+    if span == 0:
+        return MAX_ZOOM
+    return int(np.clip(np.floor(-np.log2(span)), 1, MAX_ZOOM))
+
+
+def simplify_route(data, zoom, tolerance_px=ROUTE_TOLERANCE_PX):
+    """
+    Vereinfachte Route für eine Zoomstufe.
+
+    Returns:
+        dict: 'lat', 'lon' (Grad) und 'indices' (Messpunkt-Indizes der behaltenen Punkte)
+    """
+    lat, lon, indices = route_coordinates(data)
+    x, y = to_pixels(lat, lon, zoom)
+    kept = douglas_peucker(x, y, tolerance_px)
+    return {'lat': lat[kept], 'lon': lon[kept], 'indices': indices[kept]}
+
+
+def route_window(route, lo, hi):
+    """
+    Teil einer vereinfachten Route für den Messpunkt-Bereich [lo, hi).
+
+    Anfang und Ende liegen meist zwischen zwei behaltenen Punkten; sie werden
+    auf deren Sehne interpoliert, damit die Linie den ganzen Bereich abdeckt.
+    """
+    indices = route['indices']
+    start = max(lo, indices[0]) if len(indices) else lo
+    end = min(hi - 1, indices[-1]) if len(indices) else lo - 1
+    if end < start:
+        return np.array([]), np.array([])
+
+    first = np.searchsorted(indices, start, side='right')
+    last = np.searchsorted(indices, end, side='left')
+    return tuple(
+        np.concatenate(([np.interp(start, indices, values)], values[first:last],
+                        [np.interp(end, indices, values)]))
+        for values in (route['lat'], route['lon'])
+    )
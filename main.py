@@ -6,6 +6,7 @@ import time
 import pandas as pd
 from person import Person
 from ekg_data import EKG_data
+from ekg_ingest import read_ekg_table, load_ekg_cache, extract_peaks_for_visualization
 from database_auth import DatabaseAuth
 import pandas as pd
 import plotly.graph_objects as go
@@ -14,16 +15,32 @@ import numpy as np
 import os
 from datetime import datetime, date
 import sqlite3
-from PIL import Image
-import io
 import base64
 import bcrypt
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 from matplotlib.widgets import RangeSlider
 from scipy.signal import find_peaks
-from PIL import Image, ExifTags
-from sport_data import load_sports_data, filter_data_by_time_range, calculate_filtered_stats, format_duration, load_sports_data, create_activity_heatmap, create_intensity_heatmap, create_geographic_heatmap
+from sport_data import load_sports_data, load_fit_file, get_percent_range_indices, slice_data, format_duration, load_sports_data, create_activity_heatmap, create_intensity_heatmap, create_geographic_heatmap
+from range_stats import RangeStats
+from resampling import resample_activity, moving_seconds, window_indices
+from rollups import build_rollups, rollup_window
+from gps_route import fit_zoom, simplify_route, route_window
+from route_heatmap import heatmap_points, heatmap_version
+from segments import find_segment_passes, stream_coordinates
+from activity_summary import get_season_overview
+from activity_import import process_session, backfill_sessions, rescore_user_ftp
+from power_curve import get_session_curves, get_user_envelope, DURATION_GRID, format_duration_label
+from training_load import get_load_series, default_series_start, get_user_hr_profile, get_user_ftp, FTP_MIN_WATTS, FTP_MAX_WATTS
+from zones import ZoneIndex, HR_ZONE_NAMES, POWER_ZONE_NAMES
+from db import DB_PATH, get_connection
+from write_behind import get_write_queue
+from auth_cache import get_credentials, invalidate_credentials, get_session_user, clear_session_user, load_user_counts
+from migrations import run_migrations
+from picture_store import store_picture, get_picture_path
+from repository import (USER_COLUMNS, get_users_page, get_users_with_ekg_counts, get_ekg_count,
+                        get_ekg_tests_by_user, search_users_by_name, get_user, get_database_info)
+from blob_store import backfill_content_hashes, add_sports_session, add_ekg_test, delete_sports_session, resolve_sports_file
 
 st.set_page_config(
     page_title="EKG & Sports Analyse Dashboard",
@@ -32,84 +49,81 @@ st.set_page_config(
     page_icon="🫀🏃‍♂️"
 )
 
+DATABASE_INFO_TTL_SECONDS = 60  # row counts and index sizes scan the tables - refresh at most once a minute
+
 @st.cache_data
 def load_sports_data_cached():
     """Cached version of load_sports_data to improve performance"""
     return load_sports_data()
 
+@st.cache_data
+def load_fit_file_cached(content_key, _file_path):
+    """Cached .fit decoding keyed by content hash - identical uploads share one cache entry"""
+    return load_fit_file(_file_path)
 
-# Database helper functions for personen.db
-def init_personen_db():
-    """Initialize personen.db with users table if it doesn't exist"""
-    conn = sqlite3.connect('personen.db')
-    cursor = conn.cursor()
-    
-    # Create users table if it doesn't exist
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            email TEXT NOT NULL,
-            full_name TEXT NOT NULL,
-            firstname TEXT,
-            lastname TEXT,
-            date_of_birth TEXT,
-            gender TEXT,
-            height_cm INTEGER,
-            weight_kg REAL,
-            picture_path TEXT,
-            picture_data BLOB,
-            role TEXT DEFAULT 'user',
-            is_active BOOLEAN DEFAULT 1,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_login TIMESTAMP
-        )
-    ''')
-    
-    # Create sports_sessions table if it doesn't exist
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sports_sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            file_name TEXT NOT NULL,
-            timestamp TEXT NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    conn.commit()
+@st.cache_data
+def load_activity_stream_cached(content_key, _file_path):
+    """1 Hz resampled activity with validity masks and pauses, cached next to the decoded file"""
+    return resample_activity(load_fit_file_cached(content_key, _file_path))
+
+@st.cache_data
+def load_activity_rollups_cached(content_key, _file_path):
+    """Mean/min/max rollups at 5 s, 30 s and 5 min, built once per cached activity"""
+    return build_rollups(load_activity_stream_cached(content_key, _file_path))
+
+@st.cache_data
+def simplify_route_cached(content_key, _file_path, zoom):
+    """GPS route in degrees, Douglas-Peucker simplified for one zoom level"""
+    return simplify_route(load_fit_file_cached(content_key, _file_path), zoom)
+
+@st.cache_resource
+def get_zone_index_cached(content_key, max_hr, ftp, _stream):
+    """Zone assignment and cumulative zone counts per activity, max HR and FTP"""
+    return ZoneIndex(_stream, max_hr, ftp)
+
+@st.cache_resource
+def get_range_stats_cached(content_key, _data):
+    """Prefix sums and sparse tables per activity - every slider window is answered in O(1)"""
+    return RangeStats(_data)
+
+@st.cache_data
+def get_heatmap_points_cached(user_id, tile_version):
+    """Heatmap cells per user (None = all users) - tile_version changes whenever a session is added"""
+    conn = get_connection()
+    points = heatmap_points(conn, user_id)
+    conn.close()
+    return points
+
+
+@st.cache_data
+def get_picture_path_cached(picture_hash, size):
+    """Thumbnail path per picture and size - stored pictures never change, so the lookup cannot go stale"""
+    if not picture_hash:
+        return None
+    conn = get_connection()
+    path = get_picture_path(conn, picture_hash, size)
     conn.close()
+    return path
 
+
+@st.cache_data(ttl=DATABASE_INFO_TTL_SECONDS)
+def get_database_info_cached():
+    """Schema, table sizes, index usage and recent activity for the Datenbank-Info tab - refreshed after the TTL"""
+    conn = get_connection()
+    info = get_database_info(conn, DB_PATH)
+    conn.close()
+    return info
+
+
+# Database helper functions for personen.db
 def save_user_to_personen_db(user_data, picture_file=None):
     """Save user to personen.db"""
     try:
-        conn = sqlite3.connect('personen.db')
+        conn = get_connection()
         cursor = conn.cursor()
         
-        picture_path = None
-        picture_data = None
-        
-        # Handle picture upload
-        if picture_file is not None:
-            # Create pictures directory if it doesn't exist
-            pictures_dir = "user_pictures"
-            os.makedirs(pictures_dir, exist_ok=True)
-            
-            # Save picture file
-            picture_filename = f"{user_data['username']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-            picture_path = os.path.join(pictures_dir, picture_filename)
-            
-            # Convert and save image
-            image = Image.open(picture_file)
-            # Resize image to reasonable size
-            image.thumbnail((300, 300), Image.Resampling.LANCZOS)
-            image.save(picture_path, "JPEG")
-            
-            # Also store as BLOB in database
-            img_byte_arr = io.BytesIO()
-            image.save(img_byte_arr, format='JPEG')
-            picture_data = img_byte_arr.getvalue()
+        # Handle picture upload - stored once in the picture store with all thumbnail sizes
+        picture_hash = store_picture(conn, picture_file) if picture_file is not None else None
         
         # Hash password
         salt = bcrypt.gensalt()
@@ -118,9 +132,9 @@ def save_user_to_personen_db(user_data, picture_file=None):
         cursor.execute('''
             INSERT INTO users (
                 username, password, email, full_name, firstname, lastname,
-                date_of_birth, gender, height_cm, weight_kg, picture_path, 
-                picture_data, role, is_active
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                date_of_birth, gender, height_cm, weight_kg, picture_hash,
+                role, is_active
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             user_data['username'],
             hashed_password,
@@ -132,14 +146,14 @@ def save_user_to_personen_db(user_data, picture_file=None):
             user_data['gender'],
             user_data['height_cm'],
             user_data['weight_kg'],
-            picture_path,
-            picture_data,
+            picture_hash,
             user_data.get('role', 'user'),
             True
         ))
         
         conn.commit()
         conn.close()
+        invalidate_credentials()
         return True, "Benutzer erfolgreich erstellt!"
         
     except sqlite3.IntegrityError:
@@ -147,113 +161,15 @@ def save_user_to_personen_db(user_data, picture_file=None):
     except Exception as e:
         return False, f"Fehler beim Erstellen des Benutzers: {str(e)}"
 
-def get_user_from_personen_db(username):
-    """Get user from personen.db"""
-    conn = sqlite3.connect('personen.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
-    user = cursor.fetchone()
-    
-    conn.close()
-    return user
-
-def get_all_users_from_personen_db():
-    """Get all users from personen.db for authentication"""
-    conn = sqlite3.connect('personen.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT username, password, full_name, email, role FROM users WHERE is_active = 1')
-    users = cursor.fetchall()
-    
-    conn.close()
-    
-    # Format for streamlit_authenticator
-    credentials = {
-        'usernames': {}
-    }
-    
-    for user in users:
-        credentials['usernames'][user[0]] = {
-            'password': user[1],
-            'name': user[2],
-            'email': user[3],
-            'role': user[4]
-        }
-    
-    return credentials
-
 def update_last_login_personen_db(username):
-    """Update last login timestamp"""
-    conn = sqlite3.connect('personen.db')
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        'UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE username = ?',
-        (username,)
-    )
-    
-    conn.commit()
-    conn.close()
-
-def init_ekg_tables():
-    """Initialize EKG-related tables in personen.db"""
-    conn = sqlite3.connect('personen.db')
-    cursor = conn.cursor()
-    
-    # Create ekg_tests table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ekg_tests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            test_date TEXT NOT NULL,
-            file_path TEXT NOT NULL,
-            result_data TEXT,
-            max_heart_rate INTEGER,
-            avg_heart_rate REAL,
-            duration_seconds REAL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-
-def save_ekg_test_to_db(user_id, test_date, file_path, result_data=None, max_hr=None, avg_hr=None, duration=None):
-    """Save EKG test to database"""
-    conn = sqlite3.connect('personen.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO ekg_tests (user_id, test_date, file_path, result_data, max_heart_rate, avg_heart_rate, duration_seconds)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (user_id, test_date, file_path, result_data, max_hr, avg_hr, duration))
-    
-    conn.commit()
-    test_id = cursor.lastrowid
-    conn.close()
-    return test_id
-
-def get_ekg_tests_for_user(user_id):
-    """Get all EKG tests for a specific user"""
-    conn = sqlite3.connect('personen.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT id, test_date, file_path, result_data, max_heart_rate, avg_heart_rate, duration_seconds, created_at
-        FROM ekg_tests 
-        WHERE user_id = ? 
-        ORDER BY test_date DESC
-    ''', (user_id,))
-    
-    tests = cursor.fetchall()
-    conn.close()
-    return tests
+    """Queue last login and login event - written by the background writer, never blocks the rerun"""
+    write_queue = get_write_queue()
+    write_queue.record_login(username)
+    write_queue.record_event(username, 'login')
 
 def get_user_with_ekg_data():
     """Get all users who have EKG data"""
-    conn = sqlite3.connect('personen.db')
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT DISTINCT u.* 
@@ -411,72 +327,19 @@ def streamlit_heart_rate_calculation(ekg_data, time_data_raw, sampling_rate=500)
         return None, f"Error in heart rate calculation: {str(e)}"
 
 
-# Also update the peak detection code for visualization
-def extract_peaks_for_visualization(ekg_data, time_data, sampling_rate=500):
-    """
-    Extract R-peaks for visualization purposes
-    Returns peak indices that can be used for plotting
-    """
-    try:
-        from scipy.signal import find_peaks
-        import numpy as np
-        
-        # Same preprocessing as in heart rate calculation
-        ekg_filtered = ekg_data - np.mean(ekg_data)
-        
-        # Remove baseline drift
-        if len(ekg_filtered) > 100:
-            window_size = min(len(ekg_filtered) // 10, sampling_rate // 2)
-            if window_size > 5:
-                moving_avg = np.convolve(ekg_filtered, np.ones(window_size)/window_size, mode='same')
-                ekg_filtered = ekg_filtered - moving_avg
-        
-        # Calculate threshold
-        signal_abs = np.abs(ekg_filtered)
-        signal_std = np.std(signal_abs)
-        signal_mean = np.mean(signal_abs)
-        threshold = max(np.percentile(signal_abs, 85), signal_mean + 1.5 * signal_std)
-        
-        # Find peaks
-        min_distance_samples = int(0.3 * sampling_rate)
-        peaks, _ = find_peaks(
-            ekg_filtered,
-            height=threshold * 0.7,
-            distance=min_distance_samples,
-            prominence=signal_std * 0.3,
-            width=1
-        )
-        
-        return peaks
-        
-    except Exception:
-        return None
-    
-def init_ekg_tables():
-    """Initialize EKG tables if they don't exist"""
-    conn = sqlite3.connect('personen.db')
-    cursor = conn.cursor()
-    
-    # Create ekg_tests table if it doesn't exist
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ekg_tests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            date TEXT NOT NULL,
-            result_link TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
+@st.cache_resource
+def init_database():
+    """Migrate personen.db to the current schema and register legacy files - once per server process"""
+    conn = get_connection()
+    run_migrations(conn)
+    backfill_content_hashes(conn)
     conn.commit()
     conn.close()
 
-# Initialize personen.db
-init_personen_db()
+init_database()
 
-# Get credentials from personen.db
-credentials = get_all_users_from_personen_db()
+# Credentials from the process-wide cache - reruns do no credential I/O
+credentials = get_credentials()
 
 if credentials['usernames']:
     authenticator = stauth.Authenticate(
@@ -497,6 +360,11 @@ if credentials['usernames']:
     name = st.session_state.get('name')
     username = st.session_state.get('username')
     
+    if not authentication_status:
+        # Logged out - the next login loads the user row and records the login again
+        clear_session_user()
+        st.session_state.pop('last_login_recorded', None)
+    
     if authentication_status == False:
         st.error('❌ Benutzername/Passwort ist falsch')
 
@@ -571,11 +439,19 @@ if credentials['usernames']:
                         else:
                             st.error(f"❌ {message}")
     elif authentication_status:
-        # Login successful - Update last login
-        update_last_login_personen_db(username)
+        if username not in credentials['usernames']:
+            # Deactivated while logged in
+            st.error("❌ Dieses Benutzerkonto ist deaktiviert.")
+            authenticator.logout('Logout', 'sidebar')
+            st.stop()
+        
+        # Login successful - Update last login once per session
+        if st.session_state.get('last_login_recorded') != username:
+            update_last_login_personen_db(username)
+            st.session_state['last_login_recorded'] = username
         
-        # Get user info from personen.db
-        user_data = get_user_from_personen_db(username)
+        # User row cached for this session
+        user_data = get_session_user(username)
         current_user_role = credentials['usernames'][username]['role']
         
         # Logout button
@@ -599,12 +475,9 @@ if credentials['usernames']:
             with col1:
                 st.markdown(f"**Willkommen, {name}!**")
                 # Show user's profile picture if available
-                if user_data and user_data[12]:  # picture_data column
-                    try:
-                        image = Image.open(io.BytesIO(user_data[12]))
-                        st.image(image, width=100, caption="Ihr Profilbild")
-                    except:
-                        pass
+                picture_path = get_picture_path_cached(user_data[12], 100) if user_data else None  # picture_hash column
+                if picture_path:
+                    st.image(picture_path, width=100, caption="Ihr Profilbild")
             with col2:
                 st.markdown("👤 **Benutzer**")
         
@@ -641,42 +514,62 @@ if credentials['usernames']:
         if current_user_role == 'admin' and admin_tab == "👥 Benutzerverwaltung":
             st.header("👥 Benutzerverwaltung")
             
-            # Get all users from personen.db
-            conn = sqlite3.connect('personen.db')
-            users_df = pd.read_sql_query('SELECT * FROM users ORDER BY created_at DESC', conn)
-            conn.close()
+            # User statistics - one aggregate query, cached briefly and cleared on user changes
+            user_counts = load_user_counts()
             
-            # User statistics
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("👥 Gesamt Benutzer", len(users_df))
+                st.metric("👥 Gesamt Benutzer", user_counts['total'])
             with col2:
-                admin_count = len(users_df[users_df['role'] == 'admin'])
-                st.metric("🩺 Admins", admin_count)
+                st.metric("🩺 Admins", user_counts['admins'])
             with col3:
-                user_count = len(users_df[users_df['role'] == 'user'])
-                st.metric("👤 Benutzer", user_count)
+                st.metric("👤 Benutzer", user_counts['users'])
             with col4:
-                active_count = len(users_df[users_df['is_active'] == 1])
-                st.metric("✅ Aktiv", active_count)
+                st.metric("✅ Aktiv", user_counts['active'])
             
             st.markdown("---")
             
-            # Show all users with pictures
+            # Show one page of users - filters run in SQL, pages are read by keyset (id)
             st.subheader("📋 Alle Benutzer")
             
-            for index, user in users_df.iterrows():
+            filter_col1, filter_col2, filter_col3 = st.columns(3)
+            with filter_col1:
+                name_filter = st.text_input("🔍 Name beginnt mit", key="user_list_name").strip()
+            with filter_col2:
+                role_filter = st.selectbox("🩺 Rolle", ["Alle", "admin", "user"], key="user_list_role")
+            with filter_col3:
+                status_filter = st.selectbox("✅ Status", ["Alle", "Aktiv", "Inaktiv"], key="user_list_status")
+            
+            # Page cursors (last id of each previous page); reset whenever the filters change
+            user_filters = (name_filter, role_filter, status_filter)
+            if st.session_state.get("user_list_filters") != user_filters:
+                st.session_state.user_list_filters = user_filters
+                st.session_state.user_list_cursors = []
+            cursors = st.session_state.user_list_cursors
+            
+            conn = get_connection()
+            users_page, has_next_page = get_users_page(
+                conn,
+                after_id=cursors[-1] if cursors else None,
+                role=None if role_filter == "Alle" else role_filter,
+                is_active=None if status_filter == "Alle" else status_filter == "Aktiv",
+                name_prefix=name_filter or None,
+            )
+            conn.close()
+            
+            if not users_page:
+                st.info("Keine Benutzer für diese Filter gefunden.")
+            
+            for user in users_page:
                 with st.expander(f"👤 {user['full_name']} (@{user['username']})"):
                     col1, col2, col3 = st.columns([1, 2, 1])
                     
                     with col1:
                         # Show profile picture if available
-                        if user['picture_data']:
-                            try:
-                                image = Image.open(io.BytesIO(user['picture_data']))
-                                st.image(image, width=150, caption="Profilbild")
-                            except:
-                                st.info("📷 Bild nicht ladbar")
+                        # Thumbnail is only looked up when the expander is rendered
+                        picture_path = get_picture_path_cached(user['picture_hash'], 150)
+                        if picture_path:
+                            st.image(picture_path, width=150, caption="Profilbild")
                         else:
                             st.info("📷 Kein Bild")
                     
@@ -697,41 +590,76 @@ if credentials['usernames']:
                         # Admin actions
                         if user['username'] != 'admin' and user['is_active']:
                             if st.button(f"🗑️ Deaktivieren", key=f"deactivate_{user['username']}"):
-                                conn = sqlite3.connect('personen.db')
+                                conn = get_connection()
                                 cursor = conn.cursor()
                                 cursor.execute('UPDATE users SET is_active = 0 WHERE username = ?', (user['username'],))
                                 conn.commit()
                                 conn.close()
+                                invalidate_credentials()
+                                get_write_queue().record_event(username, 'deactivate_user', user['username'])
                                 st.success("Benutzer deaktiviert!")
                                 st.rerun()
+            
+            # Page navigation
+            nav_col1, nav_col2, nav_col3 = st.columns([1, 2, 1])
+            with nav_col1:
+                if st.button("◀ Zurück", disabled=not cursors, key="user_list_prev"):
+                    cursors.pop()
+                    st.rerun()
+            with nav_col2:
+                st.caption(f"Seite {len(cursors) + 1}")
+            with nav_col3:
+                if st.button("Weiter ▶", disabled=not has_next_page, key="user_list_next"):
+                    cursors.append(users_page[-1]['id'])
+                    st.rerun()
         
         elif current_user_role == 'admin' and admin_tab == "🗃️ Datenbank-Info":
             st.header("🗃️ Datenbank-Informationen")
             
             st.subheader("📊 Personen.db Status")
             
-            # Show database structure
-            conn = sqlite3.connect('personen.db')
+            db_info = get_database_info_cached()
+            user_counts = load_user_counts()
             
-            # Table info
-            cursor = conn.cursor()
-            cursor.execute("PRAGMA table_info(users)")
-            columns = cursor.fetchall()
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("💾 Dateigröße", f"{db_info['db_size_mb']} MB")
+            with col2:
+                st.metric("🗂️ Tabellen", len(db_info['tables']))
+            with col3:
+                st.metric("🔑 Logins (7 Tage)", user_counts['recent_logins'])
+            with col4:
+                st.metric("📷 Mit Profilbild", user_counts['with_pictures'])
+            
+            st.write("**Tabellen:**")
+            tables_df = pd.DataFrame(db_info['tables']).rename(columns={
+                'table': 'Tabelle', 'rows': 'Zeilen', 'indexes': 'Indizes', 'size_kb': 'Größe (KB)'
+            })
+            st.dataframe(tables_df, hide_index=True)
+            
+            st.write("**Index-Nutzung:**")
+            st.caption("Welche häufigen Abfragen der App welchen Index verwenden (laut EXPLAIN QUERY PLAN)")
+            indexes_df = pd.DataFrame([
+                {
+                    'Index': index['index'],
+                    'Tabelle': index['table'],
+                    'Größe (KB)': index['size_kb'],
+                    'Genutzt von': ", ".join(index['used_by']) or "–",
+                }
+                for index in db_info['indexes']
+            ])
+            st.dataframe(indexes_df, hide_index=True)
             
             st.write("**Tabellen-Struktur (users):**")
-            columns_df = pd.DataFrame(columns, columns=['ID', 'Name', 'Type', 'NotNull', 'Default', 'PK'])
+            columns_df = pd.DataFrame(db_info['columns']).rename(columns={
+                'cid': 'ID', 'name': 'Name', 'type': 'Type', 'notnull': 'NotNull', 'dflt_value': 'Default', 'pk': 'PK'
+            })
             st.dataframe(columns_df)
             
-            # Recent activity
-            recent_users = pd.read_sql_query(
-                'SELECT username, full_name, created_at, last_login FROM users ORDER BY created_at DESC LIMIT 10',
-                conn
-            )
-            
             st.write("**Letzte Aktivitäten:**")
-            st.dataframe(recent_users)
+            st.dataframe(pd.DataFrame(db_info['recent_activity']))
             
-            conn.close()
+            st.caption(f"Stand: zwischengespeichert für {DATABASE_INFO_TTL_SECONDS} s")
         
                     
         # EKG-ANALYSE-BEREICH
@@ -739,8 +667,6 @@ if credentials['usernames']:
             st.header("🫀 EKG Analyse")
             st.markdown("---")
 
-            # Initialize EKG tables
-            init_ekg_tables()
             try:
                 # ROLE-BASED ACCESS CONTROL
                 if current_user_role == 'admin':
@@ -749,43 +675,25 @@ if credentials['usernames']:
                     
                     # Load users with EKG data from database
                     try:
-                        # Load ALL users for admin, not just users with EKG data
-                        conn = sqlite3.connect('personen.db')
-                        cursor = conn.cursor()
-                        cursor.execute('SELECT id, username, firstname, lastname FROM users WHERE 1=1')
-                        all_users = cursor.fetchall()
+                        # Load ALL users for admin with their EKG test counts - one LEFT JOIN/GROUP BY query
+                        conn = get_connection()
+                        all_users = get_users_with_ekg_counts(conn)
                         conn.close()
                         
                         if not all_users:
                             st.warning("⚠️ Keine Benutzer in der Datenbank verfügbar")
                             st.stop()
                         
-                        # Check which users have EKG data
-                        users_with_ekg = []
-                        conn = sqlite3.connect('personen.db')
-                        cursor = conn.cursor()
-                        for user in all_users:
-                            cursor.execute('SELECT COUNT(*) FROM ekg_tests WHERE user_id = ?', (user[0],))
-                            ekg_count = cursor.fetchone()[0]
-                            if ekg_count > 0:
-                                users_with_ekg.append(user + (ekg_count,))  # Add EKG count to user data
-                        conn.close()
-                            
+                        users_with_ekg = {user_id: user for user_id, user in all_users.items() if user['ekg_count'] > 0}
                         
                         # Create user selection options for ALL users (ADMIN ONLY)
                         user_options = {}
-                        for user in all_users:
-                            display_name = f"{user[2]} {user[3]}" if user[2] and user[3] else user[1]  # firstname lastname or username
-                            # Check if user has EKG data
-                            has_ekg = any(u[0] == user[0] for u in users_with_ekg)
-                            ekg_count = next((u[4] for u in users_with_ekg if u[0] == user[0]), 0)
-                            
-                            if has_ekg:
-                                display_name += f" ({ekg_count} EKG-Tests)"
+                        for user in all_users.values():
+                            if user['ekg_count'] > 0:
+                                option = f"{user['display_name']} ({user['ekg_count']} EKG-Tests)"
                             else:
-                                display_name += " (Keine EKG-Daten)"
-                            
-                            user_options[display_name] = user[0]  # user_id
+                                option = f"{user['display_name']} (Keine EKG-Daten)"
+                            user_options[option] = user['id']
                             
                         # Person selection in sidebar (ADMIN ONLY)
                         with st.sidebar:
@@ -807,7 +715,7 @@ if credentials['usernames']:
                             selected_user_id = user_options[selected_user_name]
                             
                             # Show import option if selected user has no EKG data
-                            selected_user_has_ekg = any(u[0] == selected_user_id for u in users_with_ekg)
+                            selected_user_has_ekg = selected_user_id in users_with_ekg
                             if not selected_user_has_ekg:
                                 with st.expander("📥 EKG-Daten für diesen Benutzer importieren"):
                                     with st.form("ekg_import_form"):
@@ -817,26 +725,12 @@ if credentials['usernames']:
                                         if st.form_submit_button("📤 EKG-Test hinzufügen"):
                                             if ekg_file is not None:
                                                 try:
-                                                    # Create EKG data directory
-                                                    ekg_dir = "data/ekg_data"
-                                                    os.makedirs(ekg_dir, exist_ok=True)
-                                                    
-                                                    # Save file
-                                                    timestamp = int(time.time())
-                                                    filename = f"ekg_{selected_user_id}_{timestamp}_{ekg_file.name}"
-                                                    file_path = os.path.join(ekg_dir, filename)
-                                                    
-                                                    with open(file_path, "wb") as f:
-                                                        f.write(ekg_file.read())
-                                                    
-                                                    # Save to database
-                                                    conn = sqlite3.connect('personen.db')
-                                                    cursor = conn.cursor()
-                                                    cursor.execute('''
-                                                        INSERT INTO ekg_tests (user_id, date, result_link)
-                                                        VALUES (?, ?, ?)
-                                                    ''', (selected_user_id, str(test_date), file_path))
-                                                    test_id = cursor.lastrowid
+                                                    # Store file content-addressed - identical uploads share one blob
+                                                    conn = get_connection()
+                                                    test_id, file_path, is_duplicate = add_ekg_test(
+                                                        conn, selected_user_id, str(test_date),
+                                                        ekg_file.getvalue(), os.path.splitext(ekg_file.name)[1].lower()
+                                                    )
                                                     conn.commit()
                                                     conn.close()
                                                     
@@ -855,7 +749,7 @@ if credentials['usernames']:
                     
                     # Get current user's ID
                     try:
-                        current_user_data = get_user_from_personen_db(username)
+                        current_user_data = get_session_user(username)
                         if not current_user_data:
                             st.error("❌ Benutzerdaten nicht gefunden!")
                             st.stop()
@@ -871,10 +765,8 @@ if credentials['usernames']:
                     # Check if user has EKG data
                     conn = None
                     try:
-                        conn = sqlite3.connect('personen.db')
-                        cursor = conn.cursor()
-                        cursor.execute('SELECT COUNT(*) FROM ekg_tests WHERE user_id = ?', (current_user_id,))
-                        ekg_count = cursor.fetchone()[0]
+                        conn = get_connection()
+                        ekg_count = get_ekg_count(conn, current_user_id)
                         
                         if ekg_count == 0:
                             st.warning("⚠️ Sie haben noch keine EKG-Daten")
@@ -900,9 +792,9 @@ if credentials['usernames']:
                 if selected_user_name and selected_user_id:
                     try:
                         # Get user data from database with correct column names
-                        conn = sqlite3.connect('personen.db')
+                        conn = get_connection()
                         cursor = conn.cursor()
-                        cursor.execute('SELECT * FROM users WHERE id = ?', (selected_user_id,))
+                        cursor.execute(f'SELECT {USER_COLUMNS} FROM users WHERE id = ?', (selected_user_id,))
                         user_data = cursor.fetchone()
                         conn.close()
                         
@@ -925,16 +817,13 @@ if credentials['usernames']:
                         with col1:
                             image_displayed = False
                             
-                            # First try to load from picture_data (BLOB) - index 12
-                            if len(user_data) > 12 and user_data[12]:
-                                try:
-                                    image = Image.open(io.BytesIO(user_data[12]))
-                                    st.image(image, caption=selected_user_name, width=150)
-                                    image_displayed = True
-                                except Exception as e:
-                                    st.warning(f"📷 Fehler beim Laden des BLOB-Bildes: {e}")
+                            # First try the picture store (picture_hash) - index 12
+                            store_path = get_picture_path_cached(user_data[12], 150)
+                            if store_path:
+                                st.image(store_path, caption=selected_user_name, width=150)
+                                image_displayed = True
                             
-                            # If BLOB failed, try picture_path - index 11
+                            # Otherwise try the legacy picture_path - index 11
                             if not image_displayed and len(user_data) > 11 and user_data[11]:
                                 picture_path = user_data[11]
                                 if os.path.exists(picture_path):
@@ -952,7 +841,7 @@ if credentials['usernames']:
                                 # Debug information
                                 if len(user_data) > 11:
                                     st.caption(f"Debug: picture_path = {user_data[11]}")
-                                    st.caption(f"Debug: picture_data exists = {bool(user_data[12]) if len(user_data) > 12 else False}")
+                                    st.caption(f"Debug: picture_hash = {user_data[12]}")
 
                         with col2:
                             st.header("📝 Persönliche Daten")
@@ -962,10 +851,8 @@ if credentials['usernames']:
                             st.write(f"**Geschlecht:** {user_data[8] if len(user_data) > 8 and user_data[8] else 'N/A'}")  # gender
                             
                             # Get EKG test count
-                            conn = sqlite3.connect('personen.db')
-                            cursor = conn.cursor()
-                            cursor.execute('SELECT * FROM ekg_tests WHERE user_id = ?', (selected_user_id,))
-                            ekg_tests = cursor.fetchall()
+                            conn = get_connection()
+                            ekg_tests = get_ekg_tests_by_user(conn, selected_user_id)
                             conn.close()
                             
                             st.write(f"**Verfügbare EKG-Tests:** {len(ekg_tests)}")
@@ -976,10 +863,9 @@ if credentials['usernames']:
                         if ekg_tests:
                             # Create EKG selection options with correct column names
                             ekg_options = {}
-                            for test in ekg_tests:
-                                test_id, user_id, test_date, result_link = test  # Match your db structure
-                                display_text = f"Test {test_id} - {test_date}"
-                                ekg_options[display_text] = test_id
+                            for test in ekg_tests.values():
+                                display_text = f"Test {test['id']} - {test['date']}"
+                                ekg_options[display_text] = test['id']
                             
                             selected_ekg_display = st.selectbox("📊 EKG-Datensatz wählen", list(ekg_options.keys()))
                             selected_ekg_id = ekg_options[selected_ekg_display]
@@ -987,8 +873,8 @@ if credentials['usernames']:
                             if selected_ekg_id:
                                 try:
                                     # Get selected EKG test data
-                                    selected_test = next(test for test in ekg_tests if test[0] == selected_ekg_id)
-                                    test_id, user_id, test_date, result_link = selected_test
+                                    selected_test = ekg_tests[selected_ekg_id]
+                                    test_id, test_date, result_link = selected_test['id'], selected_test['date'], selected_test['result_link']
                                     
                                     # DEBUG: Show file information
                                     # with st.expander("🔍 Debug Information"):
@@ -1017,29 +903,13 @@ if credentials['usernames']:
                                     if result_link and os.path.exists(result_link):
                                         try:
                                             
-                                            # Determine file format and load accordingly
-                                            if result_link.endswith('.csv'):
-                                                df = pd.read_csv(result_link)
-                                            elif result_link.endswith('.txt'):
-                                                # Try different separators for text files
-                                                separators = ['\t', ';', ',', ' ']
-                                                df = None
-                                                for sep in separators:
-                                                    try:
-                                                        df = pd.read_csv(result_link, sep=sep, header=None)  # No header assumption
-                                                        if df.shape[1] >= 2:  # Successfully parsed multiple columns
-                                                            break
-                                                    except:
-                                                        continue
-                                                
-                                                if df is None or df.shape[1] < 2:
-                                                    # Try reading as space-separated
-                                                    df = pd.read_csv(result_link, delim_whitespace=True, header=None)
+                                            # Binary cache from the importer if present, otherwise detect the format and parse
+                                            ekg_cache = load_ekg_cache(selected_test['content_hash'])
+                                            if ekg_cache is not None:
+                                                df = pd.DataFrame({0: ekg_cache['ekg'], 1: ekg_cache['time_raw']})
                                             else:
-                                                df = pd.read_csv(result_link, header=None)
-                                
+                                                df = read_ekg_table(result_link)
                                             
-                                        
                                             # Auto-detect EKG and time columns
                                             if df.shape[1] >= 2:
                                                 # For EKG data: Column 0 = EKG values (mV), Column 1 = Time
@@ -1092,7 +962,10 @@ if credentials['usernames']:
 
                                                     
                                                     # Extract peaks for visualization using the same algorithm
-                                                    peaks = extract_peaks_for_visualization(ekg_data, time_data, sampling_rate=500)
+                                                    if ekg_cache is not None:
+                                                        peaks = ekg_cache['peaks']  # R-peak index from the cache
+                                                    else:
+                                                        peaks = extract_peaks_for_visualization(ekg_data, time_data, sampling_rate=500)
                                                     
                                                     if peaks is not None and len(peaks) > 0:
                                                         st.info(f"🎯 Found {len(peaks)} peaks for visualization")
@@ -1533,48 +1406,28 @@ if credentials['usernames']:
                                                 st.info("Supported formats: .csv, .txt, .dat, .tsv")
                                             else:
                                                 try:
-                                                    # Create EKG data directory
-                                                    ekg_dir = "data/ekg_data"
-                                                    os.makedirs(ekg_dir, exist_ok=True)
-                                                    
-                                                    # Save file with proper extension handling
-                                                    timestamp = int(time.time())
-                                                    # Clean filename to avoid issues
-                                                    clean_filename = "".join(c for c in ekg_file.name if c.isalnum() or c in '._-')
-                                                    filename = f"ekg_{selected_user_id}_{timestamp}_{clean_filename}"
-                                                    file_path = os.path.join(ekg_dir, filename)
-                                                    
-                                                    # Save the uploaded file
-                                                    with open(file_path, "wb") as f:
-                                                        f.write(ekg_file.getbuffer())
-                                                    
-                                                    # Verify file was saved and has content
-                                                    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-                                                        # Save to database with correct column names
-                                                        conn = sqlite3.connect('personen.db')
-                                                        cursor = conn.cursor()
-                                                        cursor.execute('''
-                                                            INSERT INTO ekg_tests (user_id, date, result_link)
-                                                            VALUES (?, ?, ?)
-                                                        ''', (selected_user_id, str(test_date), file_path))
-                                                        test_id = cursor.lastrowid
+                                                    # Save the uploaded file content-addressed
+                                                    ekg_bytes = ekg_file.getvalue()
+                                                    if len(ekg_bytes) > 0:
+                                                        conn = get_connection()
+                                                        test_id, file_path, is_duplicate = add_ekg_test(
+                                                            conn, selected_user_id, str(test_date),
+                                                            ekg_bytes, uploaded_file_extension
+                                                        )
                                                         conn.commit()
                                                         conn.close()
                                                         
                                                         st.success(f"✅ EKG-Test erfolgreich hinzugefügt (ID: {test_id})")
-                                                        st.info(f"📁 Datei gespeichert: {filename}")
+                                                        if is_duplicate:
+                                                            st.info("♻️ Identische Datei bereits vorhanden - kein zusätzlicher Speicher belegt")
+                                                        else:
+                                                            st.info(f"📁 Datei gespeichert: {os.path.basename(file_path)}")
                                                         st.rerun()
                                                     else:
                                                         st.error("❌ Fehler beim Speichern der Datei")
                                                         
                                                 except Exception as e:
                                                     st.error(f"❌ Fehler beim Hinzufügen des EKG-Tests: {e}")
-                                                    # Clean up file if it was partially created
-                                                    if 'file_path' in locals() and os.path.exists(file_path):
-                                                        try:
-                                                            os.remove(file_path)
-                                                        except:
-                                                            pass
                                         else:
                                             st.error("❌ Bitte wählen Sie eine Datei aus")
                             
@@ -1614,50 +1467,48 @@ if credentials['usernames']:
                 st.markdown("---")
                 st.header("📋 Trainings-Analyse")
                 
-                # Load persons data from database for sports
+                # Personenauswahl über den Namensindex - nur die ersten Treffer werden geladen
+                name_prefix = st.text_input("🔍 Name beginnt mit", key="training_name_prefix").strip()
                 try:
-                    conn = sqlite3.connect('personen.db')
-                    cursor = conn.cursor()
-                    cursor.execute('SELECT id, username, firstname, lastname FROM users WHERE is_active = 1')
-                    users = cursor.fetchall()
+                    conn = get_connection()
+                    person_options, has_more = search_users_by_name(conn, name_prefix or None)
                     conn.close()
-                    
-                    person_names = [f"{u[2]} {u[3]}" for u in users if u[2] and u[3]]
-                    if not person_names:
-                        person_names = [u[1] for u in users]  # Fallback to username
-                        
                 except Exception as e:
                     st.error(f"Error loading users: {e}")
-                    person_names = []
+                    person_options, has_more = {}, False
                 
-                if not person_names:
+                if not person_options:
                     st.warning("⚠️ Keine Personen verfügbar")
                     st.stop()
+                if has_more:
+                    st.caption(f"Die ersten {len(person_options)} Treffer - Namensanfang eingeben, um einzugrenzen")
                     
-                selected_name = st.selectbox("👤 Person auswählen", person_names, key="person_select")
+                selected_user_id = st.selectbox(
+                    "👤 Person auswählen",
+                    list(person_options.keys()),
+                    format_func=person_options.get,
+                    key="training_person_select"
+                )
             
             # Main sports analysis content
-            if selected_name:
-                # Find person from database
+            if selected_user_id is not None:
+                selected_name = person_options[selected_user_id]
+                # Find person from database (Primärschlüssel)
                 try:
-                    conn = sqlite3.connect('personen.db')
-                    cursor = conn.cursor()
-                    # Try to find by full name first
-                    cursor.execute('SELECT * FROM users WHERE (firstname || " " || lastname) = ? OR username = ?', 
-                                (selected_name, selected_name))
-                    user_row = cursor.fetchone()
+                    conn = get_connection()
+                    user = get_user(conn, selected_user_id)
                     conn.close()
                     
-                    if user_row:
+                    if user:
                         person = {
-                            'id': user_row[0],
-                            'username': user_row[1],
-                            'full_name': user_row[4],
-                            'firstname': user_row[5],
-                            'lastname': user_row[6],
-                            'date_of_birth': user_row[7],
-                            'gender': user_row[8],
-                            'picture_path': user_row[11] if user_row[11] else "default_picture.jpg"
+                            'id': user['id'],
+                            'username': user['username'],
+                            'full_name': user['full_name'],
+                            'firstname': user['firstname'],
+                            'lastname': user['lastname'],
+                            'date_of_birth': user['date_of_birth'],
+                            'gender': user['gender'],
+                            'picture_path': get_picture_path_cached(user['picture_hash'], 150) or user['picture_path'] or "default_picture.jpg"
                         }
                     else:
                         person = None
@@ -1690,64 +1541,37 @@ if credentials['usernames']:
                 from sport_data import get_time_range_info
 
                 # Load associated .fit files from SQLite and filter by actually available files
-                conn = sqlite3.connect("personen.db")
+                conn = get_connection()
                 cursor = conn.cursor()
                 cursor.execute("""
-                    SELECT file_name, timestamp FROM sports_sessions
+                    SELECT file_name, timestamp, content_hash, id FROM sports_sessions
                     WHERE user_id = ?
                     ORDER BY timestamp DESC
                 """, (person["id"],))
                 user_files = cursor.fetchall()
+                file_paths = {f[0]: resolve_sports_file(conn, f[0], f[2]) for f in user_files}
                 conn.close()
 
-                # # DEBUG: Show what we found
-                # st.subheader("🔍 Debug Information")
-                # st.write(f"📊 Files in database for user {person['id']}: {len(user_files)}")
-                # for f in user_files:
-                #     st.write(f"  - {f[0]} (uploaded: {f[1]})")
-
-                # # DEBUG: Check if files actually exist in folder
-                # data_dir = "data/sports_data"
-                # st.write(f"📁 Checking folder: {data_dir}")
-                # if os.path.exists(data_dir):
-                #     actual_files = os.listdir(data_dir)
-                #     st.write(f"Files in folder: {len(actual_files)}")
-                #     for f in actual_files[:10]:  # Show first 10 files
-                #         st.write(f"  - {f}")
-                # else:
-                #     st.error(f"❌ Folder {data_dir} does not exist!")
-
                 if not user_files:
                     st.warning("📭 Keine .fit-Dateien für diesen Benutzer.")
                     st.stop()
 
-                # Check which files actually exist and can be loaded
+                # Check which files actually exist and can be loaded - decoding is cached per content hash
                 available_files = []
-                data_dir = "data/sports_data"
+                corrupted_files = []
 
                 for f in user_files:
                     filename = f[0]
-                    file_path = os.path.join(data_dir, filename)
+                    file_path = file_paths[filename]
                     
                     # Check if file exists
                     if os.path.exists(file_path):
                         try:
-                            # Try to load the file
-                            from fitparse import FitFile
-                            fitfile = FitFile(file_path)
-                            records = list(fitfile.get_messages('record'))
-                            
-                            if len(records) > 0:
+                            fit_data = load_fit_file_cached(f[2] or file_path, file_path)
+                            if len(fit_data['time']) > 0:
                                 available_files.append(f)
-                                #st.write(f"✅ {filename}: File OK ({len(records)} records)")
-                            #else:
-                                #st.write(f"⚠️ {filename}: No data records found")
-                                
-                        except Exception as e:
-                            #st.write(f"❌ {filename}: Error loading - {e}")
-                            pass
-                    #else:
-                        #st.write(f"❌ {filename}: File not found in {data_dir}")
+                        except Exception:
+                            corrupted_files.append(filename)
 
                 if not available_files:
                     st.warning("📭 Keine gültigen .fit-Dateien für diesen Benutzer gefunden.")
@@ -1755,30 +1579,15 @@ if credentials['usernames']:
                 #st.markdown("---")
                 st.subheader("🧹 Database Cleanup")
 
-                # Check if there are any corrupted files to clean up
-                corrupted_files = []
-                for f in user_files:
-                    filename = f[0]
-                    file_path = os.path.join(data_dir, filename)
-                    if os.path.exists(file_path):
-                        try:
-                            from fitparse import FitFile
-                            fitfile = FitFile(file_path)
-                            list(fitfile.get_messages('record'))
-                        except:
-                            corrupted_files.append(filename)
-
                 if corrupted_files:
                     st.warning(f"⚠️ Found {len(corrupted_files)} corrupted files in database:")
                     for cf in corrupted_files:
                         st.write(f"  - {cf}")
                     
                     if st.button("🗑️ Remove Corrupted Files from Database"):
-                        conn = sqlite3.connect("personen.db")
-                        cursor = conn.cursor()
+                        conn = get_connection()
                         for corrupted_file in corrupted_files:
-                            cursor.execute("DELETE FROM sports_sessions WHERE file_name = ? AND user_id = ?", 
-                                        (corrupted_file, person["id"]))
+                            delete_sports_session(conn, person["id"], corrupted_file, load_fit_file_cached)
                         conn.commit()
                         conn.close()
                         st.success(f"✅ Removed {len(corrupted_files)} corrupted files from database")
@@ -1790,81 +1599,25 @@ if credentials['usernames']:
 
                 file_labels = [f"{f[0]} – {f[1][:19]}" for f in available_files]
                 selected_label = st.selectbox("📁 Wähle eine .fit-Datei", file_labels)
-                selected_file = selected_label.split(" – ")[0].strip()
+                selected_index = file_labels.index(selected_label)
+                selected_file = available_files[selected_index][0]
+                selected_hash = available_files[selected_index][2]
+                selected_session_id = available_files[selected_index][3]
 
-                # Load the selected file directly
-                file_path = os.path.join(data_dir, selected_file)
+                # Load the selected file (cached by content hash)
+                file_path = file_paths[selected_file]
                 st.write(f"📖 Loading file: {file_path}")
 
                 try:
-                    from fitparse import FitFile
-                    fitfile = FitFile(file_path)
-                    
-                    # Extract data from the FIT file
-                    time_data = []
-                    heartrate_data = []
-                    velocity_data = []
-                    power_data = []
-                    cadence_data = []
-                    altitude_data = []
-                    temperature_data = []
-                    distance_data = []
-                    position_lat_data = []
-                    position_long_data = []
-                    
-                    for record in fitfile.get_messages('record'):
-                        timestamp = None
-                        for field in record.fields:
-                            if field.name == 'timestamp':
-                                if hasattr(field.value, 'timestamp'):
-                                    timestamp = field.value.timestamp()
-                                else:
-                                    timestamp = field.value
-                        
-                        if timestamp is not None:
-                            time_data.append(timestamp)
-                            
-                            # Extract other values
-                            hr = next((f.value for f in record.fields if f.name == 'heart_rate'), 0)
-                            vel = next((f.value for f in record.fields if f.name == 'speed'), 0)
-                            pow = next((f.value for f in record.fields if f.name == 'power'), 0)
-                            cad = next((f.value for f in record.fields if f.name == 'cadence'), 0)
-                            alt = next((f.value for f in record.fields if f.name == 'altitude'), 0)
-                            temp = next((f.value for f in record.fields if f.name == 'temperature'), 0)
-                            dist = next((f.value for f in record.fields if f.name == 'distance'), 0)
-                            lat = next((f.value for f in record.fields if f.name == 'position_lat'), 0)
-                            lon = next((f.value for f in record.fields if f.name == 'position_long'), 0)
-                            
-                            
-                            heartrate_data.append(hr if hr is not None else 0)
-                            velocity_data.append(vel if vel is not None else 0)
-                            power_data.append(pow if pow is not None else 0)
-                            cadence_data.append(cad if cad is not None else 0)
-                            altitude_data.append(alt if alt is not None else 0)
-                            temperature_data.append(temp if temp is not None else 0)
-                            distance_data.append(dist if dist is not None else 0)
-                            position_lat_data.append(lat if lat is not None else 0)
-                            position_long_data.append(lon if lon is not None else 0)
+                    content_key = selected_hash or file_path
+                    data = load_fit_file_cached(content_key, file_path)
+                    range_stats = get_range_stats_cached(content_key, data)
                     
-                    if len(time_data) == 0:
+                    if len(data['time']) == 0:
                         st.error("❌ No time data found in file")
                         st.stop()
                     
-                    import numpy as np
-                    data = {
-                        'time': np.array(time_data),
-                        'heartrate': np.array(heartrate_data),
-                        'velocity': np.array(velocity_data),
-                        'power': np.array(power_data),
-                        'cadence': np.array(cadence_data),
-                        'altitude': np.array(altitude_data),
-                        'temperature': np.array(temperature_data),
-                        'distance': np.array(distance_data),        
-                        'position_lat': np.array(position_lat_data),
-                        'position_long': np.array(position_long_data)
-                    }
-                    
-                    st.success(f"✅ File loaded successfully: {len(time_data)} data points")
+                    st.success(f"✅ File loaded successfully: {len(data['time'])} data points")
                     
                 except Exception as e:
                     st.error(f"❌ Error loading file: {e}")
@@ -1873,10 +1626,12 @@ if credentials['usernames']:
                 # Calculate total duration for the slider
                 total_duration = float(data['time'][-1] - data['time'][0])
                 st.write(f"**Gesamte Trainingsdauer:** {format_duration(total_duration)}")
+                stream = load_activity_stream_cached(content_key, file_path)
+                moving_time = moving_seconds(stream)
+                st.write(f"**Bewegungszeit:** {format_duration(moving_time)} (Pausen: {format_duration(len(stream['time']) - moving_time)})")
 
                 # Calculate stats for the full dataset first (without filtering)
-                full_filtered = filter_data_by_time_range(data, 0, 100)  # Full range
-                full_stats = calculate_filtered_stats(full_filtered)
+                full_stats = range_stats.stats(0, len(range_stats))  # Full range
 
                 # Analysis area - show full training statistics
                 st.markdown("---")
@@ -1907,6 +1662,10 @@ if credentials['usernames']:
                 col14.metric("⛰️ Max. Höhe", f"{full_stats['max_altitude']:.0f} m")
                 col15.metric("⛰️ Min. Höhe", f"{full_stats['min_altitude']:.0f} m")
 
+                col16, col17, _ = st.columns(3)
+                col16.metric("⛰️ Höhenmeter", f"{full_stats['elevation_gain_m']:.0f} m")
+                col17.metric("⚡ Normalized Power", f"{full_stats['normalized_power']:.0f} W")
+
                 # TIME SELECTION MOVED HERE - just above the graph
                 st.markdown("---")
                 st.header("📈 Trainingsverlauf")
@@ -1924,8 +1683,10 @@ if credentials['usernames']:
                 start_percent = (time_range[0] * 60) / total_duration * 100
                 end_percent = (time_range[1] * 60) / total_duration * 100
 
-                filtered = filter_data_by_time_range(data, start_percent, end_percent)
-                stats = calculate_filtered_stats(filtered)
+                # Index range of the window - channels are sliced as views, nothing is copied
+                range_lo, range_hi = get_percent_range_indices(data, start_percent, end_percent)
+                filtered = slice_data(data, range_lo, range_hi)
+                stats = range_stats.stats(range_lo, range_hi)
                 info = get_time_range_info(data, start_percent, end_percent)
 
                 # Show filtered statistics if different from full range
@@ -1942,41 +1703,48 @@ if credentials['usernames']:
                     col5.metric("❤️‍🔥 Max. Herzfrequenz", f"{stats['max_heartrate']:.0f} bpm")
                     col6.metric("⚡ Ø Leistung", f"{stats['avg_power']:.0f} W")
 
-                # Plotly visualization for sports data
-                t0 = filtered["time"][0]
-                time_minutes = (filtered["time"] - t0) / 60
-                mask = (time_minutes >= time_range[0]) & (time_minutes <= time_range[1])
-
-                fig = go.Figure()
+                    col7, col8, _ = st.columns(3)
+                    col7.metric("⛰️ Höhenmeter", f"{stats['elevation_gain_m']:.0f} m")
+                    col8.metric("⚡ Normalized Power", f"{stats['normalized_power']:.0f} W")
 
-                # Heart rate
-                if "heartrate" in filtered:
-                    fig.add_trace(go.Scatter(
-                        x=time_minutes[mask],
-                        y=filtered["heartrate"][mask],
-                        mode="lines",
-                        name="Herzfrequenz (bpm)",
-                        line=dict(color="red")
-                    ))
+                # Plotly visualization from precomputed rollups - point count stays bounded for long rides
+                rollups = load_activity_rollups_cached(content_key, file_path)
+                rollup_level, rollup_offsets, rollup_channels = rollup_window(
+                    rollups, time_range[0] * 60, time_range[1] * 60
+                )
+                time_minutes = rollup_offsets / 60
 
-                # Speed
-                if "velocity" in filtered:
-                    fig.add_trace(go.Scatter(
-                        x=time_minutes[mask],
-                        y=filtered["velocity"][mask] * 3.6,
-                        mode="lines",
-                        name="Geschwindigkeit (km/h)",
-                        line=dict(color="blue")
-                    ))
+                fig = go.Figure()
 
-                # Power
-                if "power" in filtered:
-                    fig.add_trace(go.Scatter(
-                        x=time_minutes[mask],
-                        y=filtered["power"][mask],
+                plot_traces = [
+                    ("heartrate", 1.0, "Herzfrequenz (bpm)", "red", "rgba(255, 0, 0, 0.15)"),
+                    ("velocity", 3.6, "Geschwindigkeit (km/h)", "blue", "rgba(0, 0, 255, 0.15)"),
+                    ("power", 1.0, "Leistung (W)", "green", "rgba(0, 128, 0, 0.15)"),
+                ]
+                for channel, factor, label, color, band_color in plot_traces:
+                    if channel not in rollup_channels:
+                        continue
+                    summary = rollup_channels[channel]
+                    if rollup_level > 1:
+                        # Min/max band of each block so short peaks stay visible
+                        fig.add_trace(go.Scattergl(
+                            x=time_minutes, y=summary["min"] * factor,
+                            mode="lines", line=dict(width=0, color=band_color),
+                            legendgroup=channel, showlegend=False, hoverinfo="skip"
+                        ))
+                        fig.add_trace(go.Scattergl(
+                            x=time_minutes, y=summary["max"] * factor,
+                            mode="lines", line=dict(width=0, color=band_color),
+                            fill="tonexty", fillcolor=band_color,
+                            legendgroup=channel, showlegend=False, hoverinfo="skip"
+                        ))
+                    fig.add_trace(go.Scattergl(
+                        x=time_minutes,
+                        y=summary["mean"] * factor,
                         mode="lines",
-                        name="Leistung (W)",
-                        line=dict(color="green")
+                        name=label,
+                        legendgroup=channel,
+                        line=dict(color=color)
                     ))
 
                 fig.update_layout(
@@ -1988,6 +1756,58 @@ if credentials['usernames']:
                 )
 
                 st.plotly_chart(fig, use_container_width=True)
+                if rollup_level > 1:
+                    st.caption(f"Darstellung in {rollup_level}-s-Blöcken (Mittelwert, Band = Min/Max)")
+
+                # TIME IN ZONES for the selected window (cumulative counts - O(1) per slider move)
+                st.subheader("🎯 Zeit in Zonen (gewählter Zeitraum)")
+                try:
+                    conn = get_connection()
+                    zone_max_hr, _ = get_user_hr_profile(conn, person["id"])
+                    zone_ftp = get_user_ftp(conn, person["id"])
+                    conn.close()
+
+                    with st.expander("⚙️ FTP einstellen"):
+                        # Estimated FTP can lie outside the input range - clamp instead of raising
+                        ftp_value = min(max(int(round(zone_ftp)), FTP_MIN_WATTS), FTP_MAX_WATTS)
+                        new_ftp = st.number_input("FTP (W)", min_value=FTP_MIN_WATTS, max_value=FTP_MAX_WATTS,
+                                                  value=ftp_value, step=5, key="ftp_input")
+                        if st.button("💾 FTP speichern", key="ftp_save"):
+                            conn = get_connection()
+                            conn.execute("UPDATE users SET ftp_watts = ? WHERE id = ?", (int(new_ftp), person["id"]))
+                            # TSS, training load and power zone seconds depend on FTP - rescore from stored inputs
+                            rescore_user_ftp(conn, person["id"])
+                            conn.commit()
+                            conn.close()
+                            st.success("✅ FTP gespeichert - Trainingsbelastung und Zonen neu berechnet")
+                            st.rerun()
+
+                    zone_index = get_zone_index_cached(content_key, zone_max_hr, zone_ftp, stream)
+                    zone_lo, zone_hi = window_indices(stream, time_range[0] * 60, time_range[1] * 60)
+                    hr_zone_time = zone_index.hr_seconds(zone_lo, zone_hi)
+                    power_zone_time = zone_index.power_seconds(zone_lo, zone_hi)
+
+                    zone_col1, zone_col2 = st.columns(2)
+                    for column, zone_time, names, title in (
+                        (zone_col1, hr_zone_time, HR_ZONE_NAMES, f"❤️ Herzfrequenz (max. {zone_max_hr} bpm)"),
+                        (zone_col2, power_zone_time, POWER_ZONE_NAMES, f"⚡ Leistung (FTP {zone_ftp:.0f} W)"),
+                    ):
+                        with column:
+                            if zone_time.sum() == 0:
+                                st.info(f"{title}: keine Messwerte")
+                                continue
+                            fig_zones = go.Figure(go.Bar(
+                                x=zone_time / 60, y=names, orientation="h",
+                                text=[format_duration(t) for t in zone_time], textposition="auto"
+                            ))
+                            fig_zones.update_layout(
+                                title=title, xaxis_title="Minuten", height=300,
+                                yaxis=dict(autorange="reversed"), template="simple_white"
+                            )
+                            st.plotly_chart(fig_zones, use_container_width=True)
+
+                except Exception as e:
+                    st.error(f"❌ Fehler beim Berechnen der Zonen: {e}")
 
                 # Add this code in your main training section, after the existing plotly chart
 # Insert this right after the existing st.plotly_chart(fig, use_container_width=True) line
@@ -2006,7 +1826,7 @@ if credentials['usernames']:
                     st.write("Diese Heatmap zeigt die Entwicklung verschiedener Trainingsmetriken über den gewählten Zeitraum.")
                     
                     try:
-                        heatmap_data, time_bins, metrics = create_activity_heatmap(filtered, time_range)
+                        heatmap_data, time_bins, metrics = create_activity_heatmap(data, time_range)
                         
                         # Create the heatmap
                         fig_heatmap = go.Figure(data=go.Heatmap(
@@ -2036,7 +1856,7 @@ if credentials['usernames']:
                     st.write("Diese Heatmap zeigt die kombinierte Trainingsintensität in 1-Minuten-Intervallen.")
                     
                     try:
-                        intensity_data, time_labels = create_intensity_heatmap(filtered, time_range)
+                        intensity_data, time_labels = create_intensity_heatmap(data, time_range)
                         
                         # Reshape data for heatmap (single row)
                         intensity_matrix = np.array(intensity_data).reshape(1, -1)
@@ -2077,21 +1897,28 @@ if credentials['usernames']:
                         lat_data, lon_data = create_geographic_heatmap(filtered)
                         
                         if lat_data is not None and lon_data is not None:
+                            # Zoom to the selected window, draw the route simplified for that zoom level
+                            map_zoom = fit_zoom(lat_data, lon_data)
+                            route = simplify_route_cached(content_key, file_path, map_zoom)
+                            route_lat, route_lon = route_window(route, range_lo, range_hi)
+
                             # Create map with route
                             fig_map = go.Figure(go.Scattermapbox(
-                                lat=lat_data,
-                                lon=lon_data,
-                                mode='markers+lines',
-                                marker=dict(size=4, color='red'),
-                                line=dict(width=2, color='red'),
+                                lat=route_lat,
+                                lon=route_lon,
+                                mode='lines',
+                                line=dict(width=3, color='red'),
                                 name='Route'
                             ))
                             
                             fig_map.update_layout(
                                 mapbox_style="open-street-map",
                                 mapbox=dict(
-                                    center=dict(lat=np.mean(lat_data), lon=np.mean(lon_data)),
-                                    zoom=12
+                                    center=dict(
+                                        lat=(lat_data.min() + lat_data.max()) / 2,
+                                        lon=(lon_data.min() + lon_data.max()) / 2
+                                    ),
+                                    zoom=map_zoom
                                 ),
                                 height=500,
                                 margin=dict(l=0, r=0, t=0, b=0)
@@ -2104,13 +1931,256 @@ if credentials['usernames']:
                     except Exception as e:
                         st.error(f"❌ Fehler beim Erstellen der Karte: {e}")
 
+                # MEAN-MAXIMAL CURVES
+                st.markdown("---")
+                st.header("🏆 Bestwerte-Kurve (Mean-Maximal)")
+                st.write("Beste Durchschnittswerte für jede Dauer - diese Aktivität im Vergleich zur persönlichen Bestwert-Hülle.")
+
+                try:
+                    # Process sessions imported before curves existed (only runs once per session)
+                    conn = get_connection()
+                    backfill_sessions(conn, load_fit_file_cached, person["id"])
+                    conn.commit()
+                    session_curves = get_session_curves(conn, selected_session_id)
+                    envelope = get_user_envelope(conn, person["id"])
+                    conn.close()
+
+                    curve_channels = {
+                        "⚡ Leistung (W)": ("power", 1.0),
+                        "❤️ Herzfrequenz (bpm)": ("heartrate", 1.0),
+                        "🏃‍♂️ Geschwindigkeit (km/h)": ("velocity", 3.6),
+                    }
+                    curve_label = st.radio("Kanal", list(curve_channels.keys()), horizontal=True, key="curve_channel")
+                    curve_channel, curve_factor = curve_channels[curve_label]
+
+                    fig_curve = go.Figure()
+                    if session_curves is not None and not np.all(np.isnan(session_curves[curve_channel])):
+                        fig_curve.add_trace(go.Scatter(
+                            x=DURATION_GRID,
+                            y=session_curves[curve_channel] * curve_factor,
+                            mode="lines+markers",
+                            name="Diese Aktivität",
+                            line=dict(color="red")
+                        ))
+                    if envelope is not None and not np.all(np.isnan(envelope[curve_channel])):
+                        fig_curve.add_trace(go.Scatter(
+                            x=DURATION_GRID,
+                            y=envelope[curve_channel] * curve_factor,
+                            mode="lines",
+                            name="Bestwerte (alle Aktivitäten)",
+                            line=dict(color="gray", dash="dash")
+                        ))
+
+                    if fig_curve.data:
+                        tick_values = [1, 5, 15, 60, 300, 1200, 3600, 3 * 3600, 6 * 3600]
+                        fig_curve.update_layout(
+                            xaxis=dict(
+                                type="log",
+                                title="Dauer",
+                                tickvals=tick_values,
+                                ticktext=[format_duration_label(t) for t in tick_values]
+                            ),
+                            yaxis_title=curve_label,
+                            height=400,
+                            legend=dict(x=0.99, y=0.99, xanchor="right"),
+                            template="simple_white"
+                        )
+                        st.plotly_chart(fig_curve, use_container_width=True)
+                    else:
+                        st.info("📭 Für diesen Kanal sind keine Messwerte vorhanden.")
+
+                except Exception as e:
+                    st.error(f"❌ Fehler beim Erstellen der Bestwerte-Kurve: {e}")
+
+                st.markdown("---")
+                st.header("📈 Trainingsbelastung (ATL/CTL/TSB)")
+                st.write("Ermüdung (ATL, 7 Tage), Fitness (CTL, 42 Tage) und Form (TSB) aus TSS bzw. TRIMP aller Aktivitäten.")
+
+                try:
+                    # Sessions are already processed by the backfill above
+                    conn = get_connection()
+                    load_series = get_load_series(conn, person["id"], start_day=default_series_start(90))
+                    conn.close()
+
+                    if load_series is None:
+                        st.info("📭 Noch keine Belastungsdaten vorhanden.")
+                    else:
+                        col1, col2, col3 = st.columns(3)
+                        with col1:
+                            st.metric("😮‍💨 Ermüdung (ATL)", f"{load_series['atl'][-1]:.1f}")
+                        with col2:
+                            st.metric("💪 Fitness (CTL)", f"{load_series['ctl'][-1]:.1f}")
+                        with col3:
+                            st.metric("⚖️ Form (TSB)", f"{load_series['tsb'][-1]:.1f}")
+
+                        fig_load = go.Figure()
+                        fig_load.add_trace(go.Bar(
+                            x=load_series["day"], y=load_series["load"],
+                            name="Tagesbelastung", marker_color="lightgray"
+                        ))
+                        fig_load.add_trace(go.Scatter(
+                            x=load_series["day"], y=load_series["atl"],
+                            mode="lines", name="ATL (Ermüdung)", line=dict(color="red")
+                        ))
+                        fig_load.add_trace(go.Scatter(
+                            x=load_series["day"], y=load_series["ctl"],
+                            mode="lines", name="CTL (Fitness)", line=dict(color="blue")
+                        ))
+                        fig_load.add_trace(go.Scatter(
+                            x=load_series["day"], y=load_series["tsb"],
+                            mode="lines", name="TSB (Form)", line=dict(color="green", dash="dot")
+                        ))
+                        fig_load.update_layout(
+                            xaxis_title="Datum",
+                            yaxis_title="Belastung",
+                            height=400,
+                            legend=dict(orientation="h", y=1.1),
+                            template="simple_white"
+                        )
+                        st.plotly_chart(fig_load, use_container_width=True)
+
+                except Exception as e:
+                    st.error(f"❌ Fehler beim Erstellen der Trainingsbelastung: {e}")
+
+                st.markdown("---")
+                st.header("📅 Saisonübersicht")
+
+                try:
+                    period_labels = {"Woche": "week", "Monat": "month"}
+                    period_label = st.radio("Zeitraum", list(period_labels.keys()), horizontal=True, key="season_period")
+
+                    # Materialised weekly/monthly totals - no FIT file is opened here
+                    conn = get_connection()
+                    season = get_season_overview(conn, person["id"], period_labels[period_label])
+                    conn.close()
+
+                    if not season:
+                        st.info("📭 Noch keine Aktivitäten zusammengefasst.")
+                    else:
+                        season_df = pd.DataFrame(season)
+                        col1, col2, col3, col4 = st.columns(4)
+                        col1.metric("🚴 Aktivitäten", int(season_df["sessions"].sum()))
+                        col2.metric("📏 Distanz", f"{season_df['distance_km'].sum():.0f} km")
+                        col3.metric("⏱️ Bewegungszeit", format_duration(season_df["moving_seconds"].sum()))
+                        col4.metric("⛰️ Höhenmeter", f"{season_df['elevation_gain_m'].sum():.0f} m")
+
+                        fig_season = go.Figure()
+                        fig_season.add_trace(go.Bar(
+                            x=season_df["period_start"], y=season_df["distance_km"],
+                            name="Distanz (km)", marker_color="steelblue"
+                        ))
+                        fig_season.add_trace(go.Scatter(
+                            x=season_df["period_start"], y=season_df["moving_seconds"] / 3600,
+                            mode="lines+markers", name="Bewegungszeit (h)", yaxis="y2",
+                            line=dict(color="orange")
+                        ))
+                        fig_season.update_layout(
+                            xaxis_title=period_label,
+                            yaxis=dict(title="Distanz (km)"),
+                            yaxis2=dict(title="Bewegungszeit (h)", overlaying="y", side="right"),
+                            height=400,
+                            legend=dict(orientation="h", y=1.1),
+                            template="simple_white"
+                        )
+                        st.plotly_chart(fig_season, use_container_width=True)
+
+                except Exception as e:
+                    st.error(f"❌ Fehler beim Erstellen der Saisonübersicht: {e}")
+
+                st.markdown("---")
+                st.header("🗺️ Wo trainiere ich? (alle Aktivitäten)")
+                st.write("Aufsummierte Aufenthaltsdauer pro Kartenzelle aus vorberechneten Kacheln.")
+
+                try:
+                    heatmap_all_users = False
+                    if current_user_role == 'admin':
+                        heatmap_all_users = st.checkbox("👥 Alle Benutzer einbeziehen", key="heatmap_all_users")
+
+                    heatmap_user_id = None if heatmap_all_users else person["id"]
+                    conn = get_connection()
+                    tile_version = heatmap_version(conn, heatmap_user_id)
+                    conn.close()
+                    heatmap_zoom, heat_lat, heat_lon, heat_counts = get_heatmap_points_cached(
+                        heatmap_user_id, tile_version
+                    )
+
+                    if heatmap_zoom is None:
+                        st.info("📍 Noch keine GPS-Daten vorhanden.")
+                    else:
+                        fig_heat = go.Figure(go.Densitymapbox(
+                            lat=heat_lat,
+                            lon=heat_lon,
+                            z=np.log1p(heat_counts),
+                            radius=6,
+                            colorscale="Hot",
+                            showscale=False,
+                            hoverinfo="skip"
+                        ))
+                        fig_heat.update_layout(
+                            mapbox_style="open-street-map",
+                            mapbox=dict(
+                                center=dict(
+                                    lat=(heat_lat.min() + heat_lat.max()) / 2,
+                                    lon=(heat_lon.min() + heat_lon.max()) / 2
+                                ),
+                                zoom=fit_zoom(heat_lat, heat_lon)
+                            ),
+                            height=500,
+                            margin=dict(l=0, r=0, t=0, b=0)
+                        )
+                        st.plotly_chart(fig_heat, use_container_width=True)
+                        st.caption(f"{len(heat_lat)} Zellen aus Kacheln der Zoomstufe {heatmap_zoom}")
+
+                except Exception as e:
+                    st.error(f"❌ Fehler beim Erstellen der Heatmap: {e}")
+
+                st.markdown("---")
+                st.header("🚵 Segmentvergleich")
+                st.write("Der gewählte Zeitraum dieser Aktivität definiert das Segment (Start- und Endpunkt). "
+                         "Alle Aktivitäten, die dieses Segment ebenfalls befahren, werden verglichen.")
+
+                try:
+                    segment_lat, segment_lon = stream_coordinates(stream)
+                    valid_seconds = np.flatnonzero(~np.isnan(segment_lat))
+                    if len(valid_seconds) < 2:
+                        st.info("📍 Keine GPS-Daten in dieser Aktivität verfügbar.")
+                    else:
+                        # Nearest GPS fix to the slider start/end (1 index = 1 second on the stream)
+                        first_fix = valid_seconds[min(np.searchsorted(valid_seconds, int(time_range[0] * 60)), len(valid_seconds) - 1)]
+                        last_fix = valid_seconds[max(np.searchsorted(valid_seconds, int(time_range[1] * 60), side="right") - 1, 0)]
+                        segment_start = (segment_lat[first_fix], segment_lon[first_fix])
+                        segment_end = (segment_lat[last_fix], segment_lon[last_fix])
+                        st.write(f"**Start:** {segment_start[0]:.5f}, {segment_start[1]:.5f} – "
+                                 f"**Ziel:** {segment_end[0]:.5f}, {segment_end[1]:.5f}")
+
+                        if st.button("🔍 Durchfahrten suchen", key="segment_search"):
+                            conn = get_connection()
+                            passes = find_segment_passes(conn, segment_start, segment_end,
+                                                         load_activity_stream_cached, person["id"])
+                            conn.close()
+
+                            if passes:
+                                st.dataframe(pd.DataFrame([{
+                                    "Datum": datetime.fromtimestamp(p["start_time"]).strftime("%d.%m.%Y %H:%M"),
+                                    "Datei": p["file_name"],
+                                    "Zeit": format_duration(p["elapsed_seconds"]),
+                                    "Ø Geschwindigkeit (km/h)": round(p["avg_speed_kmh"], 1),
+                                    "Ø Herzfrequenz (bpm)": round(p["avg_heartrate"]) if p["avg_heartrate"] else None,
+                                    "Ø Leistung (W)": round(p["avg_power"]) if p["avg_power"] else None,
+                                } for p in passes]), use_container_width=True)
+                            else:
+                                st.info("📭 Keine Durchfahrten gefunden.")
+
+                except Exception as e:
+                    st.error(f"❌ Fehler beim Segmentvergleich: {e}")
+
         # FIT-IMPORT SECTION
         elif admin_tab == "📥 FIT-Import":
             st.title("📥 .fit-Datei hochladen & Benutzer zuweisen")
             st.markdown("---")
 
             # Load persons from database
-            conn = sqlite3.connect("personen.db")
+            conn = get_connection()
             cursor = conn.cursor()
             cursor.execute("SELECT id, firstname, lastname FROM users WHERE is_active = 1")
             users = cursor.fetchall()
@@ -2127,28 +2197,32 @@ if credentials['usernames']:
 
                 if uploaded_file:
                     if st.button("📤 Datei hochladen"):
-                        # Save file
-                        save_dir = "data/sports_data"
-                        os.makedirs(save_dir, exist_ok=True)
-
                         timestamp = int(time.time())
                         filename = f"{selected_user_id}_{timestamp}.fit"
-                        save_path = os.path.join(save_dir, filename)
 
-                        with open(save_path, "wb") as f:
-                            f.write(uploaded_file.read())
-
-                        # Save to database
-                        conn = sqlite3.connect("personen.db")
-                        cursor = conn.cursor()
-                        cursor.execute("""
-                            INSERT INTO sports_sessions (user_id, file_name, timestamp)
-                            VALUES (?, ?, ?)
-                        """, (selected_user_id, filename, datetime.fromtimestamp(timestamp).isoformat()))
+                        # Save file content-addressed and register session
+                        conn = get_connection()
+                        session_id, content_hash, is_duplicate = add_sports_session(
+                            conn, selected_user_id, filename, uploaded_file.getvalue(),
+                            datetime.fromtimestamp(timestamp).isoformat()
+                        )
                         conn.commit()
+
+                        # Update derived tables incrementally (curves etc.) - duplicates hit the decode cache
+                        try:
+                            fit_path = resolve_sports_file(conn, filename, content_hash)
+                            fit_data = load_fit_file_cached(content_hash, fit_path)
+                            if len(fit_data['time']) > 0:
+                                process_session(conn, session_id, selected_user_id, fit_data,
+                                                load_activity_stream_cached(content_hash, fit_path))
+                                conn.commit()
+                        except Exception as e:
+                            st.warning(f"⚠️ Datei gespeichert, konnte aber nicht ausgewertet werden: {e}")
                         conn.close()
 
                         st.success(f"✅ Datei erfolgreich hochgeladen und Benutzer zugewiesen: {selected_user_label}")
+                        if is_duplicate:
+                            st.info("♻️ Identische Datei bereits vorhanden - kein zusätzlicher Speicher belegt")
 
         # REPLACE THE PROBLEMATIC SECTION IN "📂 FIT-Dateien" with this code:
 
@@ -2158,7 +2232,7 @@ if credentials['usernames']:
             st.markdown("---")
 
             # Load all users
-            conn = sqlite3.connect("personen.db")
+            conn = get_connection()
             cursor = conn.cursor()
             cursor.execute("SELECT id, firstname, lastname FROM users WHERE is_active = 1")
             users = cursor.fetchall()
@@ -2172,14 +2246,15 @@ if credentials['usernames']:
                 selected_user_id = user_map[selected_user_label]
 
                 # Get all associated .fit files from database
-                conn = sqlite3.connect("personen.db")
+                conn = get_connection()
                 cursor = conn.cursor()
                 cursor.execute("""
-                    SELECT file_name, timestamp FROM sports_sessions
+                    SELECT file_name, timestamp, content_hash FROM sports_sessions
                     WHERE user_id = ?
                     ORDER BY timestamp DESC
                 """, (selected_user_id,))
                 user_files = cursor.fetchall()
+                file_paths = {f[0]: resolve_sports_file(conn, f[0], f[2]) for f in user_files}
                 conn.close()
 
                 if not user_files:
@@ -2187,21 +2262,16 @@ if credentials['usernames']:
                 else:
                     # Check which files actually exist and can be loaded (same logic as training section)
                     available_files = []
-                    data_dir = "data/sports_data"
 
                     for f in user_files:
                         filename = f[0]
-                        file_path = os.path.join(data_dir, filename)
+                        file_path = file_paths[filename]
                         
                         # Check if file exists
                         if os.path.exists(file_path):
                             try:
-                                # Try to load the file
-                                from fitparse import FitFile
-                                fitfile = FitFile(file_path)
-                                records = list(fitfile.get_messages('record'))
-                                
-                                if len(records) > 0:
+                                fit_data = load_fit_file_cached(f[2] or file_path, file_path)
+                                if len(fit_data['time']) > 0:
                                     available_files.append(f)
                                     
                             except Exception as e:
@@ -2212,9 +2282,11 @@ if credentials['usernames']:
                     else:
                         file_labels = [f"{f[0]} – {f[1][:19]}" for f in available_files]
                         selected_label = st.selectbox("📁 Datei auswählen", file_labels)
-                        selected_file = selected_label.split(" – ")[0]
+                        selected_index = file_labels.index(selected_label)
+                        selected_file = available_files[selected_index][0]
+                        selected_hash = available_files[selected_index][2]
 
-                        full_path = os.path.join("data/sports_data", selected_file)
+                        full_path = file_paths[selected_file]
                         if not os.path.exists(full_path):
                             st.error("❌ Datei nicht gefunden!")
                         else:
@@ -2222,72 +2294,13 @@ if credentials['usernames']:
 
                             # Analyze the selected file
                             try:
-                                from fitparse import FitFile
-                                fitfile = FitFile(full_path)
-                                
-                                # Extract data from the FIT file (same as training section)
-                                time_data = []
-                                heartrate_data = []
-                                velocity_data = []
-                                power_data = []
-                                cadence_data = []
-                                altitude_data = []
-                                temperature_data = []
-                                distance_data = []
-                                position_lat_data = []
-                                position_long_data = []
+                                content_key = selected_hash or full_path
+                                data = load_fit_file_cached(content_key, full_path)
                                 
-                                for record in fitfile.get_messages('record'):
-                                    timestamp = None
-                                    for field in record.fields:
-                                        if field.name == 'timestamp':
-                                            if hasattr(field.value, 'timestamp'):
-                                                timestamp = field.value.timestamp()
-                                            else:
-                                                timestamp = field.value
-                                    
-                                    if timestamp is not None:
-                                        time_data.append(timestamp)
-                                        
-                                        # Extract other values
-                                        hr = next((f.value for f in record.fields if f.name == 'heart_rate'), 0)
-                                        vel = next((f.value for f in record.fields if f.name == 'speed'), 0)
-                                        pow = next((f.value for f in record.fields if f.name == 'power'), 0)
-                                        cad = next((f.value for f in record.fields if f.name == 'cadence'), 0)
-                                        alt = next((f.value for f in record.fields if f.name == 'altitude'), 0)
-                                        temp = next((f.value for f in record.fields if f.name == 'temperature'), 0)
-                                        dist = next((f.value for f in record.fields if f.name == 'distance'), 0)
-                                        lat = next((f.value for f in record.fields if f.name == 'position_lat'), 0)
-                                        lon = next((f.value for f in record.fields if f.name == 'position_long'), 0)
-                                        
-                                        heartrate_data.append(hr if hr is not None else 0)
-                                        velocity_data.append(vel if vel is not None else 0)
-                                        power_data.append(pow if pow is not None else 0)
-                                        cadence_data.append(cad if cad is not None else 0)
-                                        altitude_data.append(alt if alt is not None else 0)
-                                        temperature_data.append(temp if temp is not None else 0)
-                                        distance_data.append(dist if dist is not None else 0)
-                                        position_lat_data.append(lat if lat is not None else 0)
-                                        position_long_data.append(lon if lon is not None else 0)
-                                
-                                if len(time_data) == 0:
+                                if len(data['time']) == 0:
                                     st.error("❌ No time data found in file")
                                 else:
-                                    import numpy as np
-                                    data = {
-                                        'time': np.array(time_data),
-                                        'heartrate': np.array(heartrate_data),
-                                        'velocity': np.array(velocity_data),
-                                        'power': np.array(power_data),
-                                        'cadence': np.array(cadence_data),
-                                        'altitude': np.array(altitude_data),
-                                        'temperature': np.array(temperature_data),
-                                        'distance': np.array(distance_data),        
-                                        'position_lat': np.array(position_lat_data),
-                                        'position_long': np.array(position_long_data)
-                                    }
-                                    
-                                    st.success(f"✅ File loaded successfully: {len(time_data)} data points")
+                                    st.success(f"✅ File loaded successfully: {len(data['time'])} data points")
                                     
                                     # Calculate total duration for the slider
                                     total_duration = float(data['time'][-1] - data['time'][0])
@@ -2306,8 +2319,8 @@ if credentials['usernames']:
                                     start_percent = (time_range[0] * 60) / total_duration * 100
                                     end_percent = (time_range[1] * 60) / total_duration * 100
                                     
-                                    filtered = filter_data_by_time_range(data, start_percent, end_percent)
-                                    stats = calculate_filtered_stats(filtered)
+                                    range_lo, range_hi = get_percent_range_indices(data, start_percent, end_percent)
+                                    stats = get_range_stats_cached(content_key, data).stats(range_lo, range_hi)
 
                                     st.markdown("### 📊 Analyseergebnisse Overview")
                                     col1, col2, col3, col4 = st.columns(4)
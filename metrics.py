@@ -0,0 +1,160 @@
+# metrics.py - Registrierte Kennzahlen, berechnet in einem Durchlauf pro Kanal
+import numpy as np
+
+from activity import as_activity
+from resampling import resample_activity, rolling_mean
+
+ELEVATION_SMOOTHING_SECONDS = 30  # glättet Höhenrauschen vor der Summierung
+NP_WINDOW_SECONDS = 30  # gleitendes Mittel für Normalized Power
+
+# Gemeinsame Reduktionen, die pro Kanal genau einmal berechnet werden
+CHANNEL_REDUCTIONS = ('mean', 'max', 'min', 'delta')
+
+# Registrierte Kennzahlen in Anzeigereihenfolge: Schlüssel -> (Kanal, Reduktion, Faktor)
+METRICS = {}
+
+
+class SeriesMetric:
+    """
+    Kennzahl über eine aus dem Kanal abgeleitete Reihe (z. B. gleitendes Mittel).
+
+    Die Reihe wird auf dem 1-Hz-Raster (resample_activity) gebildet, damit
+    Fenster echte Sekunden sind - auch bei anderer Abtastrate oder Pausen.
+    Element i hängt von den Sekunden i..i+lag ab und ist NaN, wenn eine davon
+    ungültig ist. Die Kennzahl ist Summe oder Mittel der gültigen Elemente -
+    damit lässt sie sich auch über Präfixsummen für Teilbereiche berechnen
+    (siehe range_stats.py).
+    """
+
+    def __init__(self, series, lag, aggregate, finish=None):
+        self.series = series
+        self.lag = lag
+        self.aggregate = aggregate  # 'sum' oder 'mean'
+        self.finish = finish
+
+    def from_aggregate(self, total, count):
+        """Endwert aus Summe und Anzahl der gültigen Reihenelemente"""
+        if count == 0:
+            return 0.0
+        value = total if self.aggregate == 'sum' else total / count
+        return float(self.finish(value) if self.finish else value)
+
+    def reduce(self, values):
+        """Kennzahl für ein 1-Hz-Kanal-Array (ungültige Werte als NaN)"""
+        series = self.series(values)
+        valid = ~np.isnan(series)
+        return self.from_aggregate(np.sum(series[valid]), np.count_nonzero(valid))
+
+
+def register_metric(key, channel, reduction, scale=1.0):
+    """
+    Registriert eine Kennzahl.
+
+    reduction ist eine der gemeinsamen Reduktionen (CHANNEL_REDUCTIONS) oder
+    eine SeriesMetric. Der Wertebereich eines Kanals wird beim Laden geprüft
+    (CHANNEL_SPECS in activity.py).
+    """
+    if not isinstance(reduction, SeriesMetric) and reduction not in CHANNEL_REDUCTIONS:
+        raise ValueError(f"Unbekannte Reduktion für {key}: {reduction}")
+    METRICS[key] = (channel, reduction, scale)
+
+
+def elevation_climbs(altitude):
+    """Anstieg der geglätteten Höhe je Sekunde (Lücken unterbrechen die Summierung)"""
+    smoothed = rolling_mean(altitude, ELEVATION_SMOOTHING_SECONDS)
+    return np.clip(np.diff(smoothed), 0, None)
+
+
+def power_fourth(power):
+    """4. Potenz des gleitenden 30-s-Mittels der Leistung"""
+    return rolling_mean(power, NP_WINDOW_SECONDS) ** 4
+
+
+ELEVATION_GAIN = SeriesMetric(elevation_climbs, ELEVATION_SMOOTHING_SECONDS, 'sum')
+NORMALIZED_POWER = SeriesMetric(power_fourth, NP_WINDOW_SECONDS - 1, 'mean', lambda mean: mean ** 0.25)
+
+
+def elevation_gain(altitude):
+    """Summe der Anstiege der geglätteten Höhe (1-Hz-Höhenreihe)"""
+    return ELEVATION_GAIN.reduce(altitude)
+
+
+def normalized_power(power):
+    """Normalized Power: 4. Wurzel des Mittels der 4. Potenz des gleitenden 30-s-Mittels (1-Hz-Leistung)"""
+    return NORMALIZED_POWER.reduce(power)
+
+
+def _channel_reductions(values):
+    """Gemeinsame Reduktionen der gültigen Werte eines Kanals"""
+    if len(values) == 0:
+        return dict.fromkeys(CHANNEL_REDUCTIONS, 0)
+    return {
+        'mean': np.sum(values, dtype=float) / len(values),
+        'max': values.max().item(),
+        'min': values.min().item(),
+        'delta': float(values[-1]) - float(values[0]),
+    }
+
+
+def compute_metrics(data):
+    """
+    Berechnet alle registrierten Kennzahlen.
+
+    Pro Kanal wird die Gültigkeitsmaske einmal entpackt und die gemeinsamen
+    Reduktionen einmal berechnet - weitere Kennzahlen auf demselben Kanal
+    kosten keinen zusätzlichen Durchlauf. Reihen-Kennzahlen (SeriesMetric)
+    laufen auf dem einmal erzeugten 1-Hz-Raster.
+    """
+    activity = as_activity(data)
+    if len(activity) == 0:
+        return empty_stats()
+
+    stream = None
+    masks = {}
+    reductions = {}
+    results = {}
+    for key, (channel, reduction, scale) in METRICS.items():
+        if channel not in masks:
+            masks[channel] = activity.valid(channel) if channel != 'time' else None
+        valid = masks[channel]
+
+        if isinstance(reduction, SeriesMetric):
+            if stream is None:
+                stream = resample_activity(activity)
+            results[key] = reduction.reduce(stream[channel]) * scale
+            continue
+
+        if channel not in reductions:
+            if channel == 'time':
+                values = activity.time
+            elif channel in activity:
+                values = activity.column(channel)[valid]
+            else:
+                values = np.array([])
+            reductions[channel] = _channel_reductions(values)
+        results[key] = reductions[channel][reduction] * scale
+    return results
+
+
+def empty_stats():
+    """Alle Kennzahlen für einen leeren Zeitbereich"""
+    return dict.fromkeys(METRICS, 0)
+
+
+register_metric('duration_seconds', 'time', 'delta')
+register_metric('total_distance_km', 'distance', 'delta', 1 / 1000)
+register_metric('avg_speed_kmh', 'velocity', 'mean', 3.6)
+register_metric('max_speed_kmh', 'velocity', 'max', 3.6)
+register_metric('avg_heartrate', 'heartrate', 'mean')
+register_metric('max_heartrate', 'heartrate', 'max')
+register_metric('avg_cadence', 'cadence', 'mean')
+register_metric('max_cadence', 'cadence', 'max')
+register_metric('avg_power', 'power', 'mean')
+register_metric('max_power', 'power', 'max')
+register_metric('normalized_power', 'power', NORMALIZED_POWER)
+register_metric('avg_temperature', 'temperature', 'mean')
+register_metric('max_temperature', 'temperature', 'max')
+register_metric('avg_altitude', 'altitude', 'mean')
+register_metric('max_altitude', 'altitude', 'max')
+register_metric('min_altitude', 'altitude', 'min')
+register_metric('elevation_gain_m', 'altitude', ELEVATION_GAIN)
@@ -0,0 +1,419 @@
+# migrations.py - Versionierte Schema-Migrationen für personen.db
+from picture_store import migrate_user_pictures
+
+# Maßgebliches Schema der Kerntabellen. Ältere Datenbanken (z. B. aus json_to_sql.py)
+# bekommen fehlende Spalten per ALTER TABLE - dort ohne NOT NULL, da bestehende Zeilen
+# keine Werte haben.
+CORE_TABLES = {
+    "users": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("username", "TEXT UNIQUE NOT NULL"),
+        ("password", "TEXT NOT NULL"),
+        ("email", "TEXT NOT NULL"),
+        ("full_name", "TEXT NOT NULL"),
+        ("firstname", "TEXT"),
+        ("lastname", "TEXT"),
+        ("date_of_birth", "TEXT"),
+        ("gender", "TEXT"),
+        ("height_cm", "INTEGER"),
+        ("weight_kg", "REAL"),
+        ("picture_path", "TEXT"),
+        ("picture_data", "BLOB"),
+        ("role", "TEXT DEFAULT 'user'"),
+        ("is_active", "BOOLEAN DEFAULT 1"),
+        ("created_at", "TIMESTAMP DEFAULT CURRENT_TIMESTAMP"),
+        ("last_login", "TIMESTAMP"),
+        ("person_id", "INTEGER"),
+    ],
+    "ekg_tests": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("user_id", "INTEGER NOT NULL"),
+        ("date", "TEXT NOT NULL"),
+        ("result_link", "TEXT"),
+        ("created_at", "TIMESTAMP DEFAULT CURRENT_TIMESTAMP"),
+    ],
+    "sports_sessions": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("user_id", "INTEGER"),
+        ("file_name", "TEXT NOT NULL"),
+        ("timestamp", "TEXT NOT NULL"),
+    ],
+}
+
+FOREIGN_KEYS = {
+    "ekg_tests": "FOREIGN KEY (user_id) REFERENCES users (id)",
+    "sports_sessions": "FOREIGN KEY (user_id) REFERENCES users (id)",
+}
+
+
+def _alter_declaration(declaration):
+    """Spaltendefinition, die ALTER TABLE ADD COLUMN auf einer befüllten Tabelle akzeptiert"""
+    for constraint in ("PRIMARY KEY AUTOINCREMENT", "UNIQUE", "NOT NULL"):
+        declaration = declaration.replace(constraint, "")
+    # SQLite erlaubt bei ADD COLUMN keinen nicht-konstanten Default
+    declaration = declaration.replace("DEFAULT CURRENT_TIMESTAMP", "")
+    return " ".join(declaration.split())
+
+
+def create_core_tables(conn):
+    """Legt users, ekg_tests und sports_sessions an und ergänzt fehlende Spalten"""
+    cursor = conn.cursor()
+    for table, columns in CORE_TABLES.items():
+        definitions = [f"{name} {declaration}" for name, declaration in columns]
+        if table in FOREIGN_KEYS:
+            definitions.append(FOREIGN_KEYS[table])
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(definitions)})")
+
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, declaration in columns:
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {_alter_declaration(declaration)}")
+                if "UNIQUE" in declaration:
+                    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_{name} ON {table} ({name})")
+
+
+def _add_column(cursor, table, name, declaration):
+    """Ergänzt eine Spalte, falls sie fehlt (Datenbanken aus der Zeit vor den Migrationen)"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    columns = [row[1] for row in cursor.fetchall()]
+    if columns and name not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {declaration}")
+
+
+def create_feature_tables(conn):
+    """Blob-Store und alle abgeleiteten Aktivitätstabellen"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS blobs (
+            sha256 TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    for table in ("sports_sessions", "ekg_tests"):
+        _add_column(cursor, table, "content_hash", "TEXT")
+
+    # Mean-Maximal-Kurven
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS activity_curves (
+            session_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            curves TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES sports_sessions (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_curve_envelope (
+            user_id INTEGER PRIMARY KEY,
+            curves TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Trainingsbelastung
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS session_load (
+            session_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            trimp REAL NOT NULL DEFAULT 0,
+            tss REAL,
+            FOREIGN KEY (session_id) REFERENCES sports_sessions (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS training_load_daily (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            trimp REAL NOT NULL DEFAULT 0,
+            tss REAL NOT NULL DEFAULT 0,
+            load REAL NOT NULL DEFAULT 0,
+            atl REAL NOT NULL DEFAULT 0,
+            ctl REAL NOT NULL DEFAULT 0,
+            tsb REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day)
+        )
+    ''')
+    _add_column(cursor, "users", "ftp_watts", "INTEGER")
+
+    # Heatmap-Kacheln
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS heatmap_tiles (
+            user_id INTEGER NOT NULL,
+            zoom INTEGER NOT NULL,
+            tile_x INTEGER NOT NULL,
+            tile_y INTEGER NOT NULL,
+            counts BLOB NOT NULL,
+            PRIMARY KEY (user_id, zoom, tile_x, tile_y)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS heatmap_sessions (
+            session_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            FOREIGN KEY (session_id) REFERENCES sports_sessions (id)
+        )
+    ''')
+
+    # Gitterindex für wiederholte Segmente
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS route_grid_index (
+            cell_lat INTEGER NOT NULL,
+            cell_lon INTEGER NOT NULL,
+            session_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            start_offset INTEGER NOT NULL,
+            end_offset INTEGER NOT NULL,
+            PRIMARY KEY (cell_lat, cell_lon, session_id, start_offset),
+            FOREIGN KEY (session_id) REFERENCES sports_sessions (id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_route_grid_session ON route_grid_index (session_id)")
+
+    # Kennzahlen pro Aktivität und Wochen-/Monatssummen
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS activity_summary (
+            session_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            start_time TIMESTAMP NOT NULL,
+            duration_seconds REAL NOT NULL DEFAULT 0,
+            moving_seconds REAL NOT NULL DEFAULT 0,
+            distance_km REAL NOT NULL DEFAULT 0,
+            elevation_gain_m REAL NOT NULL DEFAULT 0,
+            avg_heartrate REAL,
+            max_heartrate REAL,
+            avg_power REAL,
+            max_power REAL,
+            avg_cadence REAL,
+            max_cadence REAL,
+            hr_zone_seconds TEXT,
+            power_zone_seconds TEXT,
+            FOREIGN KEY (session_id) REFERENCES sports_sessions (id)
+        )
+    ''')
+    _add_column(cursor, "activity_summary", "power_zone_seconds", "TEXT")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_activity_summary_user_time
+        ON activity_summary (user_id, start_time)
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS training_rollup (
+            user_id INTEGER NOT NULL,
+            period TEXT NOT NULL,
+            period_start TEXT NOT NULL,
+            sessions INTEGER NOT NULL DEFAULT 0,
+            duration_seconds REAL NOT NULL DEFAULT 0,
+            moving_seconds REAL NOT NULL DEFAULT 0,
+            distance_km REAL NOT NULL DEFAULT 0,
+            elevation_gain_m REAL NOT NULL DEFAULT 0,
+            hr_zone_seconds TEXT,
+            PRIMARY KEY (user_id, period, period_start)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS processed_sessions (
+            session_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            pipeline_version INTEGER NOT NULL,
+            processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES sports_sessions (id)
+        )
+    ''')
+
+
+def create_lookup_indexes(conn):
+    """Indizes für Abfragen pro Benutzer und für die Suche nach Namen"""
+    cursor = conn.cursor()
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ekg_tests_user_date ON ekg_tests (user_id, date)")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_sports_sessions_user_time
+        ON sports_sessions (user_id, timestamp)
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_name ON users (lastname, firstname)")
+    # Ausdrucksindex für die Suche nach "Vorname Nachname" (exakt dieser Ausdruck in der Abfrage)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_display_name
+        ON users ((firstname || ' ' || lastname))
+    ''')
+
+
+def move_pictures_to_store(conn):
+    """Profilbilder aus users.picture_data in den Bildspeicher verschieben"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS picture_thumbnails (
+            picture_hash TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            blob_sha256 TEXT NOT NULL,
+            PRIMARY KEY (picture_hash, size),
+            FOREIGN KEY (blob_sha256) REFERENCES blobs (sha256)
+        )
+    ''')
+    _add_column(cursor, "users", "picture_hash", "TEXT")
+    migrate_user_pictures(conn)
+
+
+def create_user_list_indexes(conn):
+    """Indizes für die gefilterte, seitenweise Benutzerliste (Sortierung über die rowid)"""
+    cursor = conn.cursor()
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_role ON users (role)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_active ON users (is_active)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_role_active ON users (role, is_active)")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_display_name_nocase
+        ON users ((firstname || ' ' || lastname) COLLATE NOCASE)
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username_nocase ON users (username COLLATE NOCASE)")
+
+
+def add_display_name_column(conn):
+    """
+    Generierte Spalte display_name mit NOCASE-Index für Namenssuche und Auswahllisten.
+
+    Gleiche Regel wie repository.display_name ("Vorname Nachname", sonst der
+    Benutzername). Die Spalte ist VIRTUAL (nur so per ALTER TABLE möglich), der
+    Index speichert die Werte aber - Suche und Präfixsuche sind Indexzugriffe
+    und bleiben bei jedem Schreibzugriff automatisch aktuell. Die beiden
+    Ausdrucksindizes aus Migration 3 und 5 werden dadurch überflüssig.
+    """
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_xinfo(users)")
+    if "display_name" not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute('''
+            ALTER TABLE users ADD COLUMN display_name TEXT GENERATED ALWAYS AS (
+                CASE WHEN firstname <> '' AND lastname <> ''
+                     THEN firstname || ' ' || lastname
+                     ELSE username END
+            ) VIRTUAL
+        ''')
+    cursor.execute("DROP INDEX IF EXISTS idx_users_display_name")
+    cursor.execute("DROP INDEX IF EXISTS idx_users_display_name_nocase")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_display_name_norm
+        ON users (display_name COLLATE NOCASE)
+    ''')
+    # Auswahllisten zeigen nur aktive Benutzer - Filter und Sortierung aus einem Index
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_active_display_name
+        ON users (is_active, display_name COLLATE NOCASE)
+    ''')
+
+
+def create_audit_log(conn):
+    """Audit-Protokoll für den Hintergrund-Schreiber (write_behind.py)"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS audit_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TIMESTAMP NOT NULL,
+            username TEXT,
+            action TEXT NOT NULL,
+            detail TEXT
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_user_time ON audit_log (username, created_at)")
+
+
+def create_failed_sessions(conn):
+    """Sessions, deren Datei sich nicht verarbeiten ließ (activity_import.backfill_sessions)"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS failed_sessions (
+            session_id INTEGER PRIMARY KEY,
+            content_key TEXT,
+            pipeline_version INTEGER NOT NULL,
+            error TEXT,
+            failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES sports_sessions (id)
+        )
+    ''')
+
+
+
+def add_session_load_inputs(conn):
+    """
+    FTP-unabhängige TSS-Eingaben und die verwendete FTP pro Session.
+
+    Mit Normalized Power und Dauer lässt sich TSS nach einer FTP-Änderung in
+    SQL neu berechnen, ohne die FIT-Dateien erneut zu lesen.
+    """
+    cursor = conn.cursor()
+    cursor.execute("ALTER TABLE session_load ADD COLUMN normalized_power REAL")
+    cursor.execute("ALTER TABLE session_load ADD COLUMN power_seconds REAL")
+    cursor.execute("ALTER TABLE session_load ADD COLUMN ftp REAL")
+
+
+def add_power_histogram(conn):
+    """Watt-Histogramm pro Aktivität - Leistungszonen lassen sich daraus für jede FTP neu bilden"""
+    cursor = conn.cursor()
+    cursor.execute("ALTER TABLE activity_summary ADD COLUMN power_histogram BLOB")
+
+# (Version, Beschreibung, Funktion) - nur anhängen, bestehende Einträge nie ändern.
+# Das DDL jeder Migration steht hier eingefroren; neue Spalten und Tabellen kommen
+# als neue Migration, nie als bedingtes ALTER in den Modulen.
+MIGRATIONS = [
+    (1, "Kerntabellen users, ekg_tests, sports_sessions", create_core_tables),
+    (2, "Blob-Store und abgeleitete Aktivitätstabellen", create_feature_tables),
+    (3, "Indizes für Benutzer- und Namenssuche", create_lookup_indexes),
+    (4, "Profilbilder im Bildspeicher mit Vorschaugrößen", move_pictures_to_store),
+    (5, "Indizes für die gefilterte Benutzerliste", create_user_list_indexes),
+    (6, "Generierte Spalte display_name mit Index", add_display_name_column),
+    (7, "Audit-Protokoll", create_audit_log),
+    (8, "Fehlgeschlagene Sessions für den Backfill", create_failed_sessions),
+    (9, "TSS-Eingaben und FTP pro Session", add_session_load_inputs),
+    (10, "Watt-Histogramm pro Aktivität", add_power_histogram),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """Höchste angewendete Migration (0 für eine neue Datenbank)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    return cursor.fetchone()[0] or 0
+
+
+def run_migrations(conn):
+    """
+    Bringt die Datenbank auf SCHEMA_VERSION.
+
+    Jede Migration läuft in einer eigenen Transaktion mit Schreibsperre; die
+    Version wird darin erneut geprüft, sodass parallel startende Prozesse
+    dieselbe Migration nicht zweimal anwenden.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    if get_schema_version(conn) >= SCHEMA_VERSION:
+        return SCHEMA_VERSION
+
+    for version, description, migrate in MIGRATIONS:
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            migrate(conn)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"✅ Migration {version}: {description}")
+    return SCHEMA_VERSION
@@ -1,5 +1,6 @@
 import json
-import sqlite3
+from db import get_connection
+from repository import find_user_id_by_lastname_first
 
 class Person:
 
@@ -31,7 +32,7 @@ class Person:
     
     @staticmethod
     def load_person_data_from_db():
-        conn = sqlite3.connect("personen.db")
+        conn = get_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT id, firstname, lastname, date_of_birth, gender, picture_path FROM users")
         rows = cursor.fetchall()
@@ -52,44 +53,50 @@ class Person:
         return persons
     
     @staticmethod
-    def find_person_data_by_name_from_db(name_search):
-        conn = sqlite3.connect("personen.db")
+    def find_person_data_by_id_from_db(person_id):
+        """Person mit ihren EKG-Tests über die id (Indexsuche), sonst None"""
+        conn = get_connection()
         cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, firstname, lastname, date_of_birth, gender, picture_path FROM users WHERE id = ?",
+            (person_id,)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            conn.close()
+            return None
+
+        person = {
+            "id": row[0],
+            "firstname": row[1],
+            "lastname": row[2],
+            "date_of_birth": row[3],
+            "gender": row[4],
+            "picture_path": row[5],
+            "ekg_tests": []
+        }
+
+        # hole EKG-Tests zur Person
+        cursor.execute("SELECT id, date, result_link FROM ekg_tests WHERE user_id = ?", (person["id"],))
+        for ekg in cursor.fetchall():
+            person["ekg_tests"].append({
+                "id": ekg[0],
+                "date": ekg[1],
+                "result_link": ekg[2]
+            })
 
-        # hole Benutzer
-        cursor.execute("SELECT id, firstname, lastname, date_of_birth, gender, picture_path FROM users")
-        rows = cursor.fetchall()
-
-        for row in rows:
-            fullname = f"{row[2]} {row[1]}"  # Nachname Vorname
-            if fullname == name_search:
-                person_id = row[0]
-                person = {
-                    "id": person_id,
-                    "firstname": row[1],
-                    "lastname": row[2],
-                    "date_of_birth": row[3],
-                    "gender": row[4],
-                    "picture_path": row[5],
-                    "ekg_tests": []
-                }
-
-                # hole EKG-Tests zur Person
-                cursor.execute("SELECT id, date, result_link FROM ekg_tests WHERE user_id = ?", (person_id,))
-                ekg_rows = cursor.fetchall()
-
-                for ekg in ekg_rows:
-                    person["ekg_tests"].append({
-                        "id": ekg[0],
-                        "date": ekg[1],
-                        "result_link": ekg[2]
-                    })
-
-                conn.close()
-                return person
+        conn.close()
+        return person
 
+    @staticmethod
+    def find_person_data_by_name_from_db(name_search):
+        """Person zum Namen "Nachname Vorname" - löst die id über den Namensindex auf"""
+        conn = get_connection()
+        person_id = find_user_id_by_lastname_first(conn, name_search)
         conn.close()
-        return None
+        if person_id is None:
+            return None
+        return Person.find_person_data_by_id_from_db(person_id)
 
 
     
@@ -0,0 +1,451 @@
+# person_import.py - Massenimport von Personen und EKG-Tests aus person_db.json (eine Transaktion)
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import bcrypt
+
+from blob_store import release_blob
+from db import DB_PATH, get_connection
+from ekg_ingest import ekg_cache_path, ingest_ekg_file
+from migrations import run_migrations
+
+DEFAULT_JSON_PATH = "data/person_db.json"
+DEFAULT_PASSWORD = "password123"  # wie in reset_passwords.py - nach dem ersten Login ändern
+ERROR_EXAMPLES = 5  # so viele betroffene IDs werden je Prüfung angezeigt
+INGEST_CHUNK_SIZE = 16  # Dateien pro Auftrag an einen Worker-Prozess
+STAGE_READ_BYTES = 1024 * 1024  # Blockgröße beim Lesen der JSON-Datei
+STAGE_BATCH_SIZE = 1000  # Personen pro executemany in die Staging-Tabellen
+
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+IMPORTED_TABLES = ("users", "ekg_tests")
+
+# Set-basierte Prüfungen auf den Staging-Tabellen: (Meldung, Abfrage auf betroffene IDs)
+VALIDATION_QUERIES = [
+    ("Personen-ID mehrfach im Import",
+     "SELECT id FROM import_persons GROUP BY id HAVING COUNT(*) > 1"),
+    ("Person ohne ID, Vor- oder Nachname",
+     "SELECT id FROM import_persons WHERE id IS NULL OR COALESCE(firstname, '') = '' "
+     "OR COALESCE(lastname, '') = ''"),
+    ("EKG-ID mehrfach im Import",
+     "SELECT id FROM import_ekg_tests GROUP BY id HAVING COUNT(*) > 1"),
+    ("EKG-Test ohne ID, Datum oder Datei",
+     "SELECT id FROM import_ekg_tests WHERE id IS NULL OR COALESCE(date, '') = '' "
+     "OR COALESCE(result_link, '') = ''"),
+    ("EKG-ID gehört in der Datenbank zu einer anderen Person",
+     "SELECT i.id FROM import_ekg_tests i JOIN ekg_tests e ON e.id = i.id WHERE e.user_id <> i.user_id"),
+    ("Benutzername user<ID> ist bereits von einem anderen Benutzer belegt",
+     "SELECT i.id FROM import_persons i JOIN users u ON u.username = 'user' || i.id WHERE u.id <> i.id"),
+    ("Personen-ID gehört in der Datenbank zu einem anderen Konto (z. B. admin)",
+     "SELECT i.id FROM import_persons i JOIN users u ON u.id = i.id WHERE u.username <> 'user' || i.id"),
+]
+
+
+def iter_json_files(paths):
+    """JSON-Dateien aus den angegebenen Dateien und Ordnern (Ordner alphabetisch)"""
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".json"):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def create_staging_tables(conn):
+    """Temporäre Tabellen, in die der Import zuerst geschrieben und dort geprüft wird"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TEMP TABLE import_persons (
+            id INTEGER, firstname TEXT, lastname TEXT, date_of_birth TEXT,
+            gender TEXT, picture_path TEXT, source TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TEMP TABLE import_ekg_tests (
+            id INTEGER, user_id INTEGER, date TEXT, result_link TEXT, source TEXT
+        )
+    ''')
+
+
+def drop_staging_tables(conn):
+    """Entfernt die Staging-Tabellen (die Verbindung geht danach zurück in den Pool)"""
+    cursor = conn.cursor()
+    cursor.execute("DROP TABLE IF EXISTS temp.import_persons")
+    cursor.execute("DROP TABLE IF EXISTS temp.import_ekg_tests")
+
+
+def iter_json_array(f, read_bytes=STAGE_READ_BYTES):
+    """
+    Elemente des JSON-Arrays einer Datei einzeln, ohne die ganze Datei zu laden.
+
+    Die Datei wird blockweise gelesen; json.JSONDecoder.raw_decode dekodiert
+    jeweils ein Element ab der aktuellen Position. Reicht der Puffer nicht
+    (oder folgt auf das Element noch kein ',' bzw. ']'), wird nachgelesen.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    state = "start"  # start -> first -> (element -> separator)* -> Ende
+    while True:
+        pos = _JSON_WHITESPACE.match(buffer, pos).end()
+        if pos == len(buffer):
+            if eof:
+                raise ValueError(f"{f.name}: JSON-Array ist nicht abgeschlossen")
+            chunk = f.read(read_bytes)
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+            continue
+
+        char = buffer[pos]
+        if state == "start":
+            if char != "[":
+                raise ValueError(f"{f.name}: JSON-Datei enthält keine Liste von Personen")
+            pos += 1
+            state = "first"
+        elif state == "separator" or (state == "first" and char == "]"):
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"{f.name}: unerwartetes Zeichen {char!r} in der Personenliste")
+            pos += 1
+            state = "element"
+        else:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                following = _JSON_WHITESPACE.match(buffer, end).end()
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = following = None
+            # Vollständig erst, wenn ',' oder ']' folgt - sonst könnte z. B. eine Zahl abgeschnitten sein
+            if not eof and (end is None or following == len(buffer) or buffer[following] not in ",]"):
+                chunk = f.read(read_bytes)
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                continue
+            yield value
+            pos = end
+            state = "separator"
+
+
+def stage_file(conn, json_path):
+    """
+    Schreibt eine JSON-Datei blockweise per executemany in die Staging-Tabellen.
+
+    Personen werden einzeln aus der Datei gelesen (iter_json_array) und in
+    Blöcken zu STAGE_BATCH_SIZE geschrieben - der Speicherbedarf hängt nicht
+    von der Dateigröße ab.
+
+    Returns:
+        tuple: (Anzahl Personen, Anzahl EKG-Tests)
+    """
+    cursor = conn.cursor()
+    person_count = test_count = 0
+    with open(json_path, "r", encoding="utf-8") as f:
+        persons_iter = iter_json_array(f)
+        while True:
+            persons = list(islice(persons_iter, STAGE_BATCH_SIZE))
+            if not persons:
+                break
+            cursor.executemany(
+                "INSERT INTO import_persons VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((p.get("id"), p.get("firstname"), p.get("lastname"), p.get("date_of_birth"),
+                  p.get("gender"), p.get("picture_path"), json_path) for p in persons)
+            )
+            cursor.executemany(
+                "INSERT INTO import_ekg_tests VALUES (?, ?, ?, ?, ?)",
+                ((test.get("id"), p.get("id"), test.get("date"), test.get("result_link"), json_path)
+                 for p in persons for test in p.get("ekg_tests", []))
+            )
+            person_count += len(persons)
+            test_count += sum(len(p.get("ekg_tests", [])) for p in persons)
+    return person_count, test_count
+
+
+def validate_staging(conn):
+    """Führt alle VALIDATION_QUERIES aus und gibt die Fehlermeldungen zurück"""
+    cursor = conn.cursor()
+    errors = []
+    for message, query in VALIDATION_QUERIES:
+        cursor.execute(query)
+        ids = [row[0] for row in cursor.fetchall()]
+        if ids:
+            examples = ", ".join(str(i) for i in ids[:ERROR_EXAMPLES])
+            errors.append(f"{message}: {len(ids)} Fälle (z. B. {examples})")
+    return errors
+
+
+def drop_secondary_indexes(conn):
+    """
+    Entfernt die Indizes der Importtabellen und gibt ihre CREATE-Anweisungen zurück.
+
+    UNIQUE-Constraints (sqlite_autoindex_*) bleiben bestehen, da sie keine SQL haben.
+    """
+    cursor = conn.cursor()
+    placeholders = ", ".join("?" for _ in IMPORTED_TABLES)
+    cursor.execute(f'''
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ({placeholders})
+    ''', IMPORTED_TABLES)
+    indexes = cursor.fetchall()
+    for name, _ in indexes:
+        cursor.execute(f'DROP INDEX "{name}"')
+    return [sql for _, sql in indexes]
+
+
+def merge_staging(conn, password_hash):
+    """
+    Übernimmt die Staging-Tabellen mit je einer INSERT ... SELECT-Anweisung.
+
+    Neue Personen bekommen Benutzername user<ID> und das Standardpasswort;
+    bei vorhandenen werden nur die Personendaten aktualisiert (Login, Rolle
+    und Profilbild bleiben). EKG-Tests, deren Datei sich geändert hat,
+    verlieren ihren content_hash und geben den alten Blob frei.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO users (id, username, password, email, full_name, firstname, lastname,
+                           date_of_birth, gender, picture_path, role, is_active)
+        SELECT id, 'user' || id, ?, 'user' || id || '@example.com', firstname || ' ' || lastname,
+               firstname, lastname, date_of_birth, gender, picture_path, 'user', 1
+        FROM import_persons WHERE true
+        ON CONFLICT (id) DO UPDATE SET
+            firstname = excluded.firstname,
+            lastname = excluded.lastname,
+            full_name = excluded.full_name,
+            date_of_birth = excluded.date_of_birth,
+            gender = excluded.gender,
+            picture_path = excluded.picture_path
+    ''', (password_hash,))
+
+    cursor.execute('''
+        SELECT e.content_hash FROM ekg_tests e
+        JOIN import_ekg_tests i ON i.id = e.id
+        WHERE e.content_hash IS NOT NULL AND e.result_link IS NOT i.result_link
+    ''')
+    for (content_hash,) in cursor.fetchall():
+        release_blob(conn, content_hash)
+
+    cursor.execute('''
+        INSERT INTO ekg_tests (id, user_id, date, result_link)
+        SELECT id, user_id, date, result_link FROM import_ekg_tests WHERE true
+        ON CONFLICT (id) DO UPDATE SET
+            date = excluded.date,
+            result_link = excluded.result_link,
+            content_hash = CASE WHEN ekg_tests.result_link IS excluded.result_link
+                                THEN ekg_tests.content_hash END
+    ''')
+
+
+def verify_import(conn):
+    """Set-basierte Kontrolle nach dem Import: fehlende Personen und EKG-Tests"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT
+            (SELECT COUNT(*) FROM import_persons i LEFT JOIN users u ON u.id = i.id WHERE u.id IS NULL),
+            (SELECT COUNT(*) FROM import_ekg_tests i LEFT JOIN ekg_tests e ON e.id = i.id
+             WHERE e.id IS NULL OR e.user_id <> i.user_id)
+    ''')
+    return cursor.fetchone()
+
+
+def get_pending_ekg_files(conn):
+    """
+    Importierte EKG-Tests, deren Datei noch nicht im Binär-Cache liegt, gruppiert nach Datei.
+
+    Auch Tests, deren content_hash schon gesetzt ist (z. B. durch
+    backfill_content_hashes beim App-Start), werden eingelesen, solange ihr
+    Cache fehlt. Nur Tests ohne content_hash stehen in der Liste und werden
+    später als Blob-Referenz gezählt.
+
+    Returns:
+        tuple: (dict Dateipfad -> Liste der Test-IDs ohne content_hash, Anzahl fehlender Dateien)
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT e.id, e.result_link, e.content_hash FROM ekg_tests e
+        JOIN import_ekg_tests i ON i.id = e.id
+    ''')
+    pending = {}
+    missing = 0
+    for test_id, result_link, content_hash in cursor.fetchall():
+        if content_hash and os.path.exists(ekg_cache_path(content_hash)):
+            continue
+        # Unter Windows hochgeladene Pfade enthalten Backslashes
+        file_path = result_link.replace("\\", "/")
+        if not os.path.exists(file_path):
+            missing += 1
+            continue
+        test_ids = pending.setdefault(file_path, [])
+        if content_hash is None:
+            test_ids.append(test_id)
+    return pending, missing
+
+
+def _safe_ingest(file_path):
+    """ingest_ekg_file für den Worker-Pool - Fehler werden zurückgegeben statt geworfen"""
+    try:
+        return ingest_ekg_file(file_path)
+    except Exception as e:
+        return e
+
+
+def ingest_ekg_files(file_paths, workers):
+    """
+    Liest alle Dateien in einem Pool von Worker-Prozessen ein (Formaterkennung,
+    Binär-Cache, R-Zacken-Index). Jede Datei wird nur einmal gelesen.
+
+    Returns:
+        tuple: (Liste der Ergebnisse von ingest_ekg_file, Liste von Fehlermeldungen)
+    """
+    results = []
+    errors = []
+
+    def collect(file_path, outcome):
+        if isinstance(outcome, Exception):
+            errors.append(f"{file_path}: {outcome}")
+        else:
+            results.append(outcome)
+
+    if workers <= 1 or len(file_paths) <= 1:
+        for file_path in file_paths:
+            try:
+                collect(file_path, ingest_ekg_file(file_path))
+            except Exception as e:
+                collect(file_path, e)
+        return results, errors
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for file_path, outcome in zip(file_paths, pool.map(_safe_ingest, file_paths, chunksize=INGEST_CHUNK_SIZE)):
+            collect(file_path, outcome)
+    return results, errors
+
+
+def register_ekg_blobs(conn, pending, results):
+    """
+    Registriert eingelesene Dateien als Blobs (ohne Kopie) und setzt content_hash der Tests.
+
+    Referenzen werden nur für Tests ohne content_hash gezählt - Tests mit
+    Hash sind bereits registriert und wurden nur für den Cache eingelesen.
+    """
+    results = [result for result in results if pending[result[0]]]
+    cursor = conn.cursor()
+    cursor.executemany('''
+        INSERT INTO blobs (sha256, path, size_bytes, ref_count) VALUES (?, ?, ?, ?)
+        ON CONFLICT (sha256) DO UPDATE SET ref_count = ref_count + excluded.ref_count
+    ''', [
+        (content_hash, file_path, size_bytes, len(pending[file_path]))
+        for file_path, content_hash, size_bytes, _, _ in results
+    ])
+    cursor.executemany(
+        "UPDATE ekg_tests SET content_hash = ? WHERE id = ?",
+        [(content_hash, test_id)
+         for file_path, content_hash, _, _, _ in results
+         for test_id in pending[file_path]]
+    )
+
+
+def import_persons(paths, db_path=DB_PATH, workers=None, ingest_ekg=True):
+    """
+    Importiert Personen und EKG-Tests aus JSON-Dateien/Ordnern.
+
+    Staging, Prüfung und Übernahme laufen in einer Transaktion; bei einem
+    Prüfungsfehler wird nichts geschrieben. Ist der Import mindestens so groß
+    wie der Bestand, werden die Indizes danach einmal neu aufgebaut statt bei
+    jeder Zeile nachgeführt. Das Einlesen der EKG-Dateien läuft erst nach dem
+    Commit, damit die Schreibsperre nicht so lange gehalten wird.
+
+    Returns:
+        bool: True bei Erfolg
+    """
+    started = time.perf_counter()
+    conn = get_connection(db_path)
+    try:
+        run_migrations(conn)
+        create_staging_tables(conn)
+        if not _import_staged(conn, paths, started):
+            return False
+        if ingest_ekg:
+            _ingest_imported_ekg(conn, workers or os.cpu_count() or 1, started)
+        return True
+    finally:
+        drop_staging_tables(conn)
+        conn.close()
+
+
+def _import_staged(conn, paths, started):
+    """Staging, Prüfung und Übernahme in einer Transaktion (False bei Prüfungsfehlern)"""
+    password_hash = bcrypt.hashpw(DEFAULT_PASSWORD.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        person_count = test_count = 0
+        for json_path in iter_json_files(paths):
+            persons, tests = stage_file(conn, json_path)
+            person_count += persons
+            test_count += tests
+            print(f"📄 {json_path}: {persons} Personen, {tests} EKG-Tests")
+
+        errors = validate_staging(conn)
+        if errors:
+            conn.rollback()
+            for error in errors:
+                print(f"❌ {error}")
+            print("Import abgebrochen - es wurde nichts geschrieben.")
+            return False
+
+        cursor.execute("SELECT COUNT(*) FROM users")
+        deferred_indexes = drop_secondary_indexes(conn) if person_count >= cursor.fetchone()[0] else []
+        merge_staging(conn, password_hash)
+        for sql in deferred_indexes:
+            cursor.execute(sql)
+
+        missing_persons, missing_tests = verify_import(conn)
+        if missing_persons or missing_tests:
+            raise RuntimeError(f"{missing_persons} Personen und {missing_tests} EKG-Tests fehlen nach dem Import")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    print(f"✅ {person_count} Personen und {test_count} EKG-Tests übernommen "
+          f"({time.perf_counter() - started:.1f} s)")
+    return True
+
+
+def _ingest_imported_ekg(conn, workers, started):
+    """EKG-Dateien der importierten Tests einlesen und als Blobs registrieren"""
+    pending, missing = get_pending_ekg_files(conn)
+    if missing:
+        print(f"⚠️ {missing} EKG-Tests verweisen auf nicht vorhandene Dateien")
+    results, errors = ingest_ekg_files(list(pending), workers)
+    for error in errors:
+        print(f"✗ {error}")
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        register_ekg_blobs(conn, pending, results)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    print(f"✅ {len(results)} EKG-Dateien eingelesen und gecacht "
+          f"({time.perf_counter() - started:.1f} s gesamt)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Personen und EKG-Tests aus JSON in personen.db importieren")
+    parser.add_argument("paths", nargs="*", default=[DEFAULT_JSON_PATH],
+                        help="JSON-Dateien oder Ordner mit JSON-Dateien (Standard: data/person_db.json)")
+    parser.add_argument("--db", default=DB_PATH, help="Datenbankdatei (Standard: personen.db)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker-Prozesse für das Einlesen der EKG-Dateien (Standard: alle Kerne)")
+    parser.add_argument("--skip-ekg", action="store_true", help="EKG-Dateien nicht einlesen")
+    args = parser.parse_args(argv)
+    return 0 if import_persons(args.paths, args.db, args.workers, not args.skip_ekg) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# picture_store.py - Inhaltsadressierte Profilbilder mit vorberechneten Vorschaugrößen
+import io
+import os
+
+from PIL import Image
+
+from blob_store import store_blob, release_blob
+
+# Kantenlängen (px), die beim Hochladen erzeugt werden; die größte ist das gespeicherte Original
+THUMBNAIL_SIZES = (64, 150, 300)
+JPEG_QUALITY = 85
+
+
+def encode_thumbnail(image, size):
+    """Verkleinert auf höchstens size x size und kodiert als JPEG"""
+    thumbnail = image.copy()
+    thumbnail.thumbnail((size, size), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    thumbnail.convert("RGB").save(buffer, format="JPEG", quality=JPEG_QUALITY)
+    return buffer.getvalue()
+
+
+def store_picture(conn, source):
+    """
+    Speichert ein Bild (Datei, Pfad oder Upload) in allen Vorschaugrößen.
+
+    Der Schlüssel ist der Hash der größten Variante - identische Bilder werden
+    nur einmal abgelegt, jede Verwendung erhöht die Referenzzähler.
+
+    Returns:
+        str: picture_hash für users.picture_hash
+    """
+    image = Image.open(source)
+    variants = {size: encode_thumbnail(image, size) for size in THUMBNAIL_SIZES}
+    picture_hash = None
+    cursor = conn.cursor()
+    for size in sorted(THUMBNAIL_SIZES, reverse=True):
+        blob_sha256, _, _ = store_blob(conn, variants[size], ".jpg")
+        picture_hash = picture_hash or blob_sha256
+        cursor.execute('''
+            INSERT OR IGNORE INTO picture_thumbnails (picture_hash, size, blob_sha256)
+            VALUES (?, ?, ?)
+        ''', (picture_hash, size, blob_sha256))
+    return picture_hash
+
+
+def release_picture(conn, picture_hash):
+    """Gibt eine Verwendung des Bildes frei; nicht mehr referenzierte Varianten werden gelöscht"""
+    if not picture_hash:
+        return
+    cursor = conn.cursor()
+    cursor.execute("SELECT blob_sha256 FROM picture_thumbnails WHERE picture_hash = ?", (picture_hash,))
+    for (blob_sha256,) in cursor.fetchall():
+        release_blob(conn, blob_sha256)
+    cursor.execute('''
+        DELETE FROM picture_thumbnails
+        WHERE picture_hash = ? AND blob_sha256 NOT IN (SELECT sha256 FROM blobs)
+    ''', (picture_hash,))
+
+
+def get_picture_path(conn, picture_hash, size=150):
+    """Pfad der kleinsten Variante, die mindestens size px groß ist (sonst der größten)"""
+    if not picture_hash:
+        return None
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT b.path FROM picture_thumbnails t
+        JOIN blobs b ON b.sha256 = t.blob_sha256
+        WHERE t.picture_hash = ?
+        ORDER BY t.size < ?, CASE WHEN t.size >= ? THEN t.size ELSE -t.size END
+        LIMIT 1
+    ''', (picture_hash, size, size))
+    row = cursor.fetchone()
+    return row[0] if row and os.path.exists(row[0]) else None
+
+
+def migrate_user_pictures(conn):
+    """
+    Überträgt vorhandene Profilbilder (picture_data oder picture_path) in den Bildspeicher.
+
+    Die BLOB-Spalte wird danach geleert; die Bytes werden Zeile für Zeile gelesen,
+    nie alle auf einmal.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, picture_path FROM users
+        WHERE picture_hash IS NULL AND (picture_data IS NOT NULL OR picture_path IS NOT NULL)
+    ''')
+    for user_id, picture_path in cursor.fetchall():
+        cursor.execute("SELECT picture_data FROM users WHERE id = ?", (user_id,))
+        picture_data = cursor.fetchone()[0]
+        if picture_data:
+            source = io.BytesIO(picture_data)
+        elif picture_path and os.path.exists(picture_path):
+            source = picture_path
+        else:
+            continue
+        try:
+            picture_hash = store_picture(conn, source)
+        except Exception as e:
+            print(f"✗ Profilbild von Benutzer {user_id} nicht übernommen: {e}")
+            continue
+        cursor.execute(
+            "UPDATE users SET picture_hash = ?, picture_data = NULL WHERE id = ?",
+            (picture_hash, user_id)
+        )
@@ -0,0 +1,163 @@
+# power_curve.py - Mean-Maximal-Kurven (Leistung, Herzfrequenz, Geschwindigkeit)
+import json
+import numpy as np
+
+# Logarithmisches Dauer-Raster von 1 s bis 24 h - für alle Aktivitäten identisch,
+# damit die Bestwert-Hülle ein elementweises Maximum über gespeicherte Kurven ist
+DURATION_GRID = np.unique(np.round(np.logspace(0, np.log10(24 * 3600), 80)).astype(int))
+
+CURVE_CHANNELS = ['power', 'heartrate', 'velocity']
+
+# Fehlende Leistung und Stillstand zählen als 0 W (Rollen, Stopps); die übrigen
+# Kanäle werden dort NaN und nur lückenlos gültige Fenster zählen
+CURVE_GAP_FILL = {'power': 0.0}
+
+
+def mean_max(values, durations=DURATION_GRID):
+    """
+    Bester Mittelwert für jede Dauer in durations (Sekunden bei 1 Hz).
+
+    Die Werte liegen auf dem lückenlosen 1-Hz-Raster, jedes Fenster ist also
+    ein zusammenhängender Zeitraum. Über die kumulative Summe ist jedes
+    Fenstermittel eine Differenz, pro Dauer reicht daher eine vektorisierte
+    Operation über alle Startpunkte; Fenster mit NaN zählen wie in
+    rolling_mean nicht.
+    """
+    curve = np.full(len(durations), np.nan)
+    if values is None or len(values) == 0:
+        return curve
+
+    values = np.asarray(values, dtype=float)
+    invalid = np.isnan(values)
+    csum = np.concatenate(([0.0], np.cumsum(np.where(invalid, 0.0, values))))
+    cbad = np.concatenate(([0], np.cumsum(invalid)))
+    n = len(values)
+    for i, duration in enumerate(durations):
+        if duration > n:
+            break
+        complete = (cbad[duration:] - cbad[:-duration]) == 0
+        if not np.any(complete):
+            # Kein lückenloses Fenster dieser Länge - längere gibt es dann auch nicht
+            break
+        curve[i] = np.max((csum[duration:] - csum[:-duration])[complete]) / duration
+    return curve
+
+
+def compute_activity_curves(stream):
+    """Berechnet die Mean-Maximal-Kurven aller Kanäle einer auf 1 Hz gerasterten Aktivität"""
+    curves = {}
+    for channel in CURVE_CHANNELS:
+        # Ganzes Raster statt nur der Bewegungssekunden - Anstrengungen über Stopps
+        # und Aussetzer hinweg werden so nicht zusammengesetzt
+        measured = stream['valid'][channel] & stream['moving']
+        values = np.where(measured, stream[channel], CURVE_GAP_FILL.get(channel, np.nan))
+        curve = mean_max(values)
+        # Kanal ohne echte Messwerte (z. B. kein Leistungsmesser) nicht speichern
+        if not np.any(curve > 0):
+            curve = np.full(len(DURATION_GRID), np.nan)
+        curves[channel] = curve
+    return curves
+
+
+def curves_to_json(curves):
+    """Serialisiert Kurven als JSON (NaN -> null)"""
+    return json.dumps({
+        'durations': DURATION_GRID.tolist(),
+        **{channel: [None if np.isnan(v) else float(v) for v in curve]
+           for channel, curve in curves.items()}
+    })
+
+
+def curves_from_json(text):
+    """Liest Kurven aus JSON (null -> NaN)"""
+    raw = json.loads(text)
+    return {
+        channel: np.array([np.nan if v is None else v for v in raw.get(channel, [])], dtype=float)
+        for channel in CURVE_CHANNELS
+    }
+
+
+def merge_envelope(envelope, curves):
+    """Elementweises Maximum zweier Kurvensätze (NaN wird ignoriert)"""
+    if envelope is None:
+        return {channel: curve.copy() for channel, curve in curves.items()}
+    return {channel: np.fmax(envelope[channel], curves[channel]) for channel in CURVE_CHANNELS}
+
+
+def get_session_curves(conn, session_id):
+    """Gespeicherte Kurven einer Session (oder None)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT curves FROM activity_curves WHERE session_id = ?", (session_id,))
+    row = cursor.fetchone()
+    return curves_from_json(row[0]) if row else None
+
+
+def get_user_envelope(conn, user_id):
+    """Bestwert-Hülle eines Benutzers über alle Aktivitäten (oder None)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT curves FROM user_curve_envelope WHERE user_id = ?", (user_id,))
+    row = cursor.fetchone()
+    return curves_from_json(row[0]) if row else None
+
+
+def update_session_curves(conn, session_id, user_id, stream):
+    """Berechnet und speichert die Kurven einer Session und erweitert die Hülle des Benutzers"""
+    curves = compute_activity_curves(stream)
+    reprocessed = get_session_curves(conn, session_id) is not None
+
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT OR REPLACE INTO activity_curves (session_id, user_id, curves)
+        VALUES (?, ?, ?)
+    ''', (session_id, user_id, curves_to_json(curves)))
+    if reprocessed:
+        # Alte Kurven können noch in der Hülle stecken - neu aufbauen statt erweitern
+        rebuild_user_envelope(conn, user_id)
+        return curves
+
+    envelope = merge_envelope(get_user_envelope(conn, user_id), curves)
+    cursor.execute('''
+        INSERT OR REPLACE INTO user_curve_envelope (user_id, curves, updated_at)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+    ''', (user_id, curves_to_json(envelope)))
+    return curves
+
+
+def rebuild_user_envelope(conn, user_id):
+    """Baut die Hülle aus den gespeicherten Kurven neu auf (z. B. nach dem Löschen einer Session)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT curves FROM activity_curves WHERE user_id = ?", (user_id,))
+    envelope = None
+    for (text,) in cursor.fetchall():
+        envelope = merge_envelope(envelope, curves_from_json(text))
+
+    if envelope is None:
+        cursor.execute("DELETE FROM user_curve_envelope WHERE user_id = ?", (user_id,))
+    else:
+        cursor.execute('''
+            INSERT OR REPLACE INTO user_curve_envelope (user_id, curves, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+        ''', (user_id, curves_to_json(envelope)))
+    return envelope
+
+
+def remove_session_curves(conn, session_id):
+    """Entfernt die Kurven einer gelöschten Session und baut die Hülle ihres Benutzers neu auf"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT user_id FROM activity_curves WHERE session_id = ?", (session_id,))
+    row = cursor.fetchone()
+    if not row:
+        return
+    cursor.execute("DELETE FROM activity_curves WHERE session_id = ?", (session_id,))
+    rebuild_user_envelope(conn, row[0])
+
+
+def format_duration_label(seconds):
+    """Kurze Beschriftung für die Dauer-Achse (z. B. 5s, 20min, 1h)"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}min"
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}h{rest // 60:02d}" if rest >= 60 else f"{hours}h"
@@ -0,0 +1,153 @@
+# range_stats.py - Vorberechnete Bereichsstatistiken für schnelle Zeitfenster-Abfragen
+import numpy as np
+
+from activity import as_activity
+from metrics import METRICS, SeriesMetric, empty_stats
+from resampling import resample_activity, window_indices
+
+class SparseTable:
+    """
+    Sparse Table für Minimum/Maximum über beliebige Indexbereiche.
+
+    Aufbau in O(n log n), jede Abfrage [lo, hi) in O(1).
+    """
+
+    def __init__(self, values, op):
+        self.op = op
+        self.levels = [np.asarray(values, dtype=float)]
+        width = 1
+        while 2 * width <= len(values):
+            previous = self.levels[-1]
+            self.levels.append(op(previous[:-width], previous[width:]))
+            width *= 2
+
+    def query(self, lo, hi):
+        """Gibt op über values[lo:hi] zurück (hi > lo)"""
+        level = int(hi - lo).bit_length() - 1
+        table = self.levels[level]
+        return self.op(table[lo], table[hi - (1 << level)])
+
+
+class ChannelIndex:
+    """Präfixsummen und Sparse Tables für einen Kanal"""
+
+    def __init__(self, values, valid):
+        values = np.asarray(values, dtype=float)
+        self.prefix_count = np.concatenate(([0], np.cumsum(valid)))
+        self.prefix_sum = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+        self.max_table = SparseTable(np.where(valid, values, -np.inf), np.maximum)
+        self.min_table = SparseTable(np.where(valid, values, np.inf), np.minimum)
+        # Für die Differenz zählen nur erster und letzter gültiger Wert im Fenster
+        self.positions = np.flatnonzero(valid)
+        self.values = values
+
+    def count(self, lo, hi):
+        return int(self.prefix_count[hi] - self.prefix_count[lo])
+
+    def mean(self, lo, hi):
+        count = self.count(lo, hi)
+        if count == 0:
+            return 0
+        return (self.prefix_sum[hi] - self.prefix_sum[lo]) / count
+
+    def max(self, lo, hi):
+        if self.count(lo, hi) == 0:
+            return 0
+        return self.max_table.query(lo, hi)
+
+    def min(self, lo, hi):
+        if self.count(lo, hi) == 0:
+            return 0
+        return self.min_table.query(lo, hi)
+
+    def delta(self, lo, hi):
+        first = np.searchsorted(self.positions, lo, side='left')
+        last = np.searchsorted(self.positions, hi, side='left') - 1
+        if last - first < 1:
+            return 0
+        return self.values[self.positions[last]] - self.values[self.positions[first]]
+
+
+class SeriesIndex:
+    """Präfixsummen einer abgeleiteten Reihe (SeriesMetric) auf dem 1-Hz-Raster für beliebige Bereiche"""
+
+    def __init__(self, metric, values):
+        self.metric = metric
+        series = metric.series(values)
+        valid = ~np.isnan(series)
+        self.prefix_count = np.concatenate(([0], np.cumsum(valid)))
+        self.prefix_sum = np.concatenate(([0.0], np.cumsum(np.where(valid, series, 0.0))))
+
+    def value(self, lo, hi):
+        # Element i nutzt die Sekunden i..i+lag - nur Elemente, die ganz im Bereich liegen
+        lo = min(lo, len(self.prefix_count) - 1)
+        hi = min(max(lo, hi - self.metric.lag), len(self.prefix_count) - 1)
+        return self.metric.from_aggregate(self.prefix_sum[hi] - self.prefix_sum[lo],
+                                          int(self.prefix_count[hi] - self.prefix_count[lo]))
+
+
+class RangeStats:
+    """
+    Statistik-Engine für eine Aktivität.
+
+    Nach einmaligem Aufbau liefert stats(lo, hi) dieselben Kennzahlen wie
+    calculate_filtered_stats für data[lo:hi], aber in O(1) statt O(n).
+    """
+
+    def __init__(self, data):
+        # Gültigkeitsmasken (inkl. Wertebereiche) kommen direkt aus der Activity
+        activity = as_activity(data)
+        self.time = activity.time
+        n = len(self.time)
+
+        # Ein Index je Kanal der registrierten Kennzahlen, eine Reihe je SeriesMetric
+        # (Reihen auf dem 1-Hz-Raster, damit ihre Fenster Sekunden sind)
+        self.channels = {}
+        self.series = {}
+        self.stream = None
+        for key, (channel, reduction, _) in METRICS.items():
+            if channel == 'time':
+                continue
+            if isinstance(reduction, SeriesMetric):
+                if self.stream is None:
+                    self.stream = resample_activity(activity)
+                self.series[key] = SeriesIndex(reduction, self.stream[channel])
+            elif channel not in self.channels:
+                values = activity.column(channel) if channel in activity else np.zeros(n)
+                self.channels[channel] = ChannelIndex(values, activity.valid(channel))
+
+    def __len__(self):
+        return len(self.time)
+
+    def stats(self, lo, hi):
+        """Kennzahlen für den Indexbereich [lo, hi)"""
+        lo = max(0, lo)
+        hi = min(len(self.time), hi)
+        if hi <= lo:
+            return empty_stats()
+
+        if self.series:
+            # Rohdatenbereich -> Sekunden des 1-Hz-Rasters (wie resample_activity(data[lo:hi]))
+            stream_lo, stream_hi = window_indices(self.stream, self.time[lo] - self.time[0],
+                                                  self.time[hi - 1] - self.time[0])
+
+        results = {}
+        for key, (channel, reduction, scale) in METRICS.items():
+            if key in self.series:
+                value = self.series[key].value(stream_lo, stream_hi)
+            elif channel == 'time':
+                value = self.time[hi - 1] - self.time[lo]
+            else:
+                value = getattr(self.channels[channel], reduction)(lo, hi)
+            results[key] = value * scale
+        return results
+
+    def channel_summary(self, name, lo, hi):
+        """Mittelwert, Maximum und Minimum eines Kanals im Bereich [lo, hi)"""
+        channel = self.channels[name]
+        return {
+            'avg': channel.mean(lo, hi),
+            'max': channel.max(lo, hi),
+            'min': channel.min(lo, hi),
+        }
+
@@ -0,0 +1,355 @@
+# repository.py - Gebündelte Abfragen für Benutzer und EKG-Tests (Ergebnisse als Dicts nach ID)
+import json
+import os
+import sqlite3
+
+# Spalten für Benutzerabfragen statt SELECT * - gleiche Positionen wie in der Tabelle,
+# aber picture_hash statt der Bildbytes (Bilder kommen erst beim Anzeigen aus picture_store)
+USER_COLUMNS = ("id, username, password, email, full_name, firstname, lastname, date_of_birth, "
+                "gender, height_cm, weight_kg, picture_path, picture_hash, role, is_active, "
+                "created_at, last_login")
+
+USER_PAGE_SIZE = 25
+NAME_SEARCH_LIMIT = 50  # Einträge in Personenauswahlen; mehr Treffer -> Namensanfang eingeben
+PREFIX_UPPER_BOUND = "\U0010ffff"  # größtes Zeichen - [präfix, präfix + ...) umfasst alle Treffer
+
+
+def display_name(firstname, lastname, username):
+    """Vorname Nachname, sonst der Benutzername"""
+    return f"{firstname} {lastname}" if firstname and lastname else username
+
+
+def get_user_counts(conn):
+    """
+    Kennzahlen der Benutzerverwaltung in einer Abfrage (bedingte Summen statt einer Abfrage je Wert).
+
+    Returns:
+        dict: 'total', 'admins', 'users', 'active', 'inactive' sowie für aktive Benutzer
+              'active_admins', 'active_users', 'recent_logins' (letzte 7 Tage), 'with_pictures'
+              und 'active_by_role' (Rolle -> Anzahl, alle vorkommenden Rollen)
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT COUNT(*),
+               COALESCE(SUM(CASE WHEN role = 'admin' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN role = 'user' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN is_active = 1 THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN is_active = 1 AND role = 'admin' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN is_active = 1 AND role = 'user' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN is_active = 1 AND last_login >= datetime('now', '-7 days')
+                                 THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN is_active = 1 AND picture_hash IS NOT NULL THEN 1 ELSE 0 END), 0),
+               (SELECT json_group_object(role, n) FROM (
+                    SELECT COALESCE(role, 'user') AS role, COUNT(*) AS n
+                    FROM users WHERE is_active = 1 GROUP BY 1
+               ))
+        FROM users
+    ''')
+    (total, admins, users, active, active_admins, active_users,
+     recent_logins, with_pictures, by_role) = cursor.fetchone()
+    return {
+        'total': total,
+        'admins': admins,
+        'users': users,
+        'active': active,
+        'inactive': total - active,
+        'active_admins': active_admins,
+        'active_users': active_users,
+        'recent_logins': recent_logins,
+        'with_pictures': with_pictures,
+        'active_by_role': json.loads(by_role) if by_role else {},
+    }
+
+
+def get_users_page(conn, after_id=None, role=None, is_active=None, name_prefix=None,
+                   page_size=USER_PAGE_SIZE):
+    """
+    Eine Seite der Benutzerliste, neueste zuerst (Keyset-Paginierung über id).
+
+    Statt OFFSET wird ab der letzten id der vorherigen Seite gelesen - jede Seite
+    kostet gleich viel, egal wie weit hinten sie liegt. Rolle und Aktiv-Status
+    laufen über die Indizes auf role/is_active, der Namensanfang (ohne
+    Groß-/Kleinschreibung) über die NOCASE-Indizes auf display_name und username.
+
+    Returns:
+        tuple: (Liste von Dicts mit USER_COLUMNS, has_next)
+    """
+    clauses = []
+    params = []
+    if after_id is not None:
+        clauses.append("id < ?")
+        params.append(after_id)
+    if role is not None:
+        clauses.append("role = ?")
+        params.append(role)
+    if is_active is not None:
+        clauses.append("is_active = ?")
+        params.append(1 if is_active else 0)
+    if name_prefix:
+        upper = name_prefix + PREFIX_UPPER_BOUND
+        clauses.append('''(
+            (display_name COLLATE NOCASE >= ? AND display_name COLLATE NOCASE < ?)
+            OR (username COLLATE NOCASE >= ? AND username COLLATE NOCASE < ?)
+        )''')
+        params.extend([name_prefix, upper, name_prefix, upper])
+
+    query = f"SELECT {USER_COLUMNS} FROM users"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY id DESC LIMIT ?"
+    params.append(page_size + 1)  # eine Zeile mehr zeigt, ob es eine weitere Seite gibt
+
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    columns = [column[0] for column in cursor.description]
+    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return rows[:page_size], len(rows) > page_size
+
+
+def search_users_by_name(conn, name_prefix=None, active_only=True, limit=NAME_SEARCH_LIMIT):
+    """
+    Benutzer für Personenauswahlen, alphabetisch nach Anzeigename.
+
+    Präfix und Sortierung laufen über den NOCASE-Index auf display_name - es
+    werden nur die ersten limit Einträge gelesen, egal wie viele Benutzer es gibt.
+
+    Returns:
+        tuple: (dict user_id -> display_name, has_more)
+    """
+    clauses = ["display_name IS NOT NULL"]
+    params = []
+    if active_only:
+        clauses.append("is_active = 1")
+    if name_prefix:
+        clauses.append("display_name COLLATE NOCASE >= ? AND display_name COLLATE NOCASE < ?")
+        params.extend([name_prefix, name_prefix + PREFIX_UPPER_BOUND])
+    params.append(limit + 1)
+
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT id, display_name FROM users
+        WHERE {" AND ".join(clauses)}
+        ORDER BY display_name COLLATE NOCASE, id
+        LIMIT ?
+    ''', params)
+    rows = cursor.fetchall()
+    return dict(rows[:limit]), len(rows) > limit
+
+
+def get_user(conn, user_id):
+    """Ein Benutzer als Dict mit USER_COLUMNS (Suche über den Primärschlüssel), sonst None"""
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {USER_COLUMNS} FROM users WHERE id = ?", (user_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([column[0] for column in cursor.description], row))
+
+
+def find_user_id_by_lastname_first(conn, name):
+    """
+    id zum Namen im Format "Nachname Vorname" (wie Person.get_person_list), sonst None.
+
+    Jede mögliche Trennstelle zwischen Nachname und Vorname ist eine Indexsuche
+    auf (lastname, firstname) - auch mehrteilige Namen brauchen keinen Tabellenscan.
+    """
+    parts = name.split(" ")
+    cursor = conn.cursor()
+    for split in range(1, len(parts)):
+        cursor.execute(
+            "SELECT id FROM users WHERE lastname = ? AND firstname = ? ORDER BY id LIMIT 1",
+            (" ".join(parts[:split]), " ".join(parts[split:]))
+        )
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+    return None
+
+
+def get_users_with_ekg_counts(conn):
+    """
+    Alle Benutzer mit der Anzahl ihrer EKG-Tests in einer Abfrage.
+
+    Returns:
+        dict: user_id -> {'id', 'username', 'firstname', 'lastname', 'display_name', 'ekg_count'}
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT u.id, u.username, u.firstname, u.lastname, COUNT(e.id)
+        FROM users u
+        LEFT JOIN ekg_tests e ON e.user_id = u.id
+        GROUP BY u.id
+        ORDER BY u.id
+    ''')
+    return {
+        user_id: {
+            'id': user_id,
+            'username': username,
+            'firstname': firstname,
+            'lastname': lastname,
+            'display_name': display_name(firstname, lastname, username),
+            'ekg_count': ekg_count,
+        }
+        for user_id, username, firstname, lastname, ekg_count in cursor.fetchall()
+    }
+
+
+def get_ekg_count(conn, user_id):
+    """Anzahl der EKG-Tests eines Benutzers (Indexsuche über user_id)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM ekg_tests WHERE user_id = ?", (user_id,))
+    return cursor.fetchone()[0]
+
+
+def get_ekg_tests_by_user(conn, user_id):
+    """
+    EKG-Tests eines Benutzers in Importreihenfolge (das Datum ist Freitext, z. B. "10.2.2023").
+
+    Returns:
+        dict: test_id -> {'id', 'user_id', 'date', 'result_link', 'content_hash'}
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, user_id, date, result_link, content_hash FROM ekg_tests
+        WHERE user_id = ?
+        ORDER BY id
+    ''', (user_id,))
+    return {
+        test_id: {'id': test_id, 'user_id': owner_id, 'date': test_date, 'result_link': result_link,
+                  'content_hash': content_hash}
+        for test_id, owner_id, test_date, result_link, content_hash in cursor.fetchall()
+    }
+
+
+# Häufige Abfragen der App - für die Datenbank-Info wird per EXPLAIN QUERY PLAN
+# ermittelt, welchen Index jede davon nutzt (SQLite zählt Indexzugriffe nicht mit)
+INDEX_USAGE_QUERIES = {
+    "Login / Benutzerzeile": ("SELECT id FROM users WHERE username = ?", ("",)),
+    "Benutzerliste nach Rolle und Status": (
+        "SELECT id FROM users WHERE role = ? AND is_active = ? ORDER BY id DESC LIMIT 26", ("user", 1)
+    ),
+    "Personenauswahl (Namensanfang)": (
+        "SELECT id FROM users WHERE is_active = 1 AND display_name COLLATE NOCASE >= ? "
+        "AND display_name COLLATE NOCASE < ? ORDER BY display_name COLLATE NOCASE, id LIMIT 51",
+        ("a", "b")
+    ),
+    "Person nach Nachname/Vorname": ("SELECT id FROM users WHERE lastname = ? AND firstname = ?", ("", "")),
+    "EKG-Tests eines Benutzers": ("SELECT id FROM ekg_tests WHERE user_id = ? ORDER BY id", (0,)),
+    "Trainings eines Benutzers": (
+        "SELECT id FROM sports_sessions WHERE user_id = ? ORDER BY timestamp DESC", (0,)
+    ),
+    "Audit-Protokoll eines Benutzers": (
+        "SELECT id FROM audit_log WHERE username = ? ORDER BY created_at DESC", ("",)
+    ),
+}
+
+
+def _object_sizes(conn):
+    """Bytes je Tabelle/Index aus der dbstat-Tabelle ({} wenn SQLite ohne dbstat gebaut ist)"""
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")
+        return dict(cursor.fetchall())
+    except sqlite3.OperationalError:
+        return {}
+
+
+def get_table_overview(conn, sizes=None):
+    """
+    Zeilenzahl, Indizes und Größe je Tabelle.
+
+    Args:
+        sizes: Ergebnis von _object_sizes, falls schon ermittelt (dbstat liest die ganze Datei)
+
+    Returns:
+        list: Dicts mit 'table', 'rows', 'indexes', 'size_kb' (None ohne dbstat)
+    """
+    if sizes is None:
+        sizes = _object_sizes(conn)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT name FROM sqlite_master
+        WHERE type = 'table' AND name NOT LIKE 'sqlite_%'
+        ORDER BY name
+    ''')
+    overview = []
+    for (table,) in cursor.fetchall():
+        cursor.execute(f'SELECT COUNT(*) FROM "{table}"')
+        rows = cursor.fetchone()[0]
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table,))
+        indexes = [name for (name,) in cursor.fetchall()]
+        size = sum(sizes.get(name, 0) for name in [table] + indexes) if sizes else None
+        overview.append({
+            'table': table,
+            'rows': rows,
+            'indexes': len(indexes),
+            'size_kb': round(size / 1024, 1) if size is not None else None,
+        })
+    return overview
+
+
+def get_index_usage(conn, sizes=None):
+    """
+    Alle Indizes mit Größe und den Abfragen aus INDEX_USAGE_QUERIES, die sie nutzen.
+
+    Args:
+        sizes: Ergebnis von _object_sizes, falls schon ermittelt
+
+    Returns:
+        list: Dicts mit 'index', 'table', 'size_kb' (None ohne dbstat) und 'used_by'
+    """
+    cursor = conn.cursor()
+    used_by = {}
+    for label, (query, params) in INDEX_USAGE_QUERIES.items():
+        try:
+            cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+        except sqlite3.OperationalError:
+            continue  # Tabelle/Spalte fehlt in dieser Datenbank
+        for row in cursor.fetchall():
+            detail = row[-1]
+            if " INDEX " in detail:
+                index = detail.split(" INDEX ", 1)[1].split(" ", 1)[0]
+                used_by.setdefault(index, []).append(label)
+
+    if sizes is None:
+        sizes = _object_sizes(conn)
+    cursor.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' ORDER BY tbl_name, name")
+    return [
+        {
+            'index': index,
+            'table': table,
+            'size_kb': round(sizes[index] / 1024, 1) if index in sizes else None,
+            'used_by': used_by.get(index, []),
+        }
+        for index, table in cursor.fetchall()
+    ]
+
+
+def get_database_info(conn, db_path):
+    """
+    Schema der users-Tabelle, Dateigröße, letzte Aktivitäten, Tabellen und Index-Nutzung.
+
+    dbstat wird dabei nur einmal gelesen.
+
+    Returns:
+        dict: 'columns', 'db_size_mb', 'recent_activity', 'tables', 'indexes'
+    """
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(users)")
+    columns = [dict(zip([column[0] for column in cursor.description], row)) for row in cursor.fetchall()]
+    cursor.execute('''
+        SELECT username, full_name, created_at, last_login
+        FROM users
+        ORDER BY created_at DESC
+        LIMIT 10
+    ''')
+    recent_activity = [dict(zip([column[0] for column in cursor.description], row)) for row in cursor.fetchall()]
+    db_size = os.path.getsize(db_path) if os.path.exists(db_path) else 0
+    sizes = _object_sizes(conn)
+    return {
+        'columns': columns,
+        'db_size_mb': round(db_size / (1024 * 1024), 2),
+        'recent_activity': recent_activity,
+        'tables': get_table_overview(conn, sizes),
+        'indexes': get_index_usage(conn, sizes),
+    }
@@ -0,0 +1,124 @@
+# resampling.py - Einheitliches 1-Hz-Raster für Aktivitäten mit Gültigkeitsmasken und Pausen
+import numpy as np
+
+from activity import CHANNEL_SPECS, as_activity
+
+# Kanäle, die auf das Raster übertragen werden
+STREAM_CHANNELS = list(CHANNEL_SPECS)
+
+MAX_INTERPOLATION_GAP = 5  # Sekunden - längere Lücken eines Kanals bleiben ungültig
+PAUSE_GAP_SECONDS = 10  # Aufzeichnungslücken ab dieser Länge gelten als Pause (Auto-Pause)
+PAUSE_SPEED = 0.5  # m/s - darunter gilt die Aktivität als stehend
+PAUSE_MIN_SECONDS = 10  # Stillstand zählt erst ab dieser Dauer als Pause
+
+
+def _gap_around(sample_offsets, grid):
+    """Länge der Lücke zwischen den Messpunkten links und rechts jedes Rasterpunkts (0 = exakter Treffer)"""
+    right = np.searchsorted(sample_offsets, grid, side='left')
+    left = np.searchsorted(sample_offsets, grid, side='right') - 1
+    gap = np.full(len(grid), np.inf)
+    exact = (left >= 0) & (left < len(sample_offsets)) & (right == left)
+    inside = (left >= 0) & (right < len(sample_offsets)) & ~exact
+    gap[exact] = 0.0
+    gap[inside] = sample_offsets[right[inside]] - sample_offsets[left[inside]]
+    return gap
+
+
+def _runs_at_least(mask, min_length):
+    """Behält nur zusammenhängende True-Abschnitte mit mindestens min_length Elementen"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    keep = (ends - starts) >= min_length
+    # Abschnitte über Differenzen-Array markieren statt Python-Schleife
+    marks = np.zeros(len(mask) + 1, dtype=np.int32)
+    np.add.at(marks, starts[keep], 1)
+    np.add.at(marks, ends[keep], -1)
+    return np.cumsum(marks[:-1]) > 0
+
+
+def resample_activity(data):
+    """
+    Überträgt eine Aktivität auf ein gleichmäßiges 1-Hz-Raster.
+
+    Jeder Kanal wird linear interpoliert, aber nur über Lücken bis
+    MAX_INTERPOLATION_GAP - alles andere ist NaN und in valid[kanal] False.
+    Pausen (Aufzeichnungslücken oder längerer Stillstand) stehen in 'paused',
+    Fenster und Dauern sind damit reine Indexrechnung (1 Index = 1 Sekunde).
+
+    Returns:
+        dict: 'time' (Unix-Zeit je Sekunde), je Kanal ein float-Array,
+              'valid' (Masken je Kanal), 'paused' und 'moving'
+    """
+    activity = as_activity(data)
+    time = activity.time
+    if len(time) == 0:
+        return {'time': np.array([]), 'valid': {}, 'paused': np.array([], dtype=bool),
+                'moving': np.array([], dtype=bool)}
+
+    offsets = time - time[0]
+    grid = np.arange(int(offsets[-1]) + 1, dtype=float)
+
+    stream = {'time': time[0] + grid, 'valid': {}}
+    for name in STREAM_CHANNELS:
+        sample_valid = activity.valid(name)
+        if not np.any(sample_valid):
+            stream[name] = np.full(len(grid), np.nan)
+            stream['valid'][name] = np.zeros(len(grid), dtype=bool)
+            continue
+
+        sample_offsets = offsets[sample_valid]
+        resampled = np.interp(grid, sample_offsets, activity.valid_values(name).astype(float))
+        valid = _gap_around(sample_offsets, grid) <= MAX_INTERPOLATION_GAP
+        resampled[~valid] = np.nan
+        stream[name] = resampled
+        stream['valid'][name] = valid
+
+    # Pausen: keine Aufzeichnung (Auto-Pause) oder längerer Stillstand
+    paused = _gap_around(offsets, grid) >= PAUSE_GAP_SECONDS
+    velocity_valid = stream['valid']['velocity']
+    standing = velocity_valid & (np.nan_to_num(stream['velocity']) < PAUSE_SPEED)
+    paused |= _runs_at_least(standing, PAUSE_MIN_SECONDS)
+
+    stream['paused'] = paused
+    stream['moving'] = ~paused
+    return stream
+
+
+def window_indices(stream, start_seconds, end_seconds):
+    """Indexbereich [lo, hi) für Sekunden seit Aktivitätsbeginn (inklusive Ende)"""
+    n = len(stream['time'])
+    lo = min(max(int(np.ceil(start_seconds)), 0), n)
+    hi = min(max(int(np.floor(end_seconds)) + 1, lo), n)
+    return lo, hi
+
+
+def moving_seconds(stream, lo=0, hi=None):
+    """Bewegungszeit in Sekunden im Bereich [lo, hi) - jeder Rasterpunkt ist eine Sekunde"""
+    return int(np.count_nonzero(stream['moving'][lo:hi]))
+
+
+def valid_values(stream, channel, moving_only=False):
+    """Gültige Werte eines Kanals, optional nur während der Bewegung"""
+    mask = stream['valid'][channel]
+    if moving_only:
+        mask = mask & stream['moving']
+    return stream[channel][mask]
+
+
+def rolling_mean(values, window):
+    """
+    Gleitendes Mittel über window Sekunden (nur vollständig gültige Fenster).
+
+    Auf dem 1-Hz-Raster ist jedes Fenster eine Differenz zweier Präfixsummen;
+    Fenster mit NaN liefern NaN.
+    """
+    values = np.asarray(values, dtype=float)
+    if window <= 0 or len(values) < window:
+        return np.array([])
+    invalid = np.isnan(values)
+    csum = np.concatenate(([0.0], np.cumsum(np.where(invalid, 0.0, values))))
+    cbad = np.concatenate(([0], np.cumsum(invalid)))
+    means = (csum[window:] - csum[:-window]) / window
+    means[(cbad[window:] - cbad[:-window]) > 0] = np.nan
+    return means
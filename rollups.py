@@ -0,0 +1,81 @@
+# rollups.py - Mehrstufige Zusammenfassungen (Mittel/Min/Max) für lange Aktivitätsplots
+import warnings
+import numpy as np
+
+# Blockgrößen in Sekunden auf dem 1-Hz-Raster (1 = ungerastert)
+ROLLUP_LEVELS = [1, 5, 30, 300]
+ROLLUP_CHANNELS = ['heartrate', 'velocity', 'power']
+
+# Breite des Diagramms in Pixeln - mehr Punkte pro Spur sind nicht sichtbar
+PLOT_WIDTH_PX = 1200
+
+
+def _block_reduce(values, block):
+    """Mittel, Minimum und Maximum je Block von block Werten (NaN wird ignoriert)"""
+    n_blocks = -(-len(values) // block)
+    padded = np.full(n_blocks * block, np.nan)
+    padded[:len(values)] = values
+    blocks = padded.reshape(n_blocks, block)
+    # Blöcke ganz ohne gültige Werte ergeben NaN (Lücke im Plot)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        return np.nanmean(blocks, axis=1), np.nanmin(blocks, axis=1), np.nanmax(blocks, axis=1)
+
+
+def build_rollups(stream, channels=ROLLUP_CHANNELS):
+    """
+    Berechnet alle Auflösungsstufen einer auf 1 Hz gerasterten Aktivität.
+
+    Returns:
+        dict: Stufe (Sekunden) -> {'offset': Blockmitte in s seit Start,
+              kanal: {'mean', 'min', 'max'}}
+    """
+    n = len(stream['time'])
+    rollups = {}
+    for level in ROLLUP_LEVELS:
+        n_blocks = -(-n // level)
+        rollup = {'offset': np.arange(n_blocks) * level + (level - 1) / 2}
+        for channel in channels:
+            values = stream.get(channel)
+            if values is None:
+                continue
+            if level == 1:
+                rollup[channel] = {'mean': values, 'min': values, 'max': values}
+            else:
+                mean, low, high = _block_reduce(values, level)
+                rollup[channel] = {'mean': mean, 'min': low, 'max': high}
+        rollups[level] = rollup
+    return rollups
+
+
+def pick_rollup_level(start_seconds, end_seconds, width_px=PLOT_WIDTH_PX):
+    """
+    Gröbste Stufe, die die Diagrammbreite noch füllt.
+
+    Damit bleibt die Punktzahl pro Spur unabhängig von der Aktivitätsdauer
+    begrenzt (höchstens Faktor zwischen zwei Stufen mal width_px).
+    """
+    duration = max(end_seconds - start_seconds, 0)
+    for level in reversed(ROLLUP_LEVELS):
+        if duration / level >= width_px:
+            return level
+    return ROLLUP_LEVELS[0]
+
+
+def rollup_window(rollups, start_seconds, end_seconds, width_px=PLOT_WIDTH_PX):
+    """
+    Ausschnitt der passenden Stufe für [start_seconds, end_seconds].
+
+    Returns:
+        tuple: (level, offset-Array in s, {kanal: {'mean', 'min', 'max'}})
+    """
+    level = pick_rollup_level(start_seconds, end_seconds, width_px)
+    rollup = rollups[level]
+    # Indexrechnung statt Suche: Block i deckt [i*level, (i+1)*level) ab
+    lo = max(int(start_seconds // level), 0)
+    hi = min(int(end_seconds // level) + 1, len(rollup['offset']))
+    channels = {
+        name: {key: values[lo:hi] for key, values in summary.items()}
+        for name, summary in rollup.items() if name != 'offset'
+    }
+    return level, rollup['offset'][lo:hi], channels
@@ -0,0 +1,198 @@
+# route_heatmap.py - Aufsummierte GPS-Dichte aller Aktivitäten in vorberechneten Kacheln
+from collections import defaultdict
+import numpy as np
+
+from gps_route import SEMICIRCLE_TO_DEG, TILE_SIZE, to_pixels, from_pixels
+
+# Zoomstufen der Kachelgitter (grob -> fein) und Auflösung je Kachel
+HEATMAP_ZOOMS = [8, 11, 14]
+TILE_BINS = 64  # 64 x 64 Zellen je 256-px-Kachel, also 4 px je Zelle
+MAX_RENDER_CELLS = 20000  # mehr Zellen werden nicht an den Browser geschickt
+
+
+def stream_positions(stream):
+    """Gültige Positionen einer 1-Hz-Aktivität in Grad (ein Punkt je Sekunde)"""
+    valid = stream['valid']['position_lat'] & stream['valid']['position_long']
+    lat = stream['position_lat'][valid] * SEMICIRCLE_TO_DEG
+    lon = stream['position_long'][valid] * SEMICIRCLE_TO_DEG
+    keep = ~((lat == 0) & (lon == 0)) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+    return lat[keep], lon[keep]
+
+
+def activity_tiles(lat, lon, zoom):
+    """
+    Dichte einer Aktivität als Kacheln einer Zoomstufe.
+
+    Returns:
+        dict: (tile_x, tile_y) -> TILE_BINS x TILE_BINS-Zählgitter (np.histogram2d)
+    """
+    x, y = to_pixels(lat, lon, zoom)
+    tile_x = (x // TILE_SIZE).astype(int)
+    tile_y = (y // TILE_SIZE).astype(int)
+    keys = np.stack((tile_x, tile_y), axis=1)
+    unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+
+    # Einmal nach Kachel sortieren, dann ist jede Kachel ein zusammenhängender Abschnitt
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.searchsorted(inverse[order], np.arange(len(unique_keys) + 1))
+    x, y = x[order], y[order]
+
+    tiles = {}
+    for i, (tx, ty) in enumerate(unique_keys):
+        start, end = bounds[i], bounds[i + 1]
+        counts, _, _ = np.histogram2d(
+            y[start:end] - ty * TILE_SIZE, x[start:end] - tx * TILE_SIZE,
+            bins=TILE_BINS, range=[[0, TILE_SIZE], [0, TILE_SIZE]]
+        )
+        tiles[(int(tx), int(ty))] = counts.astype(np.uint32)
+    return tiles
+
+
+def _counts_from_blob(blob):
+    return np.frombuffer(blob, dtype=np.uint32).reshape(TILE_BINS, TILE_BINS)
+
+
+def add_session_to_heatmap(conn, session_id, user_id, stream):
+    """Addiert die Dichte einer Session auf die Kacheln des Benutzers (nur einmal je Session)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM heatmap_sessions WHERE session_id = ?", (session_id,))
+    if cursor.fetchone():
+        return False
+
+    lat, lon = stream_positions(stream)
+    if len(lat) > 0:
+        for zoom in HEATMAP_ZOOMS:
+            for (tile_x, tile_y), counts in activity_tiles(lat, lon, zoom).items():
+                cursor.execute('''
+                    SELECT counts FROM heatmap_tiles
+                    WHERE user_id = ? AND zoom = ? AND tile_x = ? AND tile_y = ?
+                ''', (user_id, zoom, tile_x, tile_y))
+                row = cursor.fetchone()
+                if row:
+                    counts = counts + _counts_from_blob(row[0])
+                cursor.execute('''
+                    INSERT OR REPLACE INTO heatmap_tiles (user_id, zoom, tile_x, tile_y, counts)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (user_id, zoom, tile_x, tile_y, counts.astype(np.uint32).tobytes()))
+
+    cursor.execute(
+        "INSERT INTO heatmap_sessions (session_id, user_id) VALUES (?, ?)",
+        (session_id, user_id)
+    )
+    return True
+
+
+def remove_session_from_heatmap(conn, session_id, stream):
+    """Zieht die Dichte einer eingerechneten Session wieder von den Kacheln ab"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT user_id FROM heatmap_sessions WHERE session_id = ?", (session_id,))
+    row = cursor.fetchone()
+    if not row:
+        return False
+    user_id = row[0]
+
+    lat, lon = stream_positions(stream)
+    if len(lat) > 0:
+        for zoom in HEATMAP_ZOOMS:
+            for (tile_x, tile_y), counts in activity_tiles(lat, lon, zoom).items():
+                cursor.execute('''
+                    SELECT counts FROM heatmap_tiles
+                    WHERE user_id = ? AND zoom = ? AND tile_x = ? AND tile_y = ?
+                ''', (user_id, zoom, tile_x, tile_y))
+                tile = cursor.fetchone()
+                if not tile:
+                    continue
+                remaining = np.maximum(_counts_from_blob(tile[0]).astype(np.int64) - counts, 0)
+                if remaining.any():
+                    cursor.execute('''
+                        UPDATE heatmap_tiles SET counts = ?
+                        WHERE user_id = ? AND zoom = ? AND tile_x = ? AND tile_y = ?
+                    ''', (remaining.astype(np.uint32).tobytes(), user_id, zoom, tile_x, tile_y))
+                else:
+                    cursor.execute('''
+                        DELETE FROM heatmap_tiles
+                        WHERE user_id = ? AND zoom = ? AND tile_x = ? AND tile_y = ?
+                    ''', (user_id, zoom, tile_x, tile_y))
+
+    cursor.execute("DELETE FROM heatmap_sessions WHERE session_id = ?", (session_id,))
+    return True
+
+
+def clear_user_heatmap(conn, user_id):
+    """Verwirft alle Kacheln eines Benutzers - sie entstehen beim nächsten Einrechnen neu"""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM heatmap_tiles WHERE user_id = ?", (user_id,))
+    cursor.execute("DELETE FROM heatmap_sessions WHERE user_id = ?", (user_id,))
+
+
+def get_heatmap_tiles(conn, zoom, user_id=None):
+    """Kacheln einer Zoomstufe - für einen Benutzer oder (user_id=None) summiert über alle"""
+    cursor = conn.cursor()
+    if user_id is None:
+        cursor.execute("SELECT tile_x, tile_y, counts FROM heatmap_tiles WHERE zoom = ?", (zoom,))
+    else:
+        cursor.execute(
+            "SELECT tile_x, tile_y, counts FROM heatmap_tiles WHERE zoom = ? AND user_id = ?",
+            (zoom, user_id)
+        )
+    tiles = defaultdict(lambda: np.zeros((TILE_BINS, TILE_BINS), dtype=np.uint32))
+    for tile_x, tile_y, blob in cursor.fetchall():
+        tiles[(tile_x, tile_y)] += _counts_from_blob(blob)
+    return dict(tiles)
+
+
+def tiles_to_points(tiles, zoom):
+    """
+    Belegte Zellen als Punkte (Zellmitte in Grad) mit Anzahl.
+
+    Returns:
+        tuple: (lat, lon, counts)
+    """
+    cell = TILE_SIZE / TILE_BINS
+    lats, lons, weights = [], [], []
+    for (tile_x, tile_y), counts in tiles.items():
+        rows, cols = np.nonzero(counts)
+        if len(rows) == 0:
+            continue
+        lat, lon = from_pixels(tile_x * TILE_SIZE + (cols + 0.5) * cell,
+                               tile_y * TILE_SIZE + (rows + 0.5) * cell, zoom)
+        lats.append(lat)
+        lons.append(lon)
+        weights.append(counts[rows, cols])
+    if not lats:
+        return np.array([]), np.array([]), np.array([])
+    return np.concatenate(lats), np.concatenate(lons), np.concatenate(weights)
+
+
+def heatmap_version(conn, user_id=None):
+    """
+    Stand der Kacheln - ändert sich mit jeder eingerechneten Session.
+
+    Returns:
+        tuple: (Anzahl Sessions, höchste session_id) für einen Benutzer oder alle
+    """
+    cursor = conn.cursor()
+    if user_id is None:
+        cursor.execute("SELECT COUNT(*), MAX(session_id) FROM heatmap_sessions")
+    else:
+        cursor.execute("SELECT COUNT(*), MAX(session_id) FROM heatmap_sessions WHERE user_id = ?", (user_id,))
+    return tuple(cursor.fetchone())
+
+
+def heatmap_points(conn, user_id=None, max_cells=MAX_RENDER_CELLS):
+    """
+    Punkte der feinsten Zoomstufe, die höchstens max_cells belegte Zellen hat.
+
+    Returns:
+        tuple: (zoom, lat, lon, counts) - zoom ist None, wenn noch keine Daten vorliegen
+    """
+    result = None
+    for zoom in HEATMAP_ZOOMS:
+        lat, lon, counts = tiles_to_points(get_heatmap_tiles(conn, zoom, user_id), zoom)
+        if len(lat) == 0:
+            break
+        if result is not None and len(lat) > max_cells:
+            break
+        result = (zoom, lat, lon, counts)
+    return result or (None, np.array([]), np.array([]), np.array([]))
@@ -0,0 +1,196 @@
+# segments.py - Räumlicher Gitterindex über Routen und Vergleich wiederholter Segmente
+import numpy as np
+
+from gps_route import SEMICIRCLE_TO_DEG
+from blob_store import resolve_sports_file
+
+GRID_CELL_DEG = 0.002  # Zellgröße des Gitterindex (ca. 150-220 m)
+MATCH_RADIUS_M = 30  # so nah muss eine Aktivität an Start/Ziel vorbeikommen
+EARTH_RADIUS_M = 6371000
+
+
+def stream_coordinates(stream):
+    """Positionen des 1-Hz-Rasters in Grad, ungültige Fixes als NaN"""
+    valid = stream['valid']['position_lat'] & stream['valid']['position_long']
+    lat = np.where(valid, stream['position_lat'] * SEMICIRCLE_TO_DEG, np.nan)
+    lon = np.where(valid, stream['position_long'] * SEMICIRCLE_TO_DEG, np.nan)
+    lat[valid & (lat == 0) & (lon == 0)] = np.nan
+    return lat, lon
+
+
+def grid_cell(lat, lon):
+    """Gitterzelle (Zeile, Spalte) für Koordinaten in Grad"""
+    return (np.floor(np.asarray(lat) / GRID_CELL_DEG).astype(int),
+            np.floor(np.asarray(lon) / GRID_CELL_DEG).astype(int))
+
+
+def grid_postings(stream):
+    """
+    Vereinfacht die Route zur Folge der durchfahrenen Gitterzellen.
+
+    Aufeinanderfolgende Sekunden in derselben Zelle ergeben einen Eintrag
+    (Zelle, erste Sekunde, letzte Sekunde) - pro Stunde nur einige hundert Einträge.
+    """
+    lat, lon = stream_coordinates(stream)
+    seconds = np.flatnonzero(~np.isnan(lat))
+    if len(seconds) == 0:
+        return []
+    cell_lat, cell_lon = grid_cell(lat[seconds], lon[seconds])
+    # Neuer Eintrag bei Zellwechsel oder Lücke in den GPS-Daten
+    change = np.ones(len(seconds), dtype=bool)
+    change[1:] = ((cell_lat[1:] != cell_lat[:-1]) | (cell_lon[1:] != cell_lon[:-1])
+                  | (np.diff(seconds) > 1))
+    starts = np.flatnonzero(change)
+    ends = np.append(starts[1:], len(seconds)) - 1
+    return [
+        (int(cell_lat[s]), int(cell_lon[s]), int(seconds[s]), int(seconds[e]))
+        for s, e in zip(starts, ends)
+    ]
+
+
+def index_session_route(conn, session_id, user_id, stream):
+    """Schreibt die Gittereinträge einer Session (ersetzt vorhandene)"""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM route_grid_index WHERE session_id = ?", (session_id,))
+    cursor.executemany('''
+        INSERT OR REPLACE INTO route_grid_index
+            (cell_lat, cell_lon, session_id, user_id, start_offset, end_offset)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(cell_lat, cell_lon, session_id, user_id, start, end)
+          for cell_lat, cell_lon, start, end in grid_postings(stream)])
+
+
+def remove_session_route(conn, session_id):
+    """Entfernt die Gittereinträge einer gelöschten Session"""
+    conn.execute("DELETE FROM route_grid_index WHERE session_id = ?", (session_id,))
+
+
+def _neighbour_cells(lat, lon):
+    cell_lat, cell_lon = grid_cell(lat, lon)
+    return [(int(cell_lat) + dy, int(cell_lon) + dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+
+
+def _postings_near(conn, lat, lon, user_id=None):
+    """Index-Einträge in der Zelle des Punkts und den 8 Nachbarzellen: session_id -> [(start, end)]"""
+    cells = _neighbour_cells(lat, lon)
+    query = f'''
+        SELECT session_id, start_offset, end_offset FROM route_grid_index
+        WHERE (cell_lat, cell_lon) IN (VALUES {", ".join(["(?, ?)"] * len(cells))})
+    '''
+    params = [value for cell in cells for value in cell]
+    if user_id is not None:
+        query += " AND user_id = ?"
+        params.append(user_id)
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    postings = {}
+    for session_id, start, end in cursor.fetchall():
+        postings.setdefault(session_id, []).append((start, end))
+    return postings
+
+
+def distance_m(lat, lon, ref_lat, ref_lon):
+    """Abstand in Metern (äquirektangulär, für kurze Distanzen ausreichend genau)"""
+    x = np.radians(lon - ref_lon) * np.cos(np.radians(ref_lat))
+    y = np.radians(lat - ref_lat)
+    return np.hypot(x, y) * EARTH_RADIUS_M
+
+
+def _closest_approaches(lat, lon, point, ranges, radius_m):
+    """Sekunde der größten Annäherung je Indexeintrag, falls innerhalb radius_m"""
+    hits = []
+    for start, end in sorted(ranges):
+        distances = distance_m(lat[start:end + 1], lon[start:end + 1], *point)
+        if np.all(np.isnan(distances)):
+            continue
+        best = int(np.nanargmin(distances))
+        if distances[best] <= radius_m:
+            hits.append(start + best)
+    # Benachbarte Einträge derselben Durchfahrt zusammenfassen
+    merged = []
+    for second in hits:
+        if merged and second - merged[-1] <= 60:
+            continue
+        merged.append(second)
+    return merged
+
+
+def match_passes(stream, start_point, end_point, start_ranges, end_ranges, radius_m=MATCH_RADIUS_M):
+    """
+    Durchfahrten Start -> Ziel in einer Aktivität.
+
+    Gesucht wird nur in den Zeitbereichen, die der Index für Start und Ziel
+    liefert; jede Startdurchfahrt wird mit der nächsten Zieldurchfahrt gepaart.
+    """
+    lat, lon = stream_coordinates(stream)
+    starts = _closest_approaches(lat, lon, start_point, start_ranges, radius_m)
+    ends = _closest_approaches(lat, lon, end_point, end_ranges, radius_m)
+
+    passes = []
+    for i, start in enumerate(starts):
+        next_start = starts[i + 1] if i + 1 < len(starts) else len(lat)
+        candidates = [end for end in ends if start < end <= next_start]
+        if candidates:
+            passes.append((start, candidates[0]))
+    return passes
+
+
+def pass_stats(stream, lo, hi):
+    """Kennzahlen einer Durchfahrt [lo, hi] auf dem 1-Hz-Raster"""
+    window = slice(lo, hi + 1)
+
+    def mean(channel):
+        values = stream[channel][window][stream['valid'][channel][window]]
+        return float(np.mean(values)) if len(values) else None
+
+    return {
+        'start_time': float(stream['time'][lo]),
+        'elapsed_seconds': hi - lo,  # 1 Index = 1 Sekunde
+        'avg_heartrate': mean('heartrate'),
+        'avg_power': mean('power'),
+        'avg_speed_kmh': (mean('velocity') or 0) * 3.6,
+    }
+
+
+def find_segment_passes(conn, start_point, end_point, load_stream, user_id=None,
+                        radius_m=MATCH_RADIUS_M):
+    """
+    Alle Durchfahrten eines Segments (start_point -> end_point, jeweils (lat, lon)).
+
+    Kandidaten kommen ausschließlich aus dem Gitterindex; nur Aktivitäten, die
+    sowohl Start- als auch Zielzelle berühren, werden geladen.
+
+    Args:
+        load_stream: Funktion (content_key, file_path) -> 1-Hz-Stream
+
+    Returns:
+        list: Dicts mit session_id, file_name und den Kennzahlen aus pass_stats,
+              sortiert nach Zeit (schnellste zuerst)
+    """
+    start_postings = _postings_near(conn, *start_point, user_id)
+    end_postings = _postings_near(conn, *end_point, user_id)
+    candidates = sorted(set(start_postings) & set(end_postings))
+    if not candidates:
+        return []
+
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT id, file_name, content_hash FROM sports_sessions
+        WHERE id IN ({", ".join("?" * len(candidates))})
+    ''', candidates)
+
+    results = []
+    for session_id, file_name, content_hash in cursor.fetchall():
+        file_path = resolve_sports_file(conn, file_name, content_hash)
+        try:
+            stream = load_stream(content_hash or file_path, file_path)
+        except Exception as e:
+            print(f"✗ Session {session_id} ({file_name}) konnte nicht geladen werden: {e}")
+            continue
+        for lo, hi in match_passes(stream, start_point, end_point,
+                                   start_postings[session_id], end_postings[session_id], radius_m):
+            results.append({'session_id': session_id, 'file_name': file_name,
+                            **pass_stats(stream, lo, hi)})
+
+    results.sort(key=lambda r: r['elapsed_seconds'])
+    return results
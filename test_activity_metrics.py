@@ -0,0 +1,166 @@
+import glob
+
+import numpy as np
+
+from sport_data import load_fit_file, slice_data
+from resampling import resample_activity, window_indices
+from range_stats import RangeStats
+from metrics import compute_metrics, NP_WINDOW_SECONDS
+from zones import ZoneIndex, assign_zones, HR_ZONE_BOUNDS, POWER_ZONE_BOUNDS
+from gps_route import route_coordinates, to_pixels, douglas_peucker
+from power_curve import mean_max, compute_activity_curves, DURATION_GRID
+
+TOLERANCE = 1e-6  # relative Abweichung zur direkten numpy-Berechnung
+MAX_HR = 190
+FTP = 250
+DP_TOLERANCE_PX = 2.0
+
+errors = 0
+
+
+def check(label, actual, expected):
+    """Vergleicht Ergebnis und Referenz und zählt Abweichungen"""
+    global errors
+    actual = np.asarray(actual, dtype=float)
+    expected = np.asarray(expected, dtype=float)
+    if actual.shape != expected.shape or not np.allclose(actual, expected, rtol=TOLERANCE, atol=TOLERANCE):
+        print(f"❌ {label}: {actual} statt {expected}")
+        errors += 1
+
+
+def reference_np(power):
+    """Normalized Power direkt: 30-s-Mittel nur über vollständig gültige Fenster"""
+    if len(power) < NP_WINDOW_SECONDS:
+        return 0.0
+    kernel = np.ones(NP_WINDOW_SECONDS) / NP_WINDOW_SECONDS
+    means = np.convolve(np.nan_to_num(power), kernel, mode='valid')
+    complete = np.convolve(np.isnan(power), np.ones(NP_WINDOW_SECONDS), mode='valid') == 0
+    if not np.any(complete):
+        return 0.0
+    return float(np.mean(means[complete] ** 4) ** 0.25)
+
+
+def reference_mean_max(values, duration):
+    """Bestes Fenstermittel direkt: nur Fenster ohne NaN auf dem lückenlosen Raster"""
+    if len(values) < duration:
+        return np.nan
+    means = np.convolve(np.nan_to_num(values), np.ones(duration) / duration, mode='valid')
+    complete = np.convolve(np.isnan(values), np.ones(duration), mode='valid') == 0
+    return means[complete].max() if np.any(complete) else np.nan
+
+
+def reference_stats(data, lo, hi, channel):
+    """Mittel, Maximum, Minimum der gültigen Rohwerte eines Kanals in [lo, hi)"""
+    values = np.asarray(data[channel][lo:hi], dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return 0, 0, 0
+    return values.mean(), values.max(), values.min()
+
+
+# 1. Beispiel-FIT-Dateien laden (defekte Dateien überspringen)
+activities = {}
+for path in sorted(glob.glob("data/sports_data/*.fit")):
+    try:
+        data = load_fit_file(path)
+    except Exception as e:
+        print(f"⚠️ {path} übersprungen: {e}")
+        continue
+    if len(data['time']) >= 100:
+        activities[path] = data
+print(f"Geprüft werden {len(activities)} Aktivitäten")
+
+for path, data in activities.items():
+    n = len(data['time'])
+    windows = [(0, n), (n // 4, 3 * n // 4), (10, n - 7), (n // 3, n // 3 + 500)]
+
+    # 2. 1-Hz-Raster: lückenlose Sekunden, Messwerte auf ganzen Sekunden bleiben erhalten
+    stream = resample_activity(data)
+    check(f"{path}: Rasterzeit", np.diff(stream['time']), np.ones(len(stream['time']) - 1))
+    offsets = np.asarray(data['time'], dtype=float) - data['time'][0]
+    on_grid = offsets == np.round(offsets)
+    for channel in ('heartrate', 'power', 'altitude'):
+        raw = np.asarray(data[channel], dtype=float)
+        sample = on_grid & ~np.isnan(raw)
+        grid = offsets[sample].astype(int)
+        valid = stream['valid'][channel][grid]
+        check(f"{path}: Raster {channel}", stream[channel][grid][valid], raw[sample][valid])
+        if np.any(~np.isnan(stream[channel][~stream['valid'][channel]])):
+            print(f"❌ {path}: ungültige Rasterwerte von {channel} sind nicht NaN")
+            errors += 1
+
+    # 3. RangeStats gegen direkte Berechnung je Fenster
+    range_stats = RangeStats(data)
+    for lo, hi in windows:
+        stats = range_stats.stats(lo, hi)
+        check(f"{path} [{lo}:{hi}]: Dauer", stats['duration_seconds'], data['time'][hi - 1] - data['time'][lo])
+        for channel, prefix in (('heartrate', 'heartrate'), ('power', 'power')):
+            mean, maximum, _ = reference_stats(data, lo, hi, channel)
+            check(f"{path} [{lo}:{hi}]: avg_{prefix}", stats[f'avg_{prefix}'], mean)
+            check(f"{path} [{lo}:{hi}]: max_{prefix}", stats[f'max_{prefix}'], maximum)
+        _, _, minimum = reference_stats(data, lo, hi, 'altitude')
+        check(f"{path} [{lo}:{hi}]: min_altitude", stats['min_altitude'], minimum)
+
+        # 4. Normalized Power und Höhenmeter auf dem 1-Hz-Raster des Fensters
+        window_stream = resample_activity(slice_data(data, lo, hi))
+        check(f"{path} [{lo}:{hi}]: NP", stats['normalized_power'], reference_np(window_stream['power']))
+        check(f"{path} [{lo}:{hi}]: NP compute_metrics",
+              compute_metrics(slice_data(data, lo, hi))['normalized_power'], stats['normalized_power'])
+        check(f"{path} [{lo}:{hi}]: Höhenmeter",
+              compute_metrics(slice_data(data, lo, hi))['elevation_gain_m'], stats['elevation_gain_m'])
+
+    # 5. ZoneIndex gegen np.digitize/np.bincount je Fenster
+    zone_index = ZoneIndex(stream, MAX_HR, FTP)
+    for start, end in ((0, stream['time'][-1] - stream['time'][0]), (60, 1800), (600, 601)):
+        lo, hi = window_indices(stream, start, end)
+        for channel, bounds, reference, seconds in (
+            ('heartrate', HR_ZONE_BOUNDS, MAX_HR, zone_index.hr_seconds),
+            ('power', POWER_ZONE_BOUNDS, FTP, zone_index.power_seconds),
+        ):
+            values = stream[channel][lo:hi]
+            valid = stream['valid'][channel][lo:hi]
+            zones = np.digitize(values[valid], np.asarray(bounds) * reference)
+            expected = np.bincount(zones, minlength=len(bounds) + 1)
+            check(f"{path} [{start}-{end} s]: Zonen {channel}", seconds(lo, hi), expected)
+            check(f"{path} [{start}-{end} s]: assign_zones {channel}",
+                  np.count_nonzero(assign_zones(values, valid, bounds, reference) >= 0), np.count_nonzero(valid))
+
+    # 6. Mean-Maximal-Kurven: zusammenhängende Fenster, Stopps als 0 W bzw. NaN
+    curves = compute_activity_curves(stream)
+    for channel in ('power', 'heartrate'):
+        measured = stream['valid'][channel] & stream['moving']
+        values = np.where(measured, stream[channel], 0.0 if channel == 'power' else np.nan)
+        durations = DURATION_GRID[DURATION_GRID <= 1200]
+        expected = [reference_mean_max(values, duration) for duration in durations]
+        check(f"{path}: mean_max {channel}", mean_max(values, durations), expected)
+        if np.any(~np.isnan(curves[channel])):
+            check(f"{path}: Kurve {channel}", curves[channel][:len(durations)], expected)
+
+    # 7. Douglas-Peucker: kein weggelassener Punkt weiter als die Toleranz von seiner Sehne
+    lat, lon, _ = route_coordinates(data)
+    if len(lat) >= 3:
+        x, y = to_pixels(lat, lon, 14)
+        kept = douglas_peucker(x, y, DP_TOLERANCE_PX)
+        if kept[0] != 0 or kept[-1] != len(x) - 1 or np.any(np.diff(kept) <= 0):
+            print(f"❌ {path}: Douglas-Peucker behält Endpunkte nicht oder Indizes sind nicht aufsteigend")
+            errors += 1
+        worst = 0.0
+        for start, end in zip(kept[:-1], kept[1:]):
+            if end - start < 2:
+                continue
+            dx, dy = x[end] - x[start], y[end] - y[start]
+            px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+            length = np.hypot(dx, dy)
+            distances = np.hypot(px, py) if length == 0 else np.abs(px * dy - py * dx) / length
+            worst = max(worst, distances.max())
+        if worst > DP_TOLERANCE_PX + 1e-9:
+            print(f"❌ {path}: Douglas-Peucker-Abweichung {worst:.2f} px > {DP_TOLERANCE_PX} px")
+            errors += 1
+        print(f"✅ {path}: {n} Messpunkte, Route {len(x)} -> {len(kept)} Punkte")
+    else:
+        print(f"✅ {path}: {n} Messpunkte, keine GPS-Route")
+
+if errors == 0:
+    print("🎉 Alle Kennzahlen stimmen mit der direkten Berechnung überein!")
+else:
+    print(f"⚠️ {errors} Abweichungen gefunden.")
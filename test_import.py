@@ -19,14 +19,16 @@ if len(json_data) != len(db_persons):
 else:
     print(f"✅ Anzahl Personen stimmt überein: {len(db_persons)}")
 
-# 5. Vergleich: jede Person einzeln prüfen
+# 5. Vergleich: alle Personen-IDs in einer Abfrage prüfen
+cursor.execute("""
+    SELECT j.id FROM (SELECT json_extract(value, '$.id') AS id FROM json_each(?)) j
+    LEFT JOIN users u ON u.id = j.id
+    WHERE u.id IS NULL
+""", (json.dumps(json_data),))
 errors = 0
-for person in json_data:
-    cursor.execute("SELECT * FROM users WHERE id = ?", (person["id"],))
-    result = cursor.fetchone()
-    if not result:
-        print(f"❌ Person mit ID {person['id']} nicht gefunden")
-        errors += 1
+for (person_id,) in cursor.fetchall():
+    print(f"❌ Person mit ID {person_id} nicht gefunden")
+    errors += 1
 
 # 6. EKG-Tests prüfen (optional)
 cursor.execute("SELECT COUNT(*) FROM ekg_tests")
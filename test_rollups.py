@@ -0,0 +1,111 @@
+import glob
+import sqlite3
+
+import numpy as np
+
+from migrations import run_migrations
+from sport_data import load_fit_file
+from activity_import import process_session, remove_session
+from activity_summary import get_season_overview, ROLLUP_PERIODS
+
+errors = 0
+
+
+def check(label, ok):
+    """Zählt fehlgeschlagene Prüfungen"""
+    global errors
+    if not ok:
+        print(f"❌ {label}")
+        errors += 1
+
+
+def new_database():
+    """Leere In-Memory-Datenbank mit aktuellem Schema und einem Testbenutzer"""
+    conn = sqlite3.connect(":memory:")
+    run_migrations(conn)
+    conn.execute('''
+        INSERT INTO users (id, username, password, email, full_name, date_of_birth, gender)
+        VALUES (1, 'rollup_test', '-', 'test@example.com', 'Rollup Test', '1990-01-01', 'male')
+    ''')
+    return conn
+
+
+def add_session(conn, session_id, data):
+    """Legt eine Session an und verarbeitet sie wie der Backfill"""
+    conn.execute(
+        "INSERT INTO sports_sessions (id, user_id, file_name, timestamp) VALUES (?, 1, ?, ?)",
+        (session_id, f"test_{session_id}.fit", str(data['time'][0]))
+    )
+    process_session(conn, session_id, 1, data)
+
+
+def delete_session(conn, session_id, data):
+    """Entfernt die abgeleiteten Daten und die Session selbst"""
+    remove_session(conn, session_id, lambda content_key, file_path: data)
+    conn.execute("DELETE FROM sports_sessions WHERE id = ?", (session_id,))
+
+
+def rollups(conn):
+    return {period: get_season_overview(conn, 1, period) for period in ROLLUP_PERIODS}
+
+
+def same_rollups(actual, expected):
+    """Vergleicht Wochen-/Monatssummen mit Toleranz für Rundungsfehler beim Abziehen"""
+    for period in ROLLUP_PERIODS:
+        if len(actual[period]) != len(expected[period]):
+            return False
+        for a, e in zip(actual[period], expected[period]):
+            for key, value in e.items():
+                if isinstance(value, str) or value is None:
+                    if a[key] != value:
+                        return False
+                elif not np.allclose(a[key], value, atol=1e-6):
+                    return False
+    return True
+
+
+# 1. Zwei lesbare Beispiel-FIT-Dateien laden
+activities = []
+for path in sorted(glob.glob("data/sports_data/*.fit")):
+    try:
+        data = load_fit_file(path)
+    except Exception as e:
+        print(f"⚠️ {path} übersprungen: {e}")
+        continue
+    if len(data['time']) >= 100:
+        activities.append(data)
+    if len(activities) == 2:
+        break
+
+if len(activities) < 2:
+    print("⚠️ Zu wenige lesbare FIT-Dateien für den Test")
+else:
+    first, second = activities
+
+    # 2. Referenz: nur die zweite Session
+    reference = new_database()
+    add_session(reference, 2, second)
+    expected = rollups(reference)
+
+    # 3. Beide Sessions hinzufügen, die erste löschen -> wie die Referenz
+    conn = new_database()
+    add_session(conn, 1, first)
+    add_session(conn, 2, second)
+    check("Summen enthalten beide Sessions",
+          sum(row['sessions'] for row in rollups(conn)['week']) == 2)
+    delete_session(conn, 1, first)
+    check("Summen nach Löschen der ersten Session", same_rollups(rollups(conn), expected))
+
+    # 4. Auch die zweite löschen -> alles leer
+    delete_session(conn, 2, second)
+    check("Wochen-/Monatssummen leer", all(not rows for rows in rollups(conn).values()))
+    for table in ("activity_summary", "session_load", "training_load_daily", "activity_curves",
+                  "user_curve_envelope", "heatmap_tiles", "heatmap_sessions", "route_grid_index",
+                  "processed_sessions"):
+        count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        check(f"{table} leer ({count} Zeilen übrig)", count == 0)
+
+if errors == 0:
+    print("🎉 Wochen-/Monatssummen bleiben beim Hinzufügen und Löschen konsistent!")
+else:
+    print(f"⚠️ {errors} Abweichungen gefunden.")
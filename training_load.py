@@ -0,0 +1,300 @@
+# training_load.py - Trainingsbelastung (TRIMP, TSS) und ATL/CTL/TSB pro Benutzer
+from datetime import date, datetime, timedelta
+import numpy as np
+
+from ekg_data import EKG_data
+from metrics import NP_WINDOW_SECONDS, normalized_power
+from power_curve import get_user_envelope, DURATION_GRID
+from resampling import valid_values
+
+# Zeitkonstanten der exponentiell gewichteten Mittel (Tage)
+ATL_DAYS = 7
+CTL_DAYS = 42
+ATL_DECAY = np.exp(-1 / ATL_DAYS)
+CTL_DECAY = np.exp(-1 / CTL_DAYS)
+
+RESTING_HR = 60  # Ruhepuls, solange keiner pro Benutzer gespeichert ist
+FTP_DEFAULT = 200  # Watt, falls weder FTP noch Leistungsdaten vorhanden sind
+FTP_MIN_WATTS = 50  # Eingabebereich für die FTP im Profil
+FTP_MAX_WATTS = 600
+
+
+def parse_birth_year(date_of_birth):
+    """Geburtsjahr aus '1990-01-01' oder 1990 (Altbestand) - None wenn unbekannt"""
+    try:
+        return int(str(date_of_birth)[:4])
+    except (TypeError, ValueError):
+        return None
+
+
+def get_user_hr_profile(conn, user_id):
+    """Maximale Herzfrequenz (über calc_max_heart_rate) und Geschlecht eines Benutzers"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT date_of_birth, gender FROM users WHERE id = ?", (user_id,))
+    row = cursor.fetchone()
+    birth_year = parse_birth_year(row[0]) if row else None
+    if birth_year is None:
+        birth_year = 1990
+    gender = (row[1] or "other").lower() if row else "other"
+    return EKG_data.calc_max_heart_rate(birth_year, gender)["max_hr"], gender
+
+
+def get_stored_ftp(conn, user_id):
+    """Im Profil gespeicherte FTP (None, solange keine gespeichert ist)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT ftp_watts FROM users WHERE id = ?", (user_id,))
+    row = cursor.fetchone()
+    return float(row[0]) if row and row[0] else None
+
+
+def get_user_ftp(conn, user_id):
+    """
+    FTP aus dem Profil, sonst 95 % der besten 20-min-Leistung, sonst FTP_DEFAULT.
+
+    Nur für Anzeige und Vorschlagswert - die Schätzung wächst mit der
+    Bestwert-Hülle, gespeicherte TSS beruhen daher nur auf get_stored_ftp.
+    """
+    stored = get_stored_ftp(conn, user_id)
+    if stored is not None:
+        return stored
+
+    envelope = get_user_envelope(conn, user_id)
+    if envelope is not None:
+        best_20min = np.interp(20 * 60, DURATION_GRID, envelope['power'])
+        if not np.isnan(best_20min) and best_20min > 0:
+            return 0.95 * best_20min
+    return float(FTP_DEFAULT)
+
+
+def calc_trimp(heartrate_1hz, max_hr, gender, resting_hr=RESTING_HR):
+    """Banister-TRIMP aus 1-Hz-Herzfrequenz (Minuten x HRR x geschlechtsspezifischer Gewichtung)"""
+    if heartrate_1hz is None or max_hr <= resting_hr:
+        return 0.0
+    hrr = np.clip((heartrate_1hz - resting_hr) / (max_hr - resting_hr), 0, 1)
+    if gender == "female":
+        weight = 0.86 * np.exp(1.67 * hrr)
+    else:
+        weight = 0.64 * np.exp(1.92 * hrr)
+    return float(np.sum(hrr * weight) / 60)
+
+
+def calc_normalized_power(power_1hz):
+    """Normalized Power: 4. Wurzel des Mittels der 4. Potenz des gleitenden 30-s-Mittels"""
+    if power_1hz is None or len(power_1hz) < NP_WINDOW_SECONDS:
+        return None
+    return normalized_power(power_1hz)
+
+
+def calc_tss(normalized_power, duration_seconds, ftp):
+    """Training Stress Score aus Normalized Power und Dauer (None ohne Leistungsdaten oder FTP)"""
+    if not normalized_power or not ftp or ftp <= 0:
+        return None
+    intensity_factor = normalized_power / ftp
+    return duration_seconds * normalized_power * intensity_factor / (ftp * 3600) * 100
+
+
+def compute_session_load(conn, user_id, stream):
+    """
+    TRIMP sowie Normalized Power und Dauer der Leistungsmessung einer 1-Hz-Aktivität.
+
+    Alles FTP-unabhängig - TSS entsteht erst in update_session_load bzw.
+    rescore_session_load aus diesen Eingaben.
+    """
+    # Jeder gültige Rasterpunkt ist eine Sekunde - Pausen und Aussetzer zählen nicht
+    heartrate = valid_values(stream, 'heartrate', moving_only=True)
+    power = None
+    if np.any(valid_values(stream, 'power') > 0):
+        # Fehlende Leistung während der Bewegung zählt als 0 W (Rollen)
+        power = np.where(stream['valid']['power'], stream['power'], 0.0)[stream['moving']]
+
+    max_hr, gender = get_user_hr_profile(conn, user_id)
+    trimp = calc_trimp(heartrate if len(heartrate) else None, max_hr, gender)
+    normalized_power = calc_normalized_power(power) if power is not None else None
+    power_seconds = len(power) if normalized_power else None
+    return trimp, normalized_power, power_seconds
+
+
+def uses_tss(conn, user_id):
+    """
+    Belastungsmaß eines Benutzers: TSS, sobald eine FTP gespeichert ist, sonst TRIMP.
+
+    Beide Skalen werden nie gemischt - mit TSS zählen Sessions ohne
+    Leistungsmessung mit 0.
+    """
+    return get_stored_ftp(conn, user_id) is not None
+
+
+def _recompute_from(conn, user_id, day):
+    """Aktualisiert Tageswerte ab day - ältere Tage bleiben unverändert"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT COALESCE(SUM(trimp), 0), COALESCE(SUM(tss), 0)
+        FROM session_load WHERE user_id = ? AND day = ?
+    ''', (user_id, day))
+    trimp, tss = cursor.fetchone()
+    load = tss if uses_tss(conn, user_id) else trimp
+    cursor.execute('''
+        INSERT OR REPLACE INTO training_load_daily (user_id, day, trimp, tss, load)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (user_id, day, trimp, tss, load))
+
+    # Letzter Stand vor day als Startwert
+    cursor.execute('''
+        SELECT day, atl, ctl FROM training_load_daily
+        WHERE user_id = ? AND day < ? ORDER BY day DESC LIMIT 1
+    ''', (user_id, day))
+    previous = cursor.fetchone()
+
+    cursor.execute('''
+        SELECT day, load FROM training_load_daily
+        WHERE user_id = ? AND day >= ? ORDER BY day
+    ''', (user_id, day))
+    rows = cursor.fetchall()
+
+    prev_day, atl, ctl = (date.fromisoformat(previous[0]), previous[1], previous[2]) if previous else (None, 0.0, 0.0)
+    for row_day, row_load in rows:
+        current = date.fromisoformat(row_day)
+        gap = (current - prev_day).days if prev_day else 1
+        # Werte am Vortag (Abklingen über trainingsfreie Tage)
+        atl_yesterday = atl * ATL_DECAY ** (gap - 1)
+        ctl_yesterday = ctl * CTL_DECAY ** (gap - 1)
+        tsb = ctl_yesterday - atl_yesterday
+        atl = atl_yesterday * ATL_DECAY + row_load * (1 - ATL_DECAY)
+        ctl = ctl_yesterday * CTL_DECAY + row_load * (1 - CTL_DECAY)
+        cursor.execute('''
+            UPDATE training_load_daily SET atl = ?, ctl = ?, tsb = ?
+            WHERE user_id = ? AND day = ?
+        ''', (atl, ctl, tsb, user_id, row_day))
+        prev_day = current
+
+
+def update_session_load(conn, session_id, user_id, stream):
+    """Speichert die Belastung einer Session und aktualisiert ATL/CTL/TSB inkrementell"""
+    day = datetime.fromtimestamp(float(stream['time'][0])).date().isoformat()
+    trimp, normalized_power, power_seconds = compute_session_load(conn, user_id, stream)
+    ftp = get_stored_ftp(conn, user_id)
+    tss = calc_tss(normalized_power, power_seconds, ftp)
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT day FROM session_load WHERE session_id = ?", (session_id,))
+    old = cursor.fetchone()
+    # Die verwendete FTP wird mitgespeichert - rescore_session_load rechnet bei Änderung nach
+    cursor.execute('''
+        INSERT OR REPLACE INTO session_load
+            (session_id, user_id, day, trimp, tss, normalized_power, power_seconds, ftp)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (session_id, user_id, day, trimp, tss, normalized_power, power_seconds, ftp))
+
+    start_day = min(day, old[0]) if old else day
+    _recompute_from(conn, user_id, start_day)
+    return trimp, tss
+
+
+def rescore_session_load(conn, user_id):
+    """
+    Berechnet TSS und Tageswerte nach einer FTP-Änderung neu, ohne Dateien zu lesen.
+
+    TSS = Dauer x NP² / (FTP² x 3600) x 100 direkt in SQL aus den gespeicherten
+    Eingaben; danach werden alle Tagessummen (auch das Belastungsmaß) neu
+    gebildet und ATL/CTL/TSB einmal ab dem ersten Trainingstag fortgeschrieben.
+
+    Returns:
+        int: Anzahl neu bewerteter Sessions
+    """
+    ftp = get_stored_ftp(conn, user_id)
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE session_load
+        SET ftp = ?,
+            tss = CASE WHEN ? IS NOT NULL AND normalized_power > 0
+                       THEN power_seconds * normalized_power * normalized_power / (? * ? * 36.0) END
+        WHERE user_id = ? AND ftp IS NOT ?
+    ''', (ftp, ftp, ftp, ftp, user_id, ftp))
+    rescored = cursor.rowcount
+
+    cursor.execute('''
+        INSERT OR REPLACE INTO training_load_daily (user_id, day, trimp, tss, load)
+        SELECT user_id, day, SUM(trimp), COALESCE(SUM(tss), 0),
+               CASE WHEN ? THEN COALESCE(SUM(tss), 0) ELSE SUM(trimp) END
+        FROM session_load WHERE user_id = ? GROUP BY day
+    ''', (ftp is not None, user_id))
+    cursor.execute("SELECT MIN(day) FROM session_load WHERE user_id = ?", (user_id,))
+    first_day = cursor.fetchone()[0]
+    if first_day:
+        _recompute_from(conn, user_id, first_day)
+    return rescored
+
+
+def remove_session_load(conn, session_id):
+    """Entfernt die Belastung einer gelöschten Session und aktualisiert die Folgetage"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT user_id, day FROM session_load WHERE session_id = ?", (session_id,))
+    row = cursor.fetchone()
+    if not row:
+        return
+    user_id, day = row
+    cursor.execute("DELETE FROM session_load WHERE session_id = ?", (session_id,))
+    _recompute_from(conn, user_id, day)
+    cursor.execute('''
+        DELETE FROM training_load_daily
+        WHERE user_id = ? AND day = ? AND NOT EXISTS (
+            SELECT 1 FROM session_load WHERE user_id = ? AND day = ?
+        )
+    ''', (user_id, day, user_id, day))
+
+
+def get_load_series(conn, user_id, start_day=None, end_day=None):
+    """
+    Tägliche ATL/CTL/TSB-Reihe inklusive trainingsfreier Tage.
+
+    Gespeichert sind nur Tage mit Training; dazwischen klingen die Werte
+    exponentiell ab und werden hier vektorisiert ergänzt.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT day, load, atl, ctl FROM training_load_daily
+        WHERE user_id = ? ORDER BY day
+    ''', (user_id,))
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+
+    row_days = np.array([date.fromisoformat(r[0]).toordinal() for r in rows])
+    row_load = np.array([r[1] for r in rows])
+    row_atl = np.array([r[2] for r in rows])
+    row_ctl = np.array([r[3] for r in rows])
+
+    first = start_day.toordinal() if start_day else row_days[0]
+    last = (end_day or date.today()).toordinal()
+    last = max(last, row_days[-1])
+    days = np.arange(first, last + 1)
+
+    # Letzter gespeicherter Tag <= jedem Kalendertag
+    idx = np.searchsorted(row_days, days, side='right') - 1
+    known = idx >= 0
+    idx_safe = np.maximum(idx, 0)
+    elapsed = days - row_days[idx_safe]
+    atl = np.where(known, row_atl[idx_safe] * ATL_DECAY ** elapsed, 0.0)
+    ctl = np.where(known, row_ctl[idx_safe] * CTL_DECAY ** elapsed, 0.0)
+    load = np.where(known & (elapsed == 0), row_load[idx_safe], 0.0)
+    # Form = Fitness - Ermüdung des Vortags
+    tsb = np.concatenate(([0.0], ctl[:-1] - atl[:-1]))
+    if first > row_days[0]:
+        prev = first - 1
+        j = np.searchsorted(row_days, prev, side='right') - 1
+        if j >= 0:
+            tsb[0] = (row_ctl[j] * CTL_DECAY ** (prev - row_days[j])
+                      - row_atl[j] * ATL_DECAY ** (prev - row_days[j]))
+
+    return {
+        'day': [date.fromordinal(int(d)) for d in days],
+        'load': load,
+        'atl': atl,
+        'ctl': ctl,
+        'tsb': tsb,
+    }
+
+
+def default_series_start(days_back=90):
+    """Startdatum für die Standardansicht (letzte days_back Tage)"""
+    return date.today() - timedelta(days=days_back)
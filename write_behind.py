@@ -0,0 +1,121 @@
+# write_behind.py - Hintergrund-Schreiber für Last-Login und Audit-Ereignisse (gebündelte Transaktionen)
+import atexit
+import threading
+from datetime import datetime, timezone
+
+import streamlit as st
+
+from db import DB_PATH, get_pool
+
+FLUSH_INTERVAL_SECONDS = 5
+MAX_PENDING_EVENTS = 10000  # ältere Audit-Ereignisse werden verworfen, wenn das Schreiben dauerhaft scheitert
+
+
+def utc_timestamp():
+    """Zeitpunkt im Format von CURRENT_TIMESTAMP (UTC)"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class WriteBehindQueue:
+    """
+    Sammelt Schreibzugriffe, die nicht sofort sichtbar sein müssen.
+
+    Ein einzelner Hintergrund-Thread schreibt alle FLUSH_INTERVAL_SECONDS in
+    einer Transaktion - Reruns reihen nur ein und warten nie auf die
+    Schreibsperre. Mehrere Logins desselben Benutzers werden zum letzten
+    zusammengefasst. Schlägt das Schreiben fehl, bleiben die Einträge für den
+    nächsten Durchlauf stehen; beim Beenden des Prozesses wird ein letztes
+    Mal geschrieben. Bleibt das Schreiben dauerhaft aus (z. B. fehlende
+    Tabelle), werden höchstens MAX_PENDING_EVENTS Ereignisse behalten.
+    """
+
+    def __init__(self, pool, interval=FLUSH_INTERVAL_SECONDS):
+        self._pool = pool
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_logins = {}  # username -> Zeitpunkt
+        self._events = []  # (created_at, username, action, detail)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record_login(self, username):
+        """Merkt den Login für users.last_login vor"""
+        with self._lock:
+            self._last_logins[username] = utc_timestamp()
+
+    def record_event(self, username, action, detail=None):
+        """Merkt ein Audit-Ereignis vor"""
+        with self._lock:
+            self._events.append((utc_timestamp(), username, action, detail))
+
+    def pending(self):
+        """Anzahl noch nicht geschriebener Einträge"""
+        with self._lock:
+            return len(self._last_logins) + len(self._events)
+
+    def _take(self):
+        with self._lock:
+            last_logins, self._last_logins = self._last_logins, {}
+            events, self._events = self._events, []
+        return last_logins, events
+
+    def _requeue(self, last_logins, events):
+        with self._lock:
+            # neuere Logins, die während des Schreibens kamen, haben Vorrang
+            self._last_logins = {**last_logins, **self._last_logins}
+            self._events = events + self._events
+            dropped = len(self._events) - MAX_PENDING_EVENTS
+            if dropped > 0:
+                del self._events[:dropped]
+        if dropped > 0:
+            print(f"✗ Hintergrund-Schreiber: {dropped} ältere Audit-Ereignisse verworfen")
+
+    def flush(self):
+        """Schreibt alle vorgemerkten Einträge in einer Transaktion"""
+        with self._flush_lock:
+            last_logins, events = self._take()
+            if not last_logins and not events:
+                return
+            conn = None
+            try:
+                conn = self._pool.acquire()
+                conn.executemany(
+                    "UPDATE users SET last_login = ? WHERE username = ?",
+                    [(timestamp, username) for username, timestamp in last_logins.items()]
+                )
+                conn.executemany(
+                    "INSERT INTO audit_log (created_at, username, action, detail) VALUES (?, ?, ?, ?)",
+                    events
+                )
+                conn.commit()
+            except Exception as e:
+                self._requeue(last_logins, events)
+                print(f"✗ Hintergrund-Schreiben fehlgeschlagen, neuer Versuch folgt: {e}")
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            try:
+                self.flush()
+            except Exception as e:
+                # der Thread muss weiterlaufen, sonst wird nie wieder geschrieben
+                print(f"✗ Hintergrund-Schreiber: {e}")
+
+    def close(self):
+        """Stoppt den Schreiber und schreibt die restlichen Einträge"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+
+@st.cache_resource
+def get_write_queue(db_path=DB_PATH):
+    """Ein Hintergrund-Schreiber pro Datenbankdatei für alle Sessions des Servers"""
+    return WriteBehindQueue(get_pool(db_path))
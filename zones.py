@@ -0,0 +1,77 @@
+# zones.py - Zeit in Herzfrequenz- und Leistungszonen
+import numpy as np
+
+# HF-Zonen wie im EKG-Tab (Anteil der maximalen Herzfrequenz)
+HR_ZONE_BOUNDS = [0.5, 0.7, 0.85]
+HR_ZONE_NAMES = ["🟢 Ruhe", "🟡 Aerob", "🟠 Anaerob", "🔴 Maximal"]
+
+# Leistungszonen nach Coggan (Anteil der FTP)
+POWER_ZONE_BOUNDS = [0.55, 0.75, 0.90, 1.05, 1.20, 1.50]
+POWER_ZONE_NAMES = ["Z1 Regeneration", "Z2 Grundlage", "Z3 Tempo", "Z4 Schwelle",
+                    "Z5 VO2max", "Z6 Anaerob", "Z7 Neuromuskulär"]
+
+
+def assign_zones(values, valid, bounds, reference):
+    """Zonenindex je Rasterpunkt über np.digitize (-1 = ungültig)"""
+    zones = np.digitize(np.nan_to_num(values), np.asarray(bounds) * reference)
+    return np.where(valid, zones, -1)
+
+
+def zone_seconds(zones, n_zones):
+    """Sekunden je Zone in einem np.bincount - jeder Rasterpunkt ist eine Sekunde"""
+    return np.bincount(zones[zones >= 0], minlength=n_zones)
+
+
+class ZoneIndex:
+    """
+    Kumulierte Zonenzeiten einer 1-Hz-Aktivität.
+
+    Die Zonen werden einmal zugeordnet; die Zeit in jeder Zone für ein
+    beliebiges Fenster [lo, hi) ist danach eine Differenz zweier Zeilen.
+    """
+
+    def __init__(self, stream, max_hr, ftp):
+        self.hr_zones = assign_zones(stream['heartrate'], stream['valid']['heartrate'],
+                                     HR_ZONE_BOUNDS, max_hr)
+        self.power_zones = assign_zones(stream['power'], stream['valid']['power'],
+                                        POWER_ZONE_BOUNDS, ftp)
+        self.hr_cumulative = self._cumulative(self.hr_zones, len(HR_ZONE_NAMES))
+        self.power_cumulative = self._cumulative(self.power_zones, len(POWER_ZONE_NAMES))
+
+    @staticmethod
+    def _cumulative(zones, n_zones):
+        one_hot = np.zeros((len(zones) + 1, n_zones), dtype=np.int32)
+        valid = zones >= 0
+        one_hot[np.flatnonzero(valid) + 1, zones[valid]] = 1
+        return np.cumsum(one_hot, axis=0)
+
+    def hr_seconds(self, lo=0, hi=None):
+        hi = len(self.hr_zones) if hi is None else hi
+        return self.hr_cumulative[hi] - self.hr_cumulative[lo]
+
+    def power_seconds(self, lo=0, hi=None):
+        hi = len(self.power_zones) if hi is None else hi
+        return self.power_cumulative[hi] - self.power_cumulative[lo]
+
+
+def hr_zone_seconds(stream, max_hr):
+    """HF-Zonenzeiten einer ganzen Aktivität"""
+    hr_zones = assign_zones(stream['heartrate'], stream['valid']['heartrate'], HR_ZONE_BOUNDS, max_hr)
+    return zone_seconds(hr_zones, len(HR_ZONE_NAMES))
+
+
+def power_histogram(stream):
+    """
+    Sekunden je ganzem Watt (Index = abgerundete Leistung) einer 1-Hz-Aktivität.
+
+    FTP-unabhängig: daraus ergeben sich die Leistungszonen für jede FTP auf
+    1 W genau, ohne die Datei erneut zu lesen.
+    """
+    power = stream['power'][stream['valid']['power']]
+    return np.bincount(np.floor(np.maximum(power, 0)).astype(np.int64)).astype(np.uint32)
+
+
+def histogram_zone_seconds(histogram, ftp):
+    """Sekunden je Leistungszone aus einem Watt-Histogramm"""
+    zones = np.digitize(np.arange(len(histogram)), np.asarray(POWER_ZONE_BOUNDS) * ftp)
+    return np.bincount(zones, weights=histogram, minlength=len(POWER_ZONE_NAMES)).astype(np.int64)